@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+#
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file
+# except in compliance with the License. A copy of the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "LICENSE.txt" file accompanying this file. This file is distributed on an "AS IS"
+# BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, express or implied. See the License for
+# the specific language governing permissions and limitations under the License.
+"""
+CPU benchmark for streaming beam search.
+
+Runs beam search on batches of prompts with a randomly initialized tiny
+GPT-2 model, with the streaming generator and with ``generate``, and
+reports the time per batch.
+
+Usage: python -m benchmarks.beam_search_benchmark
+"""
+
+import time
+
+import torch
+
+from djl_python.streaming_utils import StreamingUtils
+from djl_python.tests import tiny_models
+
+MAX_NEW_TOKENS = 32
+REPEAT = 3
+
+
+def stream(model, tokenizer, prompts, num_beams):
+    generator = StreamingUtils.get_stream_generator("Accelerate")
+    for _ in generator(model,
+                       tokenizer,
+                       prompts,
+                       beam_size=num_beams,
+                       max_new_tokens=MAX_NEW_TOKENS):
+        pass
+
+
+def generate(model, tokenizer, prompts, num_beams):
+    tokens = tokenizer(prompts, return_tensors="pt", padding=True)
+    with torch.inference_mode():
+        model.generate(**tokens,
+                       num_beams=num_beams,
+                       max_new_tokens=MAX_NEW_TOKENS,
+                       do_sample=False,
+                       pad_token_id=tokenizer.eos_token_id)
+
+
+def timed(fn, *args):
+    begin = time.perf_counter()
+    for _ in range(REPEAT):
+        fn(*args)
+    return (time.perf_counter() - begin) / REPEAT * 1000
+
+
+def main():
+    torch.set_num_threads(1)
+    tokenizer = tiny_models.gpt2_tokenizer()
+    model = tiny_models.gpt2_model(len(tokenizer),
+                                   n_layer=4,
+                                   n_embd=128,
+                                   n_head=4)
+    stream(model, tokenizer, tiny_models.CORPUS[:1], 2)
+    print(f"{'batch':>6} {'beams':>6} {'stream ms':>10} {'generate ms':>12}")
+    for batch_size in (1, 8):
+        prompts = [
+            tiny_models.CORPUS[i % len(tiny_models.CORPUS)]
+            for i in range(batch_size)
+        ]
+        for num_beams in (2, 4, 8):
+            print(
+                f"{batch_size:>6} {num_beams:>6} "
+                f"{timed(stream, model, tokenizer, prompts, num_beams):>10.1f} "
+                f"{timed(generate, model, tokenizer, prompts, num_beams):>12.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+#
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file
+# except in compliance with the License. A copy of the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "LICENSE.txt" file accompanying this file. This file is distributed on an "AS IS"
+# BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, express or implied. See the License for
+# the specific language governing permissions and limitations under the License.
+"""
+CPU benchmark for chunked prefill.
+
+Streams long prompts from a randomly initialized tiny Llama model with and
+without ``prefill_chunk_size``, and reports the peak memory of the process
+above the loaded model, the time to first token and the total time. Each
+run is a separate process, so that the peak memory of one run doesn't hide
+the next one.
+
+Then a long prompt joins a rolling batch while a short request streams, and
+the longest gap between two tokens of the short request is reported.
+
+Usage: python -m benchmarks.chunked_prefill_benchmark
+"""
+
+import random
+import resource
+import subprocess
+import sys
+import time
+
+import torch
+
+from djl_python.rolling_batch import RollingBatch
+from djl_python.streaming_utils import StreamingUtils
+from djl_python.tests import tiny_models
+
+PROMPT_LENGTHS = (512, 1024, 2048, 4096)
+CHUNK_SIZES = (0, 256)
+
+
+def load():
+    torch.set_num_threads(1)
+    tokenizer = tiny_models.gpt2_tokenizer()
+    model = tiny_models.llama_model(len(tokenizer),
+                                    num_hidden_layers=4,
+                                    hidden_size=256)
+    return model, tokenizer
+
+
+def long_prompt(tokenizer, prompt_length):
+    words = " ".join(tiny_models.CORPUS).split()
+    rand = random.Random(0)
+    prompt = " ".join(rand.choice(words) for _ in range(prompt_length))
+    return tokenizer.decode(tokenizer(prompt)["input_ids"][:prompt_length])
+
+
+def run(prompt_length, chunk_size):
+    model, tokenizer = load()
+    prompt = long_prompt(tokenizer, prompt_length)
+    generator = StreamingUtils.get_stream_generator("Accelerate")
+    kwargs = {"max_new_tokens": 16}
+    if chunk_size:
+        kwargs["prefill_chunk_size"] = chunk_size
+    # warm up, then measure above the loaded model
+    list(generator(model, tokenizer, ["Hello world"], max_new_tokens=2))
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    begin = time.perf_counter()
+    stream = generator(model, tokenizer, [prompt], **kwargs)
+    next(stream)
+    ttft = time.perf_counter() - begin
+    for _ in stream:
+        pass
+    total = time.perf_counter() - begin
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline
+    print(f"{prompt_length} {chunk_size} {peak / 1024:.1f} "
+          f"{ttft * 1000:.1f} {total * 1000:.1f}")
+
+
+def max_token_gap(model, tokenizer, prompt, chunk_size):
+    rolling_batch = RollingBatch(model,
+                                 tokenizer,
+                                 prefill_chunk_size=chunk_size or None)
+    request = rolling_batch.submit("Hello world", max_new_tokens=64)
+    stream = request.stream()
+    next(stream)
+    rolling_batch.submit(prompt, max_new_tokens=4)
+    gaps = []
+    last = time.perf_counter()
+    for _ in stream:
+        now = time.perf_counter()
+        gaps.append(now - last)
+        last = now
+    return max(gaps) * 1000
+
+
+def main():
+    print(f"{'prompt':>7} {'chunk':>6} {'peak MB':>8} {'TTFT ms':>8} "
+          f"{'total ms':>9}")
+    for prompt_length in PROMPT_LENGTHS:
+        for chunk_size in CHUNK_SIZES:
+            output = subprocess.run([
+                sys.executable, "-m", "benchmarks.chunked_prefill_benchmark",
+                str(prompt_length),
+                str(chunk_size)
+            ],
+                                    capture_output=True,
+                                    text=True,
+                                    check=True).stdout.split()
+            length, chunk, peak, ttft, total = output
+            print(f"{length:>7} {chunk if chunk != '0' else 'off':>6} "
+                  f"{peak:>8} {ttft:>8} {total:>9}")
+
+    model, tokenizer = load()
+    prompt = long_prompt(tokenizer, PROMPT_LENGTHS[-1])
+    max_token_gap(model, tokenizer, "Hello", 0)
+    print(f"\n{'chunk':>6} {'max token gap ms':>17}")
+    for chunk_size in CHUNK_SIZES:
+        gap = max_token_gap(model, tokenizer, prompt, chunk_size)
+        print(f"{chunk_size or 'off':>6} {gap:>17.1f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3:
+        run(int(sys.argv[1]), int(sys.argv[2]))
+    else:
+        main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+#
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file
+# except in compliance with the License. A copy of the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "LICENSE.txt" file accompanying this file. This file is distributed on an "AS IS"
+# BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, express or implied. See the License for
+# the specific language governing permissions and limitations under the License.
+"""
+Micro-benchmark for streamed token detokenization.
+
+Decodes 128 generated tokens per sequence for batch sizes 1 to 64 with the
+previous one token ``batch_decode`` and with ``IncrementalDetokenizer``.
+Also counts the sequences whose streamed text differs from a full decode.
+
+Usage: python -m benchmarks.detokenizer_benchmark
+"""
+
+import random
+import time
+
+from djl_python.streaming_utils import IncrementalDetokenizer
+from djl_python.tests import tiny_models
+
+STEPS = 128
+
+
+def sequences(tokenizer, batch_size):
+    rand = random.Random(0)
+    text = " ".join(tiny_models.CORPUS * 20)
+    ids = tokenizer(text)["input_ids"]
+    result = []
+    for _ in range(batch_size):
+        start = rand.randrange(len(ids) - STEPS - 8)
+        result.append(ids[start:start + STEPS + 8])
+    return result
+
+
+def legacy(tokenizer, batch):
+    texts = [""] * len(batch)
+    for step in range(8, STEPS + 8):
+        tokens = tokenizer.batch_decode([[ids[step]] for ids in batch])
+        texts = [t + token for t, token in zip(texts, tokens)]
+    return texts
+
+
+def incremental(tokenizer, batch):
+    detokenizers = [IncrementalDetokenizer(ids[:8]) for ids in batch]
+    texts = [""] * len(batch)
+    for step in range(8, STEPS + 8):
+        tokens = IncrementalDetokenizer.decode(
+            tokenizer, detokenizers, [ids[step] for ids in batch],
+            [step == STEPS + 7] * len(batch))
+        texts = [t + token for t, token in zip(texts, tokens)]
+    return texts
+
+
+def main():
+    print(f"{'tokenizer':>10} {'batch':>6} {'legacy us/tok':>14} "
+          f"{'new us/tok':>11} {'legacy wrong':>13} {'new wrong':>10}")
+    for name, tokenizer in (("gpt2", tiny_models.gpt2_tokenizer()),
+                            ("t5", tiny_models.t5_tokenizer())):
+        for batch_size in (1, 8, 64):
+            batch = sequences(tokenizer, batch_size)
+            expected = [
+                tokenizer.decode(ids)[len(tokenizer.decode(ids[:8])):]
+                for ids in batch
+            ]
+            results = []
+            for decode in (legacy, incremental):
+                begin = time.perf_counter()
+                texts = decode(tokenizer, batch)
+                elapsed = time.perf_counter() - begin
+                wrong = sum(t != e for t, e in zip(texts, expected))
+                results.append((elapsed / STEPS / batch_size * 1e6, wrong))
+            print(f"{name:>10} {batch_size:>6} {results[0][0]:>14.1f} "
+                  f"{results[1][0]:>11.1f} {results[0][1]:>13} "
+                  f"{results[1][1]:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+#
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file
+# except in compliance with the License. A copy of the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "LICENSE.txt" file accompanying this file. This file is distributed on an "AS IS"
+# BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, express or implied. See the License for
+# the specific language governing permissions and limitations under the License.
+"""
+CPU benchmark for early exit of finished sequences in the streaming
+generator.
+
+Streams a batch where one sequence generates ``MAX_NEW_TOKENS`` tokens and
+most others stop early on stop token ids, from a randomly initialized tiny
+GPT-2 model. Without stop criteria every row runs for the whole
+generation, with them the finished rows are dropped from the batch.
+
+Usage: python -m benchmarks.early_exit_benchmark
+"""
+
+import random
+import time
+
+import torch
+
+from djl_python.streaming_utils import StreamingUtils
+from djl_python.tests import tiny_models
+
+BATCH_SIZE = 16
+MAX_NEW_TOKENS = 256
+SHORT_TOKENS = 16
+
+
+def run(model, tokenizer, inputs, **kwargs):
+    generator = StreamingUtils.get_stream_generator("Accelerate")
+    begin = time.perf_counter()
+    steps = list(
+        generator(model,
+                  tokenizer,
+                  inputs,
+                  max_new_tokens=MAX_NEW_TOKENS,
+                  repetition_penalty=1.2,
+                  **kwargs))
+    elapsed = time.perf_counter() - begin
+    lengths = [
+        max([j + 1 for j, step in enumerate(steps) if step[i]] or [0])
+        for i in range(len(inputs))
+    ]
+    return elapsed, lengths
+
+
+def stop_tokens(model, tokenizer, inputs):
+    """
+    Picks stop token ids that the first row never generates, they end the
+    other rows after SHORT_TOKENS tokens or earlier.
+    """
+    tokens = []
+    greedy = StreamingUtils._greedy_decoding
+
+    def record(*args):
+        token_ids = greedy(*args)
+        tokens.append(token_ids.tolist())
+        return token_ids
+
+    StreamingUtils._greedy_decoding = staticmethod(record)
+    try:
+        run(model, tokenizer, inputs)
+    finally:
+        StreamingUtils._greedy_decoding = staticmethod(greedy)
+    long_row = {step[0] for step in tokens}
+    stop_token_ids = set()
+    for i in range(1, len(inputs)):
+        row = [step[i] for step in tokens[SHORT_TOKENS:]]
+        stop_token_ids.update([t for t in row if t not in long_row][:1])
+    return list(stop_token_ids)
+
+
+def main():
+    torch.set_num_threads(1)
+    tokenizer = tiny_models.gpt2_tokenizer()
+    model = tiny_models.gpt2_model(len(tokenizer), n_layer=4, n_embd=256)
+    words = " ".join(tiny_models.CORPUS).split()
+    rand = random.Random(0)
+    inputs = [" ".join(rand.sample(words, 8)) for _ in range(BATCH_SIZE)]
+    stop_token_ids = stop_tokens(model, tokenizer, inputs)
+    # warm up
+    run(model, tokenizer, inputs[:2])
+    print(f"{'stop criteria':>14} {'seconds':>8} {'longest':>8} "
+          f"{'mean length':>12}")
+    for name, kwargs in (("off", {}), ("on", {
+            "stop_token_ids": stop_token_ids
+    })):
+        elapsed, lengths = run(model, tokenizer, inputs, **kwargs)
+        print(f"{name:>14} {elapsed:>8.2f} {max(lengths):>8} "
+              f"{sum(lengths) / len(lengths):>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+#
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file
+# except in compliance with the License. A copy of the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "LICENSE.txt" file accompanying this file. This file is distributed on an "AS IS"
+# BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, express or implied. See the License for
+# the specific language governing permissions and limitations under the License.
+"""
+Throughput benchmark for the python engine request loop.
+
+Runs ``PythonEngine`` on a unix socket with I/O bound blocking and
+``async def`` handlers and compares the serial loop with pipelined execution
+and worker side dynamic batching.
+
+Usage: python -m benchmarks.engine_benchmark
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import struct
+import tempfile
+import threading
+import time
+import types
+
+import djl_python_engine
+from djl_python.inputs import SocketReader
+from djl_python.outputs import Output
+from djl_python.service_loader import ModelService
+
+REQUESTS = 500
+LATENCY = 0.005
+
+
+def handle(inputs):
+    time.sleep(LATENCY)
+    return Output().add(inputs.get_as_bytes())
+
+
+def handle_batch(inputs):
+    # simulates a handler with a fixed cost per batch
+    time.sleep(LATENCY)
+    outputs = Output()
+    for i, item in enumerate(inputs.get_batches()):
+        outputs.add(item.get_as_bytes(), key="data", batch_index=i)
+    return outputs
+
+
+async def handle_async(inputs):
+    await asyncio.sleep(LATENCY)
+    return Output().add(inputs.get_as_bytes())
+
+
+def encode_request(handler: str, payload: bytes, seq_id: str) -> bytes:
+    msg = bytearray()
+    msg += struct.pack('>h', 2)
+    Output.write_utf8(msg, "handler")
+    Output.write_utf8(msg, handler)
+    Output.write_utf8(msg, djl_python_engine.REQUEST_SEQ_ID)
+    Output.write_utf8(msg, seq_id)
+    msg += struct.pack('>h', 1)
+    Output.write_utf8(msg, "data")
+    msg += struct.pack('>i', len(payload))
+    msg += payload
+    return bytes(msg)
+
+
+def read_output(reader: SocketReader) -> dict:
+    reader.read_short()
+    reader.read_utf8()
+    properties = {}
+    for _ in range(reader.read_short()):
+        key = reader.read_utf8()
+        properties[key] = reader.read_utf8()
+    for _ in range(reader.read_short()):
+        reader.read_utf8()
+        reader.read_buffer(reader.read_int())
+    return properties
+
+
+def serve(engine):
+    try:
+        engine.run_server()
+    except ValueError:
+        # client disconnected
+        pass
+
+
+def run(handler: str, workers: int, batch_size: int = 1) -> float:
+    os.environ[djl_python_engine.PIPELINE_WORKERS_ENV] = str(workers)
+    os.environ[djl_python_engine.BATCH_SIZE_ENV] = str(batch_size)
+    with tempfile.TemporaryDirectory() as tmp:
+        sock_name = os.path.join(tmp, "sock")
+        args = argparse.Namespace(sock_type="unix",
+                                  sock_name=sock_name,
+                                  port=None,
+                                  device_id="-1",
+                                  tensor_parallel_degree=None)
+        module = types.SimpleNamespace(handle=handle,
+                                       handle_async=handle_async,
+                                       handle_batch=handle_batch)
+        service = ModelService(module, tmp)
+        engine = djl_python_engine.PythonEngine(args, service)
+        server = threading.Thread(target=serve, args=(engine, ), daemon=True)
+        server.start()
+        while not os.path.exists(sock_name):
+            time.sleep(0.01)
+
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+            conn.connect(sock_name)
+            requests = [
+                encode_request(handler,
+                               str(i).encode(), str(i))
+                for i in range(REQUESTS)
+            ]
+            begin = time.perf_counter()
+            sender = threading.Thread(
+                target=lambda: [conn.sendall(r) for r in requests])
+            sender.start()
+            reader = SocketReader(conn)
+            seq_ids = set()
+            for _ in range(REQUESTS):
+                properties = read_output(reader)
+                seq_ids.add(properties.get(djl_python_engine.REQUEST_SEQ_ID))
+            elapsed = time.perf_counter() - begin
+            sender.join()
+        engine.sock.close()
+    if workers > 0 or batch_size > 1:
+        assert len(seq_ids) == REQUESTS, "duplicated request sequence id"
+    return REQUESTS / elapsed
+
+
+def main():
+    print(f"{'handler':>14} {'workers':>8} {'batch':>6} {'req/s':>10}")
+    for handler in ("handle", "handle_async"):
+        for workers in (0, 4, 16, 64, 256):
+            print(f"{handler:>14} {workers:>8} {1:>6} "
+                  f"{run(handler, workers):>10.1f}")
+    for batch_size in (1, 8, 32):
+        print(f"{'handle_batch':>14} {batch_size:>8} {batch_size:>6} "
+              f"{run('handle_batch', batch_size, batch_size):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
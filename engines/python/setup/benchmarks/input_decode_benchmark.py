@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+#
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file
+# except in compliance with the License. A copy of the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "LICENSE.txt" file accompanying this file. This file is distributed on an "AS IS"
+# BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, express or implied. See the License for
+# the specific language governing permissions and limitations under the License.
+"""
+Micro-benchmark for decoding ``Input`` values.
+
+Runs handlers that read the same request through several accessors, like
+``get_data`` followed by ``get_as_json``, on a new ``Input`` per request.
+Compares the cached accessors with the previous ones that decode the value
+on every call.
+
+Usage: python -m benchmarks.input_decode_benchmark
+"""
+
+import io
+import json
+import timeit
+
+import numpy as np
+
+from djl_python import Input
+from djl_python.np_util import from_nd_list, to_nd_list
+
+
+class LegacyInput(Input):
+
+    def get_as_string(self, key=None) -> str:
+        return self.get_as_bytes(key=key).decode("utf-8")
+
+    def get_as_json(self, key=None):
+        return json.loads((self.get_as_bytes(key=key).decode("utf-8")))
+
+    def get_as_numpy(self, key=None) -> list:
+        return from_nd_list(self.get_as_bytes(key=key))
+
+    def get_as_npz(self, key=None) -> list:
+        npz = np.load(io.BytesIO(self.get_as_bytes(key=key)))
+        return [npz[name] for name in npz.files]
+
+
+def create_request(cls, content_type: str, data: bytes) -> Input:
+    request = cls()
+    request.properties["content-type"] = content_type
+    request.content.add(key="data", value=bytearray(data))
+    return request
+
+
+def json_handler(request: Input):
+    if isinstance(request.get_data(), dict):
+        inputs = request.get_as_json()["inputs"]
+    else:
+        inputs = request.get_as_string()
+    return inputs, request.get_as_json().get("parameters", {})
+
+
+def text_handler(request: Input):
+    text = request.get_data()
+    if text.startswith("{"):
+        return request.get_as_json()
+    return request.get_as_csv()
+
+
+def npz_handler(request: Input):
+    if len(request.get_data()) > 1:
+        return request.get_as_npz()[1]
+    return request.get_as_npz()[0]
+
+
+def ndlist_handler(request: Input):
+    if len(request.get_data()) > 1:
+        return request.get_as_numpy()[1]
+    return request.get_as_numpy()[0]
+
+
+def npz_bytes(np_list: list) -> bytes:
+    memory_file = io.BytesIO()
+    np.savez(memory_file, *np_list)
+    return memory_file.getvalue()
+
+
+def main():
+    prompt = " ".join(["Deep Java Library serves deep learning models"] * 64)
+    request = {"inputs": [prompt] * 8, "parameters": {"max_new_tokens": 128}}
+    rows = "\n".join(f"{i},{prompt}" for i in range(256))
+    small = [np.ones((4, 16), dtype=np.float32) for _ in range(4)]
+    large = [np.ones((256, 1024), dtype=np.float32) for _ in range(4)]
+    cases = (
+        ("json", json_handler, "application/json",
+         json.dumps(request).encode("utf-8")),
+        ("csv", text_handler, "text/csv",
+         f"id,inputs\n{rows}".encode("utf-8")),
+        ("npz 1KB", npz_handler, "tensor/npz", npz_bytes(small)),
+        ("npz 4MB", npz_handler, "tensor/npz", npz_bytes(large)),
+        ("ndlist 1KB", ndlist_handler, "tensor/ndlist", to_nd_list(small)),
+        ("ndlist 4MB", ndlist_handler, "tensor/ndlist", to_nd_list(large)),
+    )
+    print(f"{'handler':>10} {'legacy us':>10} {'cached us':>10} "
+          f"{'speedup':>8}")
+    for name, handler, content_type, data in cases:
+        number = 20 if len(data) > 1 << 20 else 2000
+        legacy = timeit.timeit(
+            lambda: handler(create_request(LegacyInput, content_type, data)),
+            number=number) / number
+        cached = timeit.timeit(
+            lambda: handler(create_request(Input, content_type, data)),
+            number=number) / number
+        print(f"{name:>10} {legacy * 1e6:>10.1f} {cached * 1e6:>10.1f} "
+              f"{legacy / cached:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
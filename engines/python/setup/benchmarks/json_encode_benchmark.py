@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+#
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file
+# except in compliance with the License. A copy of the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "LICENSE.txt" file accompanying this file. This file is distributed on an "AS IS"
+# BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, express or implied. See the License for
+# the specific language governing permissions and limitations under the License.
+"""
+Micro-benchmark for encoding JSON outputs.
+
+Encodes a dict-of-lists response and embedding matrices with
+``Output.add_as_json`` for each JSON backend, and with the former
+``indent=2`` encoder as a baseline. Reports the time and size per response.
+
+Usage: python -m benchmarks.json_encode_benchmark
+"""
+
+import json
+import time
+
+import numpy as np
+
+from djl_python import outputs
+from djl_python.outputs import Output, set_json_backend
+
+
+class LegacyEncoder(json.JSONEncoder):
+
+    def default(self, obj):
+        import datetime
+        if isinstance(obj, datetime.datetime):
+            return obj.__str__()
+
+        try:
+            import numpy as np
+            if isinstance(obj, np.integer):
+                return int(obj)
+            elif isinstance(obj, np.floating):
+                return float(obj)
+            elif isinstance(obj, np.ndarray):
+                return obj.tolist()
+        except ImportError:
+            pass
+
+        return super(LegacyEncoder, self).default(obj)
+
+
+class LegacyBackend(object):
+
+    def dumps(self, val):
+        return bytearray(
+            json.dumps(val,
+                       ensure_ascii=False,
+                       allow_nan=False,
+                       indent=2,
+                       cls=LegacyEncoder,
+                       separators=(",", ":")).encode("utf-8"))
+
+
+def responses():
+    rand = np.random.default_rng(0)
+    words = ["Deep", "Java", "Library", "serves", "models", "fast"]
+    yield "dict of lists", {
+        "generated_text":
+        [" ".join(rand.choice(words, 32)) for _ in range(64)],
+        "scores": rand.random(64).tolist(),
+        "token_ids": rand.integers(0, 50000, (64, 32)).tolist(),
+    }
+    for rows in (1, 64):
+        embeddings = rand.standard_normal((rows, 768), dtype=np.float32)
+        yield f"embeddings {rows}x768", {"embeddings": embeddings}
+    scores = [np.float32(s) for s in rand.random(1024)]
+    yield "1024 numpy scalars", {"scores": scores}
+
+
+def timed(val, iterations=20):
+    Output().add_as_json(val)
+    begin = time.perf_counter()
+    for _ in range(iterations):
+        size = len(Output().add_as_json(val).content.value_at(0))
+    return (time.perf_counter() - begin) / iterations, size
+
+
+def main():
+    backends = {"legacy": LegacyBackend(), "json": "json"}
+    if outputs.orjson is not None:
+        backends["orjson"] = "orjson"
+    print(f"{'response':>20} {'backend':>8} {'ms':>8} {'KB':>8}")
+    for name, val in responses():
+        for backend_name, backend in backends.items():
+            set_json_backend(backend)
+            elapsed, size = timed(val)
+            print(f"{name:>20} {backend_name:>8} {elapsed * 1000:>8.3f} "
+                  f"{size / 1024:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
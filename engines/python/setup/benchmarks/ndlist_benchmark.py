@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+#
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file
+# except in compliance with the License. A copy of the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "LICENSE.txt" file accompanying this file. This file is distributed on an "AS IS"
+# BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, express or implied. See the License for
+# the specific language governing permissions and limitations under the License.
+"""
+Micro-benchmark for NDList encoding and decoding.
+
+Compares ``np_util.to_nd_list`` and ``np_util.from_nd_list`` with the
+previous implementations across array counts and sizes.
+
+Usage: python -m benchmarks.ndlist_benchmark
+"""
+
+import timeit
+
+import numpy as np
+
+from djl_python import np_util
+
+
+def legacy_from_nd_list(encoded: bytearray) -> list:
+    idx = 0
+    num_ele, idx = np_util.get_int(encoded, idx)
+    result = []
+    for _ in range(num_ele):
+        _, idx = np_util.get_str(encoded, idx)
+        _, idx = np_util.get_int(encoded, idx)
+        flag, idx = np_util.get_byte_as_int(encoded, idx)
+        if flag == 1:
+            _, idx = np_util.get_str(encoded, idx)
+        _, idx = np_util.get_str(encoded, idx)
+        datatype, idx = np_util.get_str(encoded, idx)
+        length, idx = np_util.get_int(encoded, idx)
+        shape = []
+        for _ in range(length):
+            dim, idx = np_util.get_long(encoded, idx)
+            shape.append(dim)
+        layout_len, idx = np_util.get_int(encoded, idx)
+        for _ in range(layout_len):
+            _, idx = np_util.get_char(encoded, idx)
+        order, idx = np_util.get_byte_as_int(encoded, idx)
+        data_length, idx = np_util.get_int(encoded, idx)
+        data, idx = np_util.get_bytes(encoded, idx, data_length)
+        dtype = np.dtype(datatype.lower())
+        nd = np.ndarray(shape, dtype.newbyteorder(chr(order)), data)
+        result.append(nd)
+    return result
+
+
+def legacy_to_nd_list(np_list: list) -> bytearray:
+    arr = bytearray()
+    arr.extend(np_util.set_int(len(np_list)))
+    for nd in np_list:
+        arr.extend(np_util.set_str(np_util.MAGIC_NUMBER))
+        arr.extend(np_util.set_int(np_util.VERSION))
+        arr.append(0)
+        arr.extend(np_util.set_str("default"))
+        arr.extend(np_util.set_str(str(nd.dtype).upper()))
+        arr.extend(np_util.set_int(len(nd.shape)))
+        layout = ""
+        for ele in nd.shape:
+            arr.extend(np_util.set_long(ele))
+            layout += "?"
+        arr.extend(np_util.set_int(len(layout)))
+        for ele in layout:
+            arr.extend(np_util.set_char(ele))
+        arr.append(ord('<'))
+        nd_bytes = nd.astype(nd.dtype.newbyteorder('<')).tobytes("C")
+        arr.extend(np_util.set_int(len(nd_bytes)))
+        arr.extend(nd_bytes)
+    return arr
+
+
+def main():
+    print(f"{'arrays':>8} {'shape':>14} {'op':>7} {'legacy us':>12} "
+          f"{'new us':>10}")
+    for count in (1, 10, 100, 500):
+        for shape in ((4, ), (32, 32), (256, 1024)):
+            if count * np.prod(shape) > 64 << 20:
+                continue
+            np_list = [np.ones(shape, dtype=np.float32) for _ in range(count)]
+            encoded = np_util.to_nd_list(np_list)
+            number = max(3, 20000 // count)
+            cases = (("encode", lambda: legacy_to_nd_list(np_list),
+                      lambda: np_util.to_nd_list(np_list)),
+                     ("decode", lambda: legacy_from_nd_list(encoded),
+                      lambda: np_util.from_nd_list(encoded)))
+            for op, legacy_func, new_func in cases:
+                legacy = timeit.timeit(legacy_func, number=number) / number
+                new = timeit.timeit(new_func, number=number) / number
+                print(f"{count:>8} {str(shape):>14} {op:>7} "
+                      f"{legacy * 1e6:>12.1f} {new * 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+#
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file
+# except in compliance with the License. A copy of the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "LICENSE.txt" file accompanying this file. This file is distributed on an "AS IS"
+# BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, express or implied. See the License for
+# the specific language governing permissions and limitations under the License.
+"""
+CPU benchmark for the host side of the transformers-neuronx stream generator.
+
+A stub model returns precomputed scores instantly, so the reported time per
+step is the sampling, stopping and detokenization overhead of the generator.
+
+Usage: python -m benchmarks.neuronx_stream_benchmark
+"""
+
+import time
+
+import torch
+
+from djl_python.streaming_utils import StreamingUtils
+from djl_python.tests import tiny_models
+
+NEW_TOKENS = 128
+
+
+class StubModel(object):
+
+    def __init__(self, vocab_size, eos_token_id):
+        generator = torch.Generator().manual_seed(0)
+        self.scores = torch.randn(64, vocab_size, generator=generator)
+        # EOS is never sampled, every request runs to the token budget
+        self.scores[:, eos_token_id] = -1e4
+
+    def reset(self):
+        pass
+
+    def __call__(self, input_ids, position_ids):
+        return self.scores[:input_ids.shape[0]]
+
+
+def main():
+    torch.set_num_threads(1)
+    tokenizer = tiny_models.gpt2_tokenizer()
+    tokenizer.pad_token = tokenizer.eos_token
+    model = StubModel(len(tokenizer), tokenizer.eos_token_id)
+    generator = StreamingUtils.get_stream_generator("transformers-neuronx")
+    print(f"{'batch':>6} {'us/step':>8}")
+    for batch_size in (1, 8, 32):
+        prompts = [
+            tiny_models.CORPUS[i % len(tiny_models.CORPUS)]
+            for i in range(batch_size)
+        ]
+        start = tokenizer(prompts, padding=True,
+                          return_tensors="pt")["input_ids"].shape[1]
+        begin = time.perf_counter()
+        steps = 0
+        for _ in generator(model,
+                           tokenizer,
+                           prompts,
+                           seq_length=start + NEW_TOKENS,
+                           top_k=50):
+            steps += 1
+        elapsed = time.perf_counter() - begin
+        print(f"{batch_size:>6} {elapsed / steps * 1e6:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+#
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file
+# except in compliance with the License. A copy of the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "LICENSE.txt" file accompanying this file. This file is distributed on an "AS IS"
+# BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, express or implied. See the License for
+# the specific language governing permissions and limitations under the License.
+"""
+Micro-benchmark for sending responses over the engine socket.
+
+Reports latency and the peak Python heap allocated by ``Output.send`` for
+payloads from 1 KB to 512 MB.
+
+Usage: python -m benchmarks.output_send_benchmark
+"""
+
+import socket
+import threading
+import time
+import tracemalloc
+
+from djl_python.outputs import Output
+
+SIZES = [1 << 10, 1 << 20, 64 << 20, 512 << 20]
+
+
+def drain(conn):
+    buf = bytearray(1 << 20)
+    while conn.recv_into(buf) > 0:
+        pass
+
+
+def run(size: int, iterations: int):
+    outputs = Output().add_property("content-type",
+                                    "tensor/npz").add(b"\0" * size, key="data")
+    s1, s2 = socket.socketpair()
+    with s1, s2:
+        receiver = threading.Thread(target=drain, args=(s2, ))
+        receiver.start()
+        tracemalloc.start()
+        begin = time.perf_counter()
+        for _ in range(iterations):
+            outputs.send(s1)
+        elapsed = time.perf_counter() - begin
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        s1.shutdown(socket.SHUT_WR)
+        receiver.join()
+    return elapsed / iterations, peak
+
+
+def main():
+    print(f"{'size':>10} {'latency ms':>12} {'peak heap MB':>14}")
+    for size in SIZES:
+        iterations = max(2, min(1000, (1 << 30) // size))
+        latency, peak = run(size, iterations)
+        print(f"{size:>10} {latency * 1000:>12.3f} "
+              f"{peak / (1 << 20):>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
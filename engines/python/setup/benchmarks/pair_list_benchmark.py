@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+#
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file
+# except in compliance with the License. A copy of the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "LICENSE.txt" file accompanying this file. This file is distributed on an "AS IS"
+# BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, express or implied. See the License for
+# the specific language governing permissions and limitations under the License.
+"""
+Micro-benchmark for PairList lookups.
+
+Looks up keys of a PairList with 10, 1k and 100k entries repeatedly,
+compared with the previous linear scan lookup.
+
+Usage: python -m benchmarks.pair_list_benchmark
+"""
+
+import time
+
+from djl_python import PairList
+
+ROUNDS = 10
+
+
+def legacy_get(pairs: PairList, key):
+    if key not in pairs.keys:
+        return None
+    key_index = pairs.keys.index(key)
+    return pairs.values[key_index]
+
+
+def main():
+    print(f"{'entries':>8} {'legacy ns/get':>14} {'new ns/get':>11}")
+    for size in (10, 1000, 100000):
+        pairs = PairList()
+        for i in range(size):
+            pairs.add(f"batch_{i}.data", i)
+        keys = pairs.get_keys()[::max(1, size // 1000)]
+        results = []
+        for get in (legacy_get, PairList.get):
+            begin = time.perf_counter()
+            for _ in range(ROUNDS):
+                for key in keys:
+                    get(pairs, key)
+            elapsed = time.perf_counter() - begin
+            results.append(elapsed / len(keys) / ROUNDS * 1e9)
+        print(f"{size:>8} {results[0]:>14.0f} {results[1]:>11.0f}")
+
+
+if __name__ == "__main__":
+    main()
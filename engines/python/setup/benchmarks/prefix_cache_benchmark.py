@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+#
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file
+# except in compliance with the License. A copy of the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "LICENSE.txt" file accompanying this file. This file is distributed on an "AS IS"
+# BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, express or implied. See the License for
+# the specific language governing permissions and limitations under the License.
+"""
+CPU benchmark for the prompt prefix KV cache.
+
+Streams requests that share a long system prompt from a randomly
+initialized tiny Llama model, with and without a ``PrefixCache``, and
+reports the time to first token.
+
+Usage: python -m benchmarks.prefix_cache_benchmark
+"""
+
+import statistics
+import time
+
+import torch
+
+from djl_python.prefix_cache import PrefixCache
+from djl_python.streaming_utils import StreamingUtils
+from djl_python.tests import tiny_models
+
+REQUESTS = 32
+
+
+def run(model, tokenizer, prompts, prefix_cache):
+    generator = StreamingUtils.get_stream_generator("Accelerate")
+    ttft = []
+    for prompt in prompts:
+        begin = time.perf_counter()
+        stream = generator(model,
+                           tokenizer, [prompt],
+                           max_new_tokens=4,
+                           prefix_cache=prefix_cache)
+        next(stream)
+        ttft.append((time.perf_counter() - begin) * 1000)
+        for _ in stream:
+            pass
+    return ttft
+
+
+def main():
+    torch.set_num_threads(1)
+    tokenizer = tiny_models.gpt2_tokenizer()
+    model = tiny_models.llama_model(len(tokenizer),
+                                    num_hidden_layers=4,
+                                    hidden_size=256)
+    system = " ".join(tiny_models.CORPUS * 8)
+    questions = [
+        f" Question {i}: {tiny_models.CORPUS[i % 3][:20]}"
+        for i in range(REQUESTS)
+    ]
+    prompts = [system + q for q in questions]
+    print(f"prompt tokens: {len(tokenizer(prompts[0])['input_ids'])}")
+    # warm up
+    run(model, tokenizer, prompts[:2], None)
+    print(f"{'cache':>6} {'TTFT mean ms':>13} {'TTFT p50 ms':>12} "
+          f"{'hits':>5} {'misses':>7} {'KB':>6}")
+    for cache in (None, PrefixCache(max_bytes=64 * 1024 * 1024)):
+        ttft = run(model, tokenizer, prompts, cache)
+        hits, misses, size = (0, 0,
+                              0) if cache is None else (cache.hits,
+                                                        cache.misses,
+                                                        cache.nbytes // 1024)
+        print(f"{'off' if cache is None else 'on':>6} "
+              f"{statistics.mean(ttft):>13.2f} "
+              f"{statistics.median(ttft):>12.2f} {hits:>5} {misses:>7} "
+              f"{size:>6}")
+
+
+if __name__ == "__main__":
+    main()
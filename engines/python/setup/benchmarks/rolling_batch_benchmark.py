@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+#
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file
+# except in compliance with the License. A copy of the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "LICENSE.txt" file accompanying this file. This file is distributed on an "AS IS"
+# BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, express or implied. See the License for
+# the specific language governing permissions and limitations under the License.
+"""
+CPU benchmark for the rolling batch scheduler.
+
+Requests with random output lengths arrive at random intervals. They are
+served either by static batches that stream to completion with
+``StreamingUtils``, or by ``RollingBatch``. Reports the generated tokens per
+second and the time to first token.
+
+Usage: python -m benchmarks.rolling_batch_benchmark
+"""
+
+import random
+import statistics
+import time
+
+import torch
+
+from djl_python.rolling_batch import RollingBatch
+from djl_python.streaming_utils import StreamingUtils
+from djl_python.tests import tiny_models
+
+REQUESTS = 128
+MAX_BATCH_SIZE = 16
+# mean interval between two requests
+ARRIVAL_INTERVAL = 0.005
+
+
+def workload():
+    rand = random.Random(0)
+    arrival = 0
+    requests = []
+    for i in range(REQUESTS):
+        arrival += rand.expovariate(1 / ARRIVAL_INTERVAL)
+        prompt = tiny_models.CORPUS[i % len(tiny_models.CORPUS)]
+        requests.append((arrival, prompt, rand.randint(8, 128)))
+    return requests
+
+
+def run_static(model, tokenizer, requests):
+    generator = StreamingUtils.get_stream_generator("Accelerate")
+    ttft = []
+    begin = time.perf_counter()
+    i = 0
+    while i < len(requests):
+        now = time.perf_counter() - begin
+        if requests[i][0] > now:
+            time.sleep(requests[i][0] - now)
+            now = requests[i][0]
+        batch = [r for r in requests[i:i + MAX_BATCH_SIZE] if r[0] <= now]
+        i += len(batch)
+        max_new_tokens = max(r[2] for r in batch)
+        for step, _ in enumerate(
+                generator(model,
+                          tokenizer, [r[1] for r in batch],
+                          max_new_tokens=max_new_tokens)):
+            if step == 0:
+                first = time.perf_counter() - begin
+                ttft.extend(first - r[0] for r in batch)
+    return time.perf_counter() - begin, ttft
+
+
+def run_rolling(model, tokenizer, requests):
+    rolling_batch = RollingBatch(model,
+                                 tokenizer,
+                                 max_batch_size=MAX_BATCH_SIZE)
+    submitted = []
+    begin = time.perf_counter()
+    for arrival, prompt, max_new_tokens in requests:
+        delay = arrival - (time.perf_counter() - begin)
+        if delay > 0:
+            time.sleep(delay)
+        submitted.append(
+            rolling_batch.submit(prompt, max_new_tokens=max_new_tokens))
+    for request in submitted:
+        for _ in request.stream():
+            pass
+    elapsed = max(r.finish_time for r in submitted) - begin
+    ttft = [r.first_token_time - r.submit_time for r in submitted]
+    return elapsed, ttft
+
+
+def main():
+    torch.set_num_threads(1)
+    tokenizer = tiny_models.gpt2_tokenizer()
+    model = tiny_models.gpt2_model(len(tokenizer))
+    requests = workload()
+    tokens = sum(r[2] for r in requests)
+    print(f"{'scheduler':>10} {'tok/s':>8} {'TTFT mean ms':>13} "
+          f"{'TTFT p90 ms':>12}")
+    for name, run in (("static", run_static), ("rolling", run_rolling)):
+        elapsed, ttft = run(model, tokenizer, requests)
+        p90 = statistics.quantiles(ttft, n=10)[-1]
+        print(f"{name:>10} {tokens / elapsed:>8.0f} "
+              f"{statistics.mean(ttft) * 1000:>13.1f} {p90 * 1000:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
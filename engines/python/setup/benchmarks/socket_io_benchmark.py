@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+#
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file
+# except in compliance with the License. A copy of the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "LICENSE.txt" file accompanying this file. This file is distributed on an "AS IS"
+# BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, express or implied. See the License for
+# the specific language governing permissions and limitations under the License.
+"""
+Micro-benchmark for reading requests from the engine socket.
+
+Pushes payloads from 1 KB to 256 MB through a socketpair and reports the
+throughput of ``Input.read`` on a raw socket and on a reused SocketReader.
+
+Usage: python -m benchmarks.socket_io_benchmark
+"""
+
+import socket
+import struct
+import threading
+import time
+
+from djl_python.inputs import Input, SocketReader
+from djl_python.outputs import Output
+
+SIZES = [1 << 10, 64 << 10, 1 << 20, 16 << 20, 256 << 20]
+
+
+def encode_request(payload: bytes) -> bytes:
+    msg = bytearray()
+    msg += struct.pack('>h', 2)
+    for k, v in (("content-type", "tensor/ndlist"), ("handler", "handle")):
+        Output.write_utf8(msg, k)
+        Output.write_utf8(msg, v)
+    msg += struct.pack('>h', 1)
+    Output.write_utf8(msg, "data")
+    msg += struct.pack('>i', len(payload))
+    msg += payload
+    return bytes(msg)
+
+
+def run(size: int, iterations: int, reuse_reader: bool) -> float:
+    request = encode_request(b"\0" * size)
+    s1, s2 = socket.socketpair()
+    with s1, s2:
+        sender = threading.Thread(
+            target=lambda: [s1.sendall(request) for _ in range(iterations)])
+        conn = SocketReader(s2) if reuse_reader else s2
+        begin = time.perf_counter()
+        sender.start()
+        for _ in range(iterations):
+            Input().read(conn)
+        elapsed = time.perf_counter() - begin
+        sender.join()
+    return elapsed
+
+
+def main():
+    print(f"{'size':>10} {'mode':>8} {'req/s':>10} {'MB/s':>10}")
+    for size in SIZES:
+        iterations = max(2, min(2000, (256 << 20) // size))
+        for reuse in (False, True):
+            elapsed = run(size, iterations, reuse)
+            mode = "reader" if reuse else "socket"
+            print(f"{size:>10} {mode:>8} {iterations / elapsed:>10.1f} "
+                  f"{size * iterations / elapsed / (1 << 20):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+#
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file
+# except in compliance with the License. A copy of the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "LICENSE.txt" file accompanying this file. This file is distributed on an "AS IS"
+# BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, express or implied. See the License for
+# the specific language governing permissions and limitations under the License.
+"""
+CPU benchmark for speculative decoding.
+
+Streams single prompts from a randomly initialized tiny GPT-2 target model,
+without a draft model and with draft models that share the first layers of
+the target, and reports the draft token acceptance rate and tokens/sec.
+
+Usage: python -m benchmarks.speculative_benchmark
+"""
+
+import copy
+import time
+
+import torch
+
+from djl_python.speculative_decoding import SpeculativeDecoder
+from djl_python.streaming_utils import StreamingUtils
+from djl_python.tests import tiny_models
+
+MAX_NEW_TOKENS = 64
+
+
+def truncated_model(model, n_layer):
+    draft = copy.deepcopy(model)
+    draft.transformer.h = draft.transformer.h[:n_layer]
+    draft.config.n_layer = n_layer
+    return draft
+
+
+def run(model, tokenizer, decoder, **kwargs):
+    generator = StreamingUtils.get_stream_generator("Accelerate")
+    begin = time.perf_counter()
+    texts = []
+    for prompt in tiny_models.CORPUS:
+        text = ""
+        for token_text in generator(model,
+                                    tokenizer, [prompt],
+                                    max_new_tokens=MAX_NEW_TOKENS,
+                                    speculative_decoder=decoder,
+                                    **kwargs):
+            text += token_text[0]
+        texts.append(text)
+    elapsed = time.perf_counter() - begin
+    # generation may stop early at EOS
+    tokens = sum(len(ids) for ids in tokenizer(texts)["input_ids"])
+    return tokens / elapsed
+
+
+def main():
+    torch.set_num_threads(1)
+    tokenizer = tiny_models.gpt2_tokenizer()
+    model = tiny_models.gpt2_model(len(tokenizer),
+                                   n_layer=12,
+                                   n_embd=256,
+                                   n_head=4)
+    run(model, tokenizer, None)
+    print(f"{'mode':>8} {'draft':>12} {'k':>3} {'accept %':>9} "
+          f"{'tok/s':>8}")
+    for mode, kwargs in (("greedy", {}), ("sampling", {
+            "do_sample": True,
+            "manual_seed": 0
+    })):
+        print(f"{mode:>8} {'none':>12} {'-':>3} {'-':>9} "
+              f"{run(model, tokenizer, None, **kwargs):>8.1f}")
+        for n_layer in (1, 2):
+            draft = truncated_model(model, n_layer)
+            for k in (2, 4):
+                decoder = SpeculativeDecoder(draft, num_speculative_tokens=k)
+                tps = run(model, tokenizer, decoder, **kwargs)
+                print(f"{mode:>8} {f'{n_layer} layer':>12} {k:>3} "
+                      f"{decoder.acceptance_rate * 100:>9.1f} {tps:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+#
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file
+# except in compliance with the License. A copy of the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "LICENSE.txt" file accompanying this file. This file is distributed on an "AS IS"
+# BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, express or implied. See the License for
+# the specific language governing permissions and limitations under the License.
+"""
+CPU benchmark for the static KV cache of the streaming generator.
+
+Streams long generations from a randomly initialized tiny Llama model with
+the dynamic and the static KV cache, and reports the per token latency
+distribution.
+
+Usage: python -m benchmarks.static_cache_benchmark
+"""
+
+import statistics
+import time
+
+import torch
+
+from djl_python.streaming_utils import StreamingUtils
+from djl_python.tests import tiny_models
+
+BATCH_SIZE = 8
+MAX_NEW_TOKENS = 1024
+
+
+def run(model, tokenizer, **kwargs):
+    inputs = [
+        tiny_models.CORPUS[i % len(tiny_models.CORPUS)]
+        for i in range(BATCH_SIZE)
+    ]
+    generator = StreamingUtils.get_stream_generator("Accelerate")
+    latencies = []
+    begin = time.perf_counter()
+    for _ in generator(model,
+                       tokenizer,
+                       inputs,
+                       max_new_tokens=MAX_NEW_TOKENS,
+                       **kwargs):
+        end = time.perf_counter()
+        latencies.append((end - begin) * 1000)
+        begin = end
+    return latencies
+
+
+def main():
+    torch.set_num_threads(1)
+    tokenizer = tiny_models.gpt2_tokenizer()
+    model = tiny_models.llama_model(len(tokenizer), hidden_size=256)
+    # warm up
+    run(model, tokenizer, use_static_cache=True)
+    print(f"{'cache':>8} {'tokens':>7} {'mean ms':>8} {'p50 ms':>7} "
+          f"{'p99 ms':>7} {'stdev ms':>9}")
+    for name, static in (("dynamic", False), ("static", True)):
+        latencies = run(model, tokenizer, use_static_cache=static)[1:]
+        p99 = statistics.quantiles(latencies, n=100)[-1]
+        print(f"{name:>8} {len(latencies) + 1:>7} "
+              f"{statistics.mean(latencies):>8.2f} "
+              f"{statistics.median(latencies):>7.2f} {p99:>7.2f} "
+              f"{statistics.stdev(latencies):>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+#
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file
+# except in compliance with the License. A copy of the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "LICENSE.txt" file accompanying this file. This file is distributed on an "AS IS"
+# BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, express or implied. See the License for
+# the specific language governing permissions and limitations under the License.
+"""
+Micro-benchmark for the streaming output formats.
+
+Replays the tokens of a batch of texts through ``TokenSampler.emit`` and
+``Output.send`` in each format selected by the Accept header, and reports
+the bytes on the wire and the CPU time per token. The CPU time covers the
+detokenization, which the token ids format skips, and the formatting.
+
+Usage: python -m benchmarks.stream_formats_benchmark
+"""
+
+import random
+import time
+
+from djl_python.outputs import Output
+from djl_python.streaming_utils import IncrementalDetokenizer, TokenSampler
+from djl_python.tests import tiny_models
+
+BATCH_SIZE = 8
+STEPS = 512
+FORMATS = {
+    "json lines": (None, {}),
+    "sse": ("text/event-stream", {}),
+    "token ids": ("tensor/token-ids", {
+        "output_token_ids": True
+    }),
+    "token ids+logprobs": ("tensor/token-ids", {
+        "output_token_ids": True,
+        "output_logprobs": True
+    }),
+}
+
+
+class CountingSocket(object):
+
+    def __init__(self):
+        self.size = 0
+
+    def sendall(self, data):
+        self.size += len(data)
+
+
+def replay(tokenizer, token_ids, logprobs, kwargs):
+    sampler = TokenSampler(tokenizer,
+                           [IncrementalDetokenizer([]) for _ in token_ids],
+                           max_new_tokens=STEPS + 1,
+                           **kwargs)
+    for step in range(STEPS):
+        texts, _ = sampler.emit([ids[step] for ids in token_ids],
+                                logprobs if sampler.output_logprobs else None)
+        yield texts
+
+
+def run(tokenizer, token_ids, accept, kwargs):
+    logprobs = [-1.0] * BATCH_SIZE
+    outputs = Output()
+    outputs.add_stream_content(replay(tokenizer, token_ids, logprobs, kwargs),
+                               accept=accept)
+    cl_socket = CountingSocket()
+    begin = time.process_time()
+    outputs.send(cl_socket)
+    elapsed = time.process_time() - begin
+    tokens = BATCH_SIZE * STEPS
+    return cl_socket.size / tokens, elapsed / tokens
+
+
+def main():
+    tokenizer = tiny_models.gpt2_tokenizer()
+    words = " ".join(tiny_models.CORPUS).split()
+    rand = random.Random(0)
+    eos = tokenizer.eos_token_id
+    token_ids = []
+    for _ in range(BATCH_SIZE):
+        text = " ".join(rand.choice(words) for _ in range(STEPS))
+        ids = [i for i in tokenizer(text)["input_ids"] if i != eos]
+        token_ids.append(ids[:STEPS])
+    print(f"{'format':>20} {'bytes/token':>12} {'us/token':>9}")
+    for name, (accept, kwargs) in FORMATS.items():
+        size, cpu = run(tokenizer, token_ids, accept, kwargs)
+        print(f"{name:>20} {size:>12.1f} {cpu * 1e6:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+#
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file
+# except in compliance with the License. A copy of the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "LICENSE.txt" file accompanying this file. This file is distributed on an "AS IS"
+# BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, express or implied. See the License for
+# the specific language governing permissions and limitations under the License.
+"""
+Micro-benchmark for sending streaming outputs over the engine socket.
+
+Streams batch-64 token frames with the default formatter and reports the
+frames per second and the number of sends for several flush policies. The
+``compute`` column sleeps for that long before each frame to stand in for
+a model forward pass, which releases the GIL.
+
+Then compares the bytes sent for a batch whose sequences finish at
+different steps, as one JSON line per step and in batched mode, and the
+bytes each client has to parse.
+
+Usage: python -m benchmarks.stream_frames_benchmark
+"""
+
+import socket
+import threading
+import time
+
+from djl_python.outputs import Output, StreamFlushPolicy
+
+BATCH_SIZE = 64
+FRAMES = 20000
+POLICIES = {
+    "default": StreamFlushPolicy(),
+    "items=32": StreamFlushPolicy(max_items=32),
+    "items=32 latency=2": StreamFlushPolicy(max_items=32, max_latency_ms=2),
+    "items=32 drain": StreamFlushPolicy(max_items=32, background=True),
+}
+
+
+class CountingSocket(object):
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.sends = 0
+
+    def sendall(self, data):
+        self.sends += 1
+        self.sock.sendall(data)
+
+
+def drain(conn):
+    buf = bytearray(1 << 20)
+    while conn.recv_into(buf) > 0:
+        pass
+
+
+def tokens(frames: int, compute: float):
+    token_texts = [" token"] * BATCH_SIZE
+    for _ in range(frames):
+        if compute:
+            time.sleep(compute)
+        yield token_texts
+
+
+def run(policy: StreamFlushPolicy, frames: int, compute: float):
+    outputs = Output()
+    outputs.add_stream_content(tokens(frames, compute))
+    s1, s2 = socket.socketpair()
+    with s1, s2:
+        receiver = threading.Thread(target=drain, args=(s2, ))
+        receiver.start()
+        cl_socket = CountingSocket(s1)
+        begin = time.perf_counter()
+        outputs.send(cl_socket, policy)
+        elapsed = time.perf_counter() - begin
+        s1.shutdown(socket.SHUT_WR)
+        receiver.join()
+    return frames / elapsed, cl_socket.sends
+
+
+def staggered_tokens(frames: int, finished: object):
+    for step in range(frames):
+        # sequence i finishes after i * frames / BATCH_SIZE steps
+        yield [
+            " token" if i * frames >= step * BATCH_SIZE else finished
+            for i in range(BATCH_SIZE)
+        ]
+
+
+def stream_bytes(batched: bool):
+    outputs = Output()
+    finished = None if batched else ""
+    outputs.add_stream_content(staggered_tokens(FRAMES // 10, finished),
+                               batched=batched)
+    s1, s2 = socket.socketpair()
+    with s1, s2:
+        received = []
+
+        def receive():
+            buf = bytearray(1 << 20)
+            while True:
+                size = s2.recv_into(buf)
+                if size == 0:
+                    return
+                received.append(size)
+
+        receiver = threading.Thread(target=receive)
+        receiver.start()
+        outputs.send(s1, StreamFlushPolicy(max_items=32))
+        s1.shutdown(socket.SHUT_WR)
+        receiver.join()
+    return sum(received)
+
+
+def main():
+    print(f"{'policy':>20} {'compute us':>11} {'frames/s':>10} {'sends':>7}")
+    for compute in (0, 100e-6):
+        frames = FRAMES if compute == 0 else FRAMES // 10
+        for name, policy in POLICIES.items():
+            rate, sends = run(policy, frames, compute)
+            print(f"{name:>20} {compute * 1e6:>11.0f} {rate:>10.0f} "
+                  f"{sends:>7}")
+
+    # every client parses the whole line, or only its own frames
+    print(f"\n{'mode':>8} {'bytes sent':>11} {'bytes/client':>13}")
+    for batched in (False, True):
+        sent = stream_bytes(batched)
+        per_client = sent // BATCH_SIZE if batched else sent
+        print(f"{'batched' if batched else 'lines':>8} {sent:>11} "
+              f"{per_client:>13}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+#
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file
+# except in compliance with the License. A copy of the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "LICENSE.txt" file accompanying this file. This file is distributed on an "AS IS"
+# BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, express or implied. See the License for
+# the specific language governing permissions and limitations under the License.
+"""
+CPU benchmark for the HuggingFace streaming generator.
+
+Streams tokens from a randomly initialized tiny GPT-2 model with a locally
+trained tokenizer and reports the generated tokens per second for batch
+sizes 1 to 64, with greedy and sampling decoding.
+
+Usage: python -m benchmarks.streaming_benchmark
+"""
+
+import time
+
+import torch
+
+from djl_python.streaming_utils import StreamingUtils
+from djl_python.tests import tiny_models
+
+MAX_NEW_TOKENS = 32
+DECODING = {
+    "greedy": {},
+    "sampling": {
+        "top_k": 50,
+        "top_p": 0.9,
+        "temperature": 0.8
+    },
+}
+
+
+def run(model, tokenizer, batch_size, **kwargs):
+    inputs = [
+        tiny_models.CORPUS[i % len(tiny_models.CORPUS)]
+        for i in range(batch_size)
+    ]
+    generator = StreamingUtils.get_stream_generator("Accelerate")
+    begin = time.perf_counter()
+    steps = sum(1 for _ in generator(
+        model, tokenizer, inputs, max_new_tokens=MAX_NEW_TOKENS, **kwargs))
+    elapsed = time.perf_counter() - begin
+    return steps * batch_size / elapsed
+
+
+def main():
+    torch.set_num_threads(1)
+    tokenizer = tiny_models.gpt2_tokenizer()
+    model = tiny_models.gpt2_model(len(tokenizer))
+    # warm up
+    run(model, tokenizer, 1)
+    print(f"{'batch':>6} " + " ".join(f"{name + ' tok/s':>15}"
+                                      for name in DECODING))
+    for batch_size in (1, 4, 16, 64):
+        results = [
+            run(model, tokenizer, batch_size, **kwargs)
+            for kwargs in DECODING.values()
+        ]
+        print(f"{batch_size:>6} " + " ".join(f"{r:>15.0f}" for r in results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+#
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file
+# except in compliance with the License. A copy of the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "LICENSE.txt" file accompanying this file. This file is distributed on an "AS IS"
+# BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, express or implied. See the License for
+# the specific language governing permissions and limitations under the License.
+
+import logging
+import queue
+import threading
+import time
+
+from .inputs import CaseInsensitiveDict, Input
+from .outputs import Output
+
+
+def merge_inputs(batch: list) -> Input:
+    """
+    Fuses a list of requests into one batch request, the same way the front
+    end batches requests: ``batch_size`` property and ``batch_{i}.`` keys.
+
+    :param batch: list of Input
+    :return: batched Input
+    """
+    merged = Input()
+    merged.function_name = batch[0].function_name
+    merged.properties = CaseInsensitiveDict(batch[0].properties)
+    merged.properties["batch_size"] = str(len(batch))
+    for i, item in enumerate(batch):
+        content = item.get_content()
+        for j in range(content.size()):
+            key = content.key_at(j)
+            key = "data" if key is None else key
+            merged.content.add(key=f"batch_{i}.{key}",
+                               value=content.value_at(j))
+    return merged
+
+
+def split_outputs(outputs: Output, size: int) -> list:
+    """
+    Splits the output of a batch request into one output per request.
+
+    :param outputs: Output of the batch request
+    :param size: batch size
+    :return: list of Output
+    """
+    if outputs.stream_content is not None:
+        return [
+            Output().error("Streaming output is not supported for batch.")
+            for _ in range(size)
+        ]
+
+    content = outputs.content
+    if outputs.code < 300 and content.size() != size:
+        return [
+            Output().error(f"Batch output size mismatch, expected: {size}, "
+                           f"actual: {content.size()}") for _ in range(size)
+        ]
+
+    ret = []
+    for _ in range(size):
+        out = Output(outputs.code, outputs.message)
+        out.properties = dict(outputs.properties)
+        if outputs.code >= 300:
+            out.content = content
+        ret.append(out)
+    if outputs.code >= 300:
+        return ret
+
+    for i in range(content.size()):
+        key = content.key_at(i)
+        prefix, sep, name = key.partition(".") if key else ("", "", "")
+        if not sep or not prefix.startswith("batch_"):
+            raise ValueError(f"Unexpected batch output key: {key}")
+        index = int(prefix[6:])
+        ret[index].content.add(key=name, value=content.value_at(i))
+    return ret
+
+
+class DynamicBatcher(object):
+    """
+    Fuses requests that are queued together into one batch of up to
+    ``max_batch_size`` requests.
+
+    A request that finds no other request queued is invoked at once. Once a
+    batch has more than one request, the batcher waits up to
+    ``max_batch_delay`` milliseconds for more requests to fill it. That wait
+    adds to the latency of every request in the batch.
+
+    Batches only form while the front end has several requests in flight on
+    the same connection. The DJL front end currently waits for each response
+    before it sends the next request to a worker, so every batch has one
+    request and batching adds no throughput.
+
+    ``invoke`` is called with the fused batch ``Input`` and must return the
+    batched ``Output``, each callback receives the ``Output`` of its request.
+    Only requests for the same handler function are batched together.
+    """
+
+    def __init__(self, invoke, max_batch_size: int, max_batch_delay: int):
+        self.invoke = invoke
+        self.max_batch_size = max_batch_size
+        self.max_batch_delay = max_batch_delay / 1000
+        self.requests = queue.Queue()
+        self.thread = threading.Thread(target=self._run,
+                                       name="djl-batcher",
+                                       daemon=True)
+        self.thread.start()
+
+    def submit(self, inputs: Input, callback):
+        """
+        Queues a request for the next batch.
+
+        :param inputs: request Input
+        :param callback: function invoked with the request Output
+        """
+        self.requests.put((inputs, callback))
+
+    def _next_batch(self, pending):
+        batch = [pending or self.requests.get()]
+        function_name = batch[0][0].get_function_name()
+        if self.requests.empty():
+            # don't delay a request that has nothing to be batched with
+            return batch, None
+
+        deadline = time.monotonic() + self.max_batch_delay
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                if timeout > 0:
+                    item = self.requests.get(timeout=timeout)
+                else:
+                    item = self.requests.get_nowait()
+            except queue.Empty:
+                break
+            if item[0].get_function_name() != function_name:
+                return batch, item
+            batch.append(item)
+        return batch, None
+
+    def _run(self):
+        pending = None
+        while True:
+            batch, pending = self._next_batch(pending)
+            if len(batch) == 1:
+                inputs, callback = batch[0]
+                callback(self.invoke(inputs))
+                continue
+
+            logging.debug(f"Dynamic batching size: {len(batch)}.")
+            try:
+                outputs = self.invoke(merge_inputs([b[0] for b in batch]))
+                outputs = split_outputs(outputs, len(batch))
+            except Exception as e:
+                logging.exception("Failed to split batch outputs")
+                outputs = [Output().error(str(e)) for _ in batch]
+            for (_, callback), out in zip(batch, outputs):
+                callback(out)
@@ -0,0 +1,311 @@
+#!/usr/bin/env python
+#
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file
+# except in compliance with the License. A copy of the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "LICENSE.txt" file accompanying this file. This file is distributed on an "AS IS"
+# BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, express or implied. See the License for
+# the specific language governing permissions and limitations under the License.
+
+import torch
+
+from djl_python.streaming_utils import IncrementalDetokenizer, StreamingUtils
+
+
+class BeamHypotheses(object):
+    """
+    The best finished hypotheses of one input, scored by their sum of log
+    probabilities divided by ``generated_len ** length_penalty``.
+    """
+
+    def __init__(self, num_beams: int, length_penalty: float,
+                 early_stopping: bool):
+        self.num_beams = num_beams
+        self.length_penalty = length_penalty
+        self.early_stopping = early_stopping
+        self.beams = []
+        self.worst_score = 1e9
+
+    def __len__(self):
+        return len(self.beams)
+
+    def add(self, token_ids: list, sum_logprobs: float, generated_len: int):
+        score = sum_logprobs / (generated_len**self.length_penalty)
+        if len(self) < self.num_beams or score > self.worst_score:
+            self.beams.append((score, token_ids))
+            if len(self) > self.num_beams:
+                self.beams.sort(key=lambda beam: beam[0])
+                del self.beams[0]
+                self.worst_score = self.beams[0][0]
+            else:
+                self.worst_score = min(score, self.worst_score)
+
+    def is_done(self, best_sum_logprobs: float, generated_len: int) -> bool:
+        """
+        Whether no running beam can become better than the finished
+        hypotheses anymore.
+        """
+        if len(self) < self.num_beams:
+            return False
+        if self.early_stopping:
+            return True
+        best_score = best_sum_logprobs / (generated_len**self.length_penalty)
+        return self.worst_score >= best_score
+
+    def best(self) -> list:
+        return max(self.beams, key=lambda beam: beam[0])[1]
+
+
+def _common_prefix_length(a: list, b: list) -> int:
+    length = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        length += 1
+    return length
+
+
+@torch.inference_mode()
+def beam_search_stream(model, tokenizer, inputs, **kwargs):
+    """
+    Streams the text of the ``beam_size`` beam search for causal and
+    seq2seq language models.
+
+    The beams of all inputs run as one ``[batch * beams]`` batch, the KV
+    cache is reordered with ``index_select`` at each step. A streamed token
+    can't be taken back, so each step only streams the tokens that all
+    running beams and finished hypotheses of an input agree on, the rest of
+    the best hypothesis is streamed when the input is done.
+
+    ``length_penalty`` (default 1.0) is the exponent of the hypothesis
+    length in its score, ``early_stopping`` (default False) stops an input
+    as soon as it has ``beam_size`` finished hypotheses. ``output_token_ids``
+    streams the token ids like ``TokenSampler``, without logprobs.
+    """
+    num_beams = int(kwargs["beam_size"])
+    length_penalty = float(kwargs.get("length_penalty", 1.0))
+    early_stopping = bool(kwargs.get("early_stopping", False))
+    output_token_ids = kwargs.get("output_token_ids", False)
+    # output of the inputs that finished in an earlier step
+    finished_output = None if kwargs.get("batched", False) else ""
+    max_new_tokens = kwargs.get("max_new_tokens",
+                                StreamingUtils.DEFAULT_MAX_NEW_TOKENS)
+    seq2seq = StreamingUtils._get_generic_model_class(model) == "Seq2SeqLM"
+    if not tokenizer.pad_token:
+        tokenizer.pad_token = tokenizer.eos_token
+
+    device = StreamingUtils._get_current_device()
+    tokenized_inputs = tokenizer(inputs, return_tensors="pt",
+                                 padding=True).to(device)
+    input_ids = tokenized_inputs["input_ids"]
+    batch_size, input_length = input_ids.shape
+    processors = StreamingUtils._get_logits_processors(
+        StreamingUtils._greedy_decoding, **kwargs)
+    stop_token_ids, stop_sequences = StreamingUtils._get_stop_criteria(
+        tokenizer, batch_size, **kwargs)
+    stop_ids = torch.tensor([i for i in stop_token_ids if i is not None],
+                            dtype=torch.long,
+                            device=device)
+
+    if seq2seq:
+        encoder_outputs = model.get_encoder()(
+            input_ids=input_ids,
+            attention_mask=tokenized_inputs["attention_mask"],
+            return_dict=True)
+        encoder_hidden_state = encoder_outputs.last_hidden_state.repeat_interleave(
+            num_beams, dim=0)
+        attention_mask = tokenized_inputs["attention_mask"].repeat_interleave(
+            num_beams, dim=0)
+        start_id = model.config.decoder_start_token_id
+        prompt_length = 1
+        history = input_ids.new_empty(batch_size * num_beams,
+                                      1 + max_new_tokens)
+        history[:, 0] = start_id
+        detokenizers = [
+            IncrementalDetokenizer([start_id]) for _ in range(batch_size)
+        ]
+    else:
+        prompt_length = input_length
+        history = input_ids.new_empty(batch_size * num_beams,
+                                      input_length + max_new_tokens)
+        history[:, :input_length] = input_ids.repeat_interleave(num_beams,
+                                                                dim=0)
+        attention_mask = history.new_zeros(history.shape)
+        if tokenizer.pad_token == tokenizer.eos_token:
+            attention_mask[:, :input_length] = 1
+        else:
+            attention_mask[:, :input_length] = tokenized_inputs[
+                "attention_mask"].repeat_interleave(num_beams, dim=0)
+        prompt_lengths = tokenized_inputs["attention_mask"].sum(-1).tolist()
+        detokenizers = [
+            IncrementalDetokenizer(ids[len(ids) - length:])
+            for ids, length in zip(input_ids.tolist(), prompt_lengths)
+        ]
+
+    hypotheses = [
+        BeamHypotheses(num_beams, length_penalty, early_stopping)
+        for _ in range(batch_size)
+    ]
+    # input index of each running batch item
+    items = list(range(batch_size))
+    # number of generated tokens streamed for each input
+    streamed = [0] * batch_size
+    # only the first beam is expanded at the first step
+    beam_scores = torch.zeros(batch_size, num_beams, device=device)
+    beam_scores[:, 1:] = -1e9
+    history_length = prompt_length
+    past_key_values = None
+    new_tokens_count = 0
+
+    while True:
+        if seq2seq:
+            outputs = model.forward(
+                encoder_outputs=(encoder_hidden_state, ),
+                attention_mask=attention_mask,
+                decoder_input_ids=history[:, history_length - 1:history_length]
+                if past_key_values is not None else history[:, :1],
+                past_key_values=past_key_values,
+                use_cache=True)
+        else:
+            outputs = model.forward(
+                input_ids=history[:, history_length - 1:history_length]
+                if past_key_values is not None else history[:, :prompt_length],
+                attention_mask=attention_mask[:, :history_length],
+                past_key_values=past_key_values,
+                use_cache=True)
+        new_tokens_count += 1
+        last_step = new_tokens_count >= max_new_tokens
+        generated_len = history_length - prompt_length + 1
+
+        scores = torch.nn.functional.log_softmax(outputs.logits[:,
+                                                                -1, :].float(),
+                                                 dim=-1)
+        scores = processors(history[:, :history_length], scores)
+        scores = scores + beam_scores.view(-1, 1)
+        vocab_size = scores.shape[-1]
+        # 2 * num_beams candidates leave num_beams candidates after stops
+        top_scores, top_index = scores.view(len(items), -1).topk(2 * num_beams,
+                                                                 dim=1)
+        top_beams = torch.div(top_index, vocab_size, rounding_mode="floor")
+        top_tokens = top_index % vocab_size
+        is_stop = torch.isin(top_tokens, stop_ids)
+
+        # stop tokens among the best num_beams candidates end a hypothesis
+        for i, j in is_stop[:, :num_beams].nonzero().tolist():
+            row = i * num_beams + top_beams[i, j].item()
+            token_ids = history[row, prompt_length:history_length].tolist()
+            token_ids.append(top_tokens[i, j].item())
+            hypotheses[items[i]].add(token_ids, top_scores[i, j].item(),
+                                     generated_len)
+
+        # the best num_beams candidates that are not stop tokens go on
+        rank = is_stop.long() * 2 * num_beams + torch.arange(2 * num_beams,
+                                                             device=device)
+        order = rank.argsort(dim=1)[:, :num_beams]
+        beam_scores = top_scores.gather(1, order)
+        next_rows = top_beams.gather(1, order) + torch.arange(
+            len(items), device=device).view(-1, 1) * num_beams
+        next_rows = next_rows.view(-1)
+        history = history.index_select(0, next_rows)
+        history[:, history_length] = top_tokens.gather(1, order).view(-1)
+        history_length += 1
+        past_key_values = StreamingUtils._select_rows(outputs.past_key_values,
+                                                      next_rows)
+        if not seq2seq:
+            attention_mask[:, history_length - 1] = 1
+
+        best_scores = top_scores[:, 0].tolist()
+        done = []
+        for i, b in enumerate(items):
+            if hypotheses[b].is_done(best_scores[i], generated_len):
+                done.append(True)
+            elif last_step:
+                # the running beams are hypotheses too
+                for row, token_ids in enumerate(
+                        history[i * num_beams:(i + 1) * num_beams,
+                                prompt_length:history_length].tolist()):
+                    hypotheses[b].add(token_ids, beam_scores[i, row].item(),
+                                      generated_len)
+                done.append(True)
+            else:
+                done.append(False)
+
+        # tokens that can't change anymore are streamed
+        pending = [[] for _ in range(batch_size)]
+        generated = history[:, prompt_length:history_length].view(
+            len(items), num_beams, -1)
+        agreed = (generated == generated[:, :1]).all(dim=1).long().cumprod(
+            dim=-1).sum(dim=-1).tolist()
+        for i, b in enumerate(items):
+            if done[i]:
+                token_ids = hypotheses[b].best()
+                pending[b] = token_ids[streamed[b]:]
+                continue
+            length = agreed[i]
+            if length > streamed[b] and len(hypotheses[b]) > 0:
+                token_ids = generated[i, 0, :length].tolist()
+                for _, hypothesis in hypotheses[b].beams:
+                    length = min(length,
+                                 _common_prefix_length(token_ids, hypothesis))
+            if length > streamed[b]:
+                pending[b] = generated[i, 0, streamed[b]:length].tolist()
+
+        token_text = [finished_output] * batch_size
+        finished = [False] * batch_size
+        for i, b in enumerate(items):
+            token_text[b] = ""
+            finished[b] = done[i]
+        decode_steps = max(len(p) for p in pending)
+        if output_token_ids and stop_sequences is None:
+            # only stop sequences need the text
+            decode_steps = 0
+            for b in items:
+                streamed[b] += len(pending[b])
+        for j in range(decode_steps):
+            token_ids = [p[j] if j < len(p) else None for p in pending]
+            flush = [
+                finished[b] and j == len(pending[b]) - 1
+                for b in range(batch_size)
+            ]
+            texts = IncrementalDetokenizer.decode(tokenizer, detokenizers,
+                                                  token_ids, flush)
+            for b, text in enumerate(texts):
+                if token_ids[b] is None:
+                    continue
+                streamed[b] += 1
+                if stop_sequences is not None and text:
+                    truncated = stop_sequences[b].truncate(text)
+                    if truncated is not None:
+                        text = truncated
+                        finished[b] = True
+                        pending[b] = pending[b][:j + 1]
+                token_text[b] += text
+
+        if output_token_ids:
+            token_text = [None] * batch_size
+            for b in items:
+                token_text[b] = {"token_ids": pending[b]}
+
+        keep = [i for i, b in enumerate(items) if not finished[b]]
+        if not keep:
+            yield token_text
+            return
+        if len(keep) < len(items):
+            # drop the beams of the finished inputs
+            index = torch.tensor(
+                [i * num_beams + j for i in keep for j in range(num_beams)],
+                device=device)
+            items = [items[i] for i in keep]
+            beam_scores = beam_scores[keep]
+            history = history.index_select(0, index)
+            attention_mask = attention_mask.index_select(0, index)
+            past_key_values = StreamingUtils._select_rows(
+                past_key_values, index)
+            if seq2seq:
+                encoder_hidden_state = encoder_hidden_state.index_select(
+                    0, index)
+        yield token_text
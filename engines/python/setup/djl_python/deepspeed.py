@@ -22,7 +22,8 @@ from transformers import (AutoConfig, PretrainedConfig, AutoTokenizer,
                           Conversation, SquadExample)
 import deepspeed
 from djl_python.inputs import Input
-from djl_python.outputs import Output
+from djl_python.outputs import Output, TOKEN_IDS_CONTENT_TYPE, get_stream_content_type
+from djl_python.prefix_cache import PrefixCache
 from djl_python.streaming_utils import StreamingUtils
 from typing import Optional
 
@@ -108,6 +109,9 @@ class DeepSpeedService(object):
         self.model_config = None
         self.low_cpu_mem_usage = False
         self.enable_streaming = False
+        self.batch_stream = False
+        self.prefix_cache = None
+        self.prefill_chunk_size = None
         self.model = None
         self.tokenizer = None
 
@@ -140,6 +144,17 @@ class DeepSpeedService(object):
                                                 "true").lower() == "true"
         self.enable_streaming = properties.get("enable_streaming",
                                                "false").lower() == "true"
+        if properties.get("batch_stream", "false").lower() == "true":
+            # batch_stream stays off until the front end can route batched
+            # frames to their clients
+            raise ValueError(
+                "batch_stream is not supported by the DJL front end yet")
+        prefix_cache_size = int(properties.get("prefix_cache_size_mb", "0"))
+        if prefix_cache_size > 0:
+            self.prefix_cache = PrefixCache(prefix_cache_size * 1024 * 1024)
+        prefill_chunk_size = int(properties.get("prefill_chunk_size", "0"))
+        if prefill_chunk_size > 0:
+            self.prefill_chunk_size = prefill_chunk_size
         if properties.get("deepspeed_config_path"):
             with open(properties.get("deepspeed_config_path"), "r") as f:
                 self.ds_config = json.load(f)
@@ -288,9 +303,21 @@ class DeepSpeedService(object):
             if self.enable_streaming:
                 stream_generator = StreamingUtils.get_stream_generator(
                     "DeepSpeed")
-                outputs.add_stream_content(
-                    stream_generator(self.model, self.tokenizer, input_data,
-                                     **model_kwargs))
+                if self.prefix_cache is not None:
+                    model_kwargs["prefix_cache"] = self.prefix_cache
+                if self.prefill_chunk_size is not None:
+                    model_kwargs[
+                        "prefill_chunk_size"] = self.prefill_chunk_size
+                if self.batch_stream:
+                    model_kwargs["batched"] = True
+                accept = inputs.get_property("Accept")
+                if get_stream_content_type(accept) == TOKEN_IDS_CONTENT_TYPE:
+                    model_kwargs["output_token_ids"] = True
+                stream = stream_generator(self.model, self.tokenizer,
+                                          input_data, **model_kwargs)
+                outputs.add_stream_content(stream,
+                                           batched=self.batch_stream,
+                                           accept=accept)
                 return outputs
             if self.task == "text-generation":
                 tokenized_inputs = self.tokenizer(
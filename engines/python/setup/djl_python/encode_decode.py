@@ -22,7 +22,8 @@ import numpy as np
 
 
 def decode_csv(inputs: Input):  # type: (str) -> np.array
-    stream = StringIO(inputs.get_as_string())
+    string_like = inputs.get_as_string()
+    stream = StringIO(string_like)
     # detects if the incoming csv has headers
     if not any(header in string_like.splitlines()[0].lower()
                for header in ["question", "context", "inputs"]):
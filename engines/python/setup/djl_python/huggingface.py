@@ -20,7 +20,10 @@ from transformers import pipeline, Conversation, AutoModelForCausalLM, AutoModel
 
 from djl_python.encode_decode import encode, decode
 from djl_python.inputs import Input
-from djl_python.outputs import Output
+from djl_python.outputs import Output, TOKEN_IDS_CONTENT_TYPE, get_stream_content_type
+from djl_python.prefix_cache import PrefixCache
+from djl_python.rolling_batch import RollingBatch, stream_requests
+from djl_python.speculative_decoding import SpeculativeDecoder
 from djl_python.streaming_utils import StreamingUtils
 
 ARCHITECTURES_2_TASK = {
@@ -63,6 +66,12 @@ class HuggingFaceService(object):
         self.hf_pipeline = None
         self.initialized = False
         self.enable_streaming = False
+        self.batch_stream = False
+        self.rolling_batch = None
+        self.static_kv_cache = False
+        self.prefix_cache = None
+        self.prefill_chunk_size = None
+        self.speculative_decoder = None
         self.model = None
         self.tokenizer = None
 
@@ -77,6 +86,19 @@ class HuggingFaceService(object):
         tp_degree = int(properties.get("tensor_parallel_degree", "-1"))
         self.enable_streaming = properties.get("enable_streaming",
                                                "false").lower() == "true"
+        self.static_kv_cache = properties.get("static_kv_cache",
+                                              "false").lower() == "true"
+        if properties.get("batch_stream", "false").lower() == "true":
+            # batch_stream stays off until the front end can route batched
+            # frames to their clients
+            raise ValueError(
+                "batch_stream is not supported by the DJL front end yet")
+        prefix_cache_size = int(properties.get("prefix_cache_size_mb", "0"))
+        if prefix_cache_size > 0:
+            self.prefix_cache = PrefixCache(prefix_cache_size * 1024 * 1024)
+        prefill_chunk_size = int(properties.get("prefill_chunk_size", "0"))
+        if prefill_chunk_size > 0:
+            self.prefill_chunk_size = prefill_chunk_size
         # HF Acc handling
         kwargs = {}
         # https://huggingface.co/docs/accelerate/usage_guides/big_modeling#designing-a-device-map
@@ -99,8 +121,28 @@ class HuggingFaceService(object):
         if "dtype" in properties:
             kwargs["torch_dtype"] = get_torch_dtype_from_str(
                 properties.get("dtype"))
-        if self.enable_streaming:
+        # experimental until the front end sends requests concurrently, see
+        # RollingBatch
+        rolling_batch = properties.get("experimental_rolling_batch",
+                                       "false").lower() == "true"
+        if self.enable_streaming or rolling_batch:
             self._init_model_and_tokenizer(model_id_or_path, **kwargs)
+            draft_model_id = properties.get("draft_model_id")
+            if draft_model_id and not rolling_batch:
+                draft_model = AutoModelForCausalLM.from_pretrained(
+                    draft_model_id, **kwargs)
+                self.speculative_decoder = SpeculativeDecoder(
+                    draft_model,
+                    num_speculative_tokens=int(
+                        properties.get("speculative_length", "4")))
+            if rolling_batch:
+                self.rolling_batch = RollingBatch(
+                    self.model,
+                    self.tokenizer,
+                    max_batch_size=int(
+                        properties.get("max_rolling_batch_size", "32")),
+                    prefix_cache=self.prefix_cache,
+                    prefill_chunk_size=self.prefill_chunk_size)
             self.initialized = True
             return
 
@@ -128,13 +170,46 @@ class HuggingFaceService(object):
             data = input_map.pop("inputs", input_map)
             parameters = input_map.pop("parameters", {})
             outputs = Output()
+            # only the streaming paths support token ids
+            output_token_ids = get_stream_content_type(
+                accept) == TOKEN_IDS_CONTENT_TYPE
+
+            if self.rolling_batch is not None:
+                if output_token_ids:
+                    parameters["output_token_ids"] = True
+                if isinstance(data, str):
+                    data = [data]
+                requests = [
+                    self.rolling_batch.submit(text, **parameters)
+                    for text in data
+                ]
+                stream = stream_requests(requests, self.batch_stream)
+                outputs.add_stream_content(stream,
+                                           batched=self.batch_stream,
+                                           accept=accept)
+                return outputs
 
             if self.enable_streaming:
                 stream_generator = StreamingUtils.get_stream_generator(
                     "Accelerate")
-                outputs.add_stream_content(
-                    stream_generator(self.model, self.tokenizer, data,
-                                     **parameters))
+                if self.static_kv_cache:
+                    parameters["use_static_cache"] = True
+                if self.prefix_cache is not None:
+                    parameters["prefix_cache"] = self.prefix_cache
+                if self.prefill_chunk_size is not None:
+                    parameters["prefill_chunk_size"] = self.prefill_chunk_size
+                if self.speculative_decoder is not None:
+                    parameters[
+                        "speculative_decoder"] = self.speculative_decoder
+                if self.batch_stream:
+                    parameters["batched"] = True
+                if output_token_ids:
+                    parameters["output_token_ids"] = True
+                stream = stream_generator(self.model, self.tokenizer, data,
+                                          **parameters)
+                outputs.add_stream_content(stream,
+                                           batched=self.batch_stream,
+                                           accept=accept)
                 return outputs
 
             prediction = self.hf_pipeline(data, **parameters)
@@ -12,13 +12,30 @@
 # the specific language governing permissions and limitations under the License.
 
 import io
+import operator
 import struct
 import json
-import re
 
-from .np_util import from_nd_list
+from .np_util import from_nd_list, from_npz
 from .pair_list import PairList
 
+DEFAULT_BUFFER_SIZE = 64 * 1024
+
+
+def _recv_into(conn, view):
+    """
+    Fills the memoryview with data received from the socket.
+    :param conn: socket connection
+    :param view: writable memoryview to be filled
+    """
+    offset = 0
+    length = len(view)
+    while offset < length:
+        n = conn.recv_into(view[offset:])
+        if n == 0:
+            raise ValueError("Connection disconnected")
+        offset += n
+
 
 def retrieve_buffer(conn, length):
     """
@@ -27,16 +44,8 @@ def retrieve_buffer(conn, length):
     :param length: length of the data to be read
     :return: retrieved byte array
     """
-    data = bytearray()
-
-    while length > 0:
-        pkt = conn.recv(length)
-        if len(pkt) == 0:
-            raise ValueError("Connection disconnected")
-
-        data += pkt
-        length -= len(pkt)
-
+    data = bytearray(length)
+    _recv_into(conn, memoryview(data))
     return data
 
 
@@ -69,12 +78,185 @@ def retrieve_utf8(conn):
     return data.decode("utf8")
 
 
+def _same_items(cached: list, current: list) -> bool:
+    """
+    Returns whether both lists hold the same objects in the same order.
+    """
+    return len(cached) == len(current) and all(
+        map(operator.is_, cached, current))
+
+
+class SocketReader(object):
+    """
+    Buffered reader that decodes the request framing with ``recv_into``.
+
+    Length fields and keys are served from one reusable receive buffer, values
+    that don't fit in the buffer are received directly into their own
+    pre-sized bytearray. With ``read_ahead`` enabled the reader may consume
+    bytes of the next request, so it must be kept for the whole connection.
+    """
+
+    def __init__(self, conn, buffer_size=DEFAULT_BUFFER_SIZE, read_ahead=True):
+        self.conn = conn
+        self.read_ahead = read_ahead
+        self.buf = bytearray(buffer_size)
+        self.view = memoryview(self.buf)
+        self.start = 0
+        self.end = 0
+
+    def _fill(self, length):
+        available = self.end - self.start
+        if available >= length:
+            return
+
+        if length > len(self.buf):
+            # grow the buffer for an oversized header field
+            self.view.release()
+            self.buf = self.buf[self.start:self.end] + bytearray(length -
+                                                                 available)
+            self.view = memoryview(self.buf)
+            self.start = 0
+            self.end = available
+        elif self.start + length > len(self.buf):
+            # compact the unread bytes to the head of the buffer
+            self.buf[:available] = bytes(self.view[self.start:self.end])
+            self.start = 0
+            self.end = available
+
+        while self.end - self.start < length:
+            if self.read_ahead:
+                n = self.conn.recv_into(self.view[self.end:])
+            else:
+                need = length - (self.end - self.start)
+                n = self.conn.recv_into(self.view[self.end:], need)
+            if n == 0:
+                raise ValueError("Connection disconnected")
+            self.end += n
+
+    def read_short(self) -> int:
+        self._fill(2)
+        value = struct.unpack_from(">h", self.buf, self.start)[0]
+        self.start += 2
+        return value
+
+    def read_int(self) -> int:
+        self._fill(4)
+        value = struct.unpack_from(">i", self.buf, self.start)[0]
+        self.start += 4
+        return value
+
+    def read_utf8(self):
+        length = self.read_short()
+        if length < 0:
+            return None
+
+        self._fill(length)
+        value = str(self.view[self.start:self.start + length], "utf8")
+        self.start += length
+        return value
+
+    def read_buffer(self, length) -> bytearray:
+        """
+        Reads the next ``length`` bytes into a new bytearray.
+        :param length: length of the data to be read
+        :return: retrieved byte array
+        """
+        if self.end - self.start >= length or length <= len(self.buf) // 4:
+            self._fill(length)
+            data = bytearray(self.view[self.start:self.start + length])
+            self.start += length
+            return data
+
+        data = bytearray(length)
+        buffered = self.end - self.start
+        data[:buffered] = self.view[self.start:self.end]
+        self.start = self.end = 0
+        _recv_into(self.conn, memoryview(data)[buffered:])
+        return data
+
+
+class CaseInsensitiveDict(dict):
+    """
+    Dict that keeps the original casing of its keys and also indexes them
+    case-insensitively. ``get_ignore_case`` resolves to the first inserted
+    key that matches, like a scan over the items would.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__()
+        self._lower_keys = dict()
+        self.update(*args, **kwargs)
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._lower_keys.setdefault(key.lower(), key)
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._unindex(key)
+
+    def _unindex(self, key):
+        lower = key.lower()
+        if self._lower_keys.get(lower) == key:
+            del self._lower_keys[lower]
+            for k in self:
+                if k.lower() == lower:
+                    self._lower_keys[lower] = k
+                    break
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def get_ignore_case(self, key, default=None):
+        original = self._lower_keys.get(key.lower())
+        if original is None:
+            return default
+        return self[original]
+
+    def pop(self, key, *args):
+        if key not in self:
+            if args:
+                return args[0]
+            raise KeyError(key)
+        value = self[key]
+        del self[key]
+        return value
+
+    def popitem(self):
+        key, value = super().popitem()
+        self._unindex(key)
+        return key, value
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def clear(self):
+        super().clear()
+        self._lower_keys.clear()
+
+    def copy(self):
+        return CaseInsensitiveDict(self)
+
+    def __reduce__(self):
+        # pickle and copy rebuild the index from the items
+        return CaseInsensitiveDict, (dict(self), )
+
+
 class Input(object):
 
     def __init__(self):
         self.function_name = None
-        self.properties = dict()
+        self.properties = CaseInsensitiveDict()
         self.content = PairList()
+        self._batches = None
+        self._decoded = dict()
 
     def __str__(self):
         cur_str = "properties: " + str(self.get_properties())
@@ -89,27 +271,60 @@ class Input(object):
         return int(self.properties.get("batch_size", "1"))
 
     def get_batches(self) -> list:
+        """
+        Splits a batch request into one Input per item. Items share the value
+        buffers of this Input, the result is cached until a key or a value
+        object in the content changes.
+
+        :return: list of Input
+        """
         batch_size = self.get_batch_size()
         if batch_size == 1:
             return [self]
 
+        content = self.content
+        if self._batches is not None:
+            keys, values, batch = self._batches
+            if keys == content.keys and _same_items(values, content.values):
+                return batch
+
         batch = []
         for i in range(batch_size):
             item = Input()
             item.properties = self.properties
             batch.append(item)
 
-        p = re.compile("batch_(\\d+)\\.(.*)")
-        for i in range(self.content.size()):
-            key = self.content.key_at(i)
-            m = p.match(key)
-            if m is None:
-                raise ValueError(f"Unexpected key in batch input: key")
-            index = int(m.group(1))
-            batch[index].content.add(m.group(2), self.content.value_at(i))
+        for key, value in zip(content.keys, content.values):
+            prefix, sep, name = key.partition(".") if key else ("", "", "")
+            if not sep or not prefix.startswith("batch_"):
+                raise ValueError(f"Unexpected key in batch input: {key}")
+            batch[int(prefix[6:])].content.add(name, value)
 
+        self._batches = (list(content.keys), list(content.values), batch)
         return batch
 
+    def get_batch_as_numpy(self, key=None) -> list:
+        """
+        Returns the numpy inputs of all batch items stacked along a new first
+        dimension, each output array is allocated once.
+
+        :param key: optional key
+        :return: list of numpy array
+        """
+        import numpy as np
+        items = [item.get_as_numpy(key) for item in self.get_batches()]
+        result = []
+        for i, first in enumerate(items[0]):
+            stacked = np.empty((len(items), ) + first.shape, first.dtype)
+            for j, item in enumerate(items):
+                if item[i].shape != first.shape:
+                    raise ValueError(
+                        f"Batch item {j} shape mismatch, expected: "
+                        f"{first.shape}, actual: {item[i].shape}")
+                stacked[j] = item[i]
+            result.append(stacked)
+        return result
+
     def get_function_name(self) -> str:
         return self.function_name
 
@@ -136,6 +351,9 @@ class Input(object):
         :param key: key of map
         :return: value of the key
         """
+        if isinstance(self.properties, CaseInsensitiveDict):
+            return self.properties.get_ignore_case(key)
+        # properties was replaced with a plain dict
         return next(
             (v
              for k, v in self.properties.items() if k.lower() == key.lower()),
@@ -179,11 +397,27 @@ class Input(object):
             ret = self.content.value_at(0)
         return ret
 
+    def _decode(self, kind: str, key, decoder):
+        """
+        Decodes a value once per key and kind, only for results that callers
+        can't modify. The cached result is dropped when the value is replaced
+        in the content or the content is replaced, in place edits of a value
+        buffer are not detected.
+        """
+        data = self.get_as_bytes(key=key)
+        cached = self._decoded.get((kind, key))
+        if cached is not None and cached[0] is data:
+            return cached[1]
+        result = decoder(data)
+        self._decoded[(kind, key)] = (data, result)
+        return result
+
     def get_as_string(self, key=None) -> str:
-        return self.get_as_bytes(key=key).decode("utf-8")
+        return self._decode("string", key, lambda data: data.decode("utf-8"))
 
     def get_as_json(self, key=None):
-        return json.loads((self.get_as_bytes(key=key).decode("utf-8")))
+        # parsed on each call, handlers modify the result
+        return json.loads(self.get_as_string(key=key))
 
     def get_as_image(self, key=None):
         from PIL import Image
@@ -195,15 +429,19 @@ class Input(object):
             1. value as numpy list if key is provided
             2. list of values as numpy list if key is not provided
         :param key: optional key
-        :return: list of numpy array
+        :return: list of read-only numpy array
         """
-        return from_nd_list(self.get_as_bytes(key=key))
+        return list(self._decode("numpy", key, from_nd_list))
 
     def get_as_npz(self, key=None) -> list:
-        import numpy
-        npz = numpy.load(io.BytesIO(self.get_as_bytes(key=key)))
-        result = [npz[name] for name in npz.files]
-        return result
+        """
+        Returns the value as numpy list, arrays of uncompressed entries are
+        views onto the value.
+
+        :param key: optional key
+        :return: list of read-only numpy array
+        """
+        return list(self._decode("npz", key, from_npz))
 
     def get_as_csv(self, key=None) -> list:
         import csv
@@ -214,19 +452,28 @@ class Input(object):
         return self.content.is_empty()
 
     def read(self, conn):
-        prop_size = retrieve_short(conn)
+        """
+        Reads a request from the socket.
+
+        :param conn: socket connection or a SocketReader that is reused across
+            requests on the same connection
+        """
+        if not isinstance(conn, SocketReader):
+            conn = SocketReader(conn, buffer_size=256, read_ahead=False)
+
+        prop_size = conn.read_short()
 
         for _ in range(prop_size):
-            key = retrieve_utf8(conn)
-            val = retrieve_utf8(conn)
+            key = conn.read_utf8()
+            val = conn.read_utf8()
             self.properties[key] = val
 
-        content_size = retrieve_short(conn)
+        content_size = conn.read_short()
 
         for _ in range(content_size):
-            key = retrieve_utf8(conn)
-            length = retrieve_int(conn)
-            val = retrieve_buffer(conn, length)
+            key = conn.read_utf8()
+            length = conn.read_int()
+            val = conn.read_buffer(length)
             self.content.add(key=key, value=val)
 
         self.function_name = self.properties.get('handler')
@@ -13,11 +13,15 @@
 
 import io
 import struct
+import sys
+import zipfile
 
 import numpy as np
 
 MAGIC_NUMBER = "NDAR"
 VERSION = 3
+# unknown layout "?" for each dimension
+_LAYOUT = (ord("?"), ) * 64
 
 
 def set_int(value: int) -> bytes:
@@ -121,82 +125,207 @@ def get_long(encoded: bytearray, idx: int) -> tuple:
                          encoded[idx:idx + long_size])[0], idx + long_size
 
 
+_DTYPES = {}
+
+
+def _get_dtype(datatype: bytes, order: bytes) -> np.dtype:
+    key = (datatype, order)
+    dtype = _DTYPES.get(key)
+    if dtype is None:
+        dtype = np.dtype(datatype.decode("utf8").lower()).newbyteorder(
+            order.decode("utf8"))
+        _DTYPES[key] = dtype
+    return dtype
+
+
 def from_nd_list(encoded: bytearray) -> list:
     """
     Converts djl format to list of numpy array
+
+    Arrays are read-only views onto the encoded buffer, data is only copied
+    if the encoded byte order differs from the native one.
+
     :param encoded: bytearray
     :return: list of numpy array
     """
     if len(encoded) >= 4 and encoded[0] == 80 and encoded[1] == 75:
         # Assume the input is npz format (PK)
-        result = []
-        npz = np.load(io.BytesIO(encoded))
-        for item in npz.items():
-            result.append(item[1])
-        return result
-
-    idx = 0
-    num_ele, idx = get_int(encoded, idx)
+        return from_npz(encoded)
+
+    view = memoryview(encoded).cast("B").toreadonly()
+    unpack_from = struct.unpack_from
+    num_ele = unpack_from(">i", view, 0)[0]
+    idx = 4
     result = []
     for _ in range(num_ele):
-        magic, idx = get_str(encoded, idx)
-        if magic != MAGIC_NUMBER:
+        # magic, version and name flag
+        magic_len, magic, version, flag = unpack_from(">h4sib", view, idx)
+        if magic_len != 4 or magic != b"NDAR":
+            magic = str(view[idx + 2:idx + 2 + magic_len], "utf8")
             raise AssertionError("magic number is not NDAR, actual " + magic)
-        version, idx = get_int(encoded, idx)
         if version != VERSION:
-            raise AssertionError("require version 2, actual " + str(version))
-        flag, idx = get_byte_as_int(encoded, idx)
+            raise AssertionError(
+                f"require version {VERSION}, actual {version}")
+        idx += 11
         if flag == 1:
-            _, idx = get_str(encoded, idx)
-        _, idx = get_str(encoded, idx)  # ignore sparse format
-        datatype, idx = get_str(encoded, idx)
-        shape, idx = _shape_decode(encoded, idx)
-        order, idx = get_byte_as_int(encoded, idx)
-        data_length, idx = get_int(encoded, idx)
-        data, idx = get_bytes(encoded, idx, data_length)
-        nd = np.ndarray(shape, np.dtype(datatype.lower()), data)
-        nd = nd.newbyteorder(chr(order))
+            idx += 2 + unpack_from(">h", view, idx)[0]
+        # ignore sparse format
+        idx += 2 + unpack_from(">h", view, idx)[0]
+        length = unpack_from(">h", view, idx)[0]
+        datatype = bytes(view[idx + 2:idx + 2 + length])
+        idx += 2 + length
+        ndim = unpack_from(">i", view, idx)[0]
+        shape = unpack_from(f">{ndim}q", view, idx + 4)
+        idx += 4 + ndim * 8
+        # ignore layout
+        idx += 4 + unpack_from(">i", view, idx)[0] * 2
+        order, data_length = unpack_from(">ci", view, idx)
+        idx += 5
+        dtype = _get_dtype(datatype, order)
+        nd = np.ndarray(shape, dtype, view, idx)
+        idx += data_length
+        if not dtype.isnative:
+            nd = nd.astype(dtype.newbyteorder("="))
+            nd.flags.writeable = False
         result.append(nd)
     return result
 
 
+class _BufferReader(io.RawIOBase):
+    """
+    Seekable file object over a buffer, unlike ``io.BytesIO`` it doesn't copy
+    a bytearray.
+    """
+
+    def __init__(self, view: memoryview):
+        super().__init__()
+        self.view = view
+        self.pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.pos
+        elif whence == io.SEEK_END:
+            offset += len(self.view)
+        self.pos = max(offset, 0)
+        return self.pos
+
+    def readinto(self, buffer):
+        data = self.view[self.pos:self.pos + len(buffer)]
+        buffer[:len(data)] = data
+        self.pos += len(data)
+        return len(data)
+
+
+def from_npz(encoded) -> list:
+    """
+    Converts npz format to list of numpy array
+
+    Like ``numpy.load`` with ``mmap_mode="r"``, arrays of uncompressed
+    entries are views onto the encoded buffer. Only compressed entries and
+    entries that need unpickling are read into memory. All the arrays are
+    read-only.
+
+    :param encoded: npz bytes or bytearray
+    :return: list of numpy array
+    """
+    view = memoryview(encoded).cast("B").toreadonly()
+    fp = _BufferReader(view)
+    result = []
+    with zipfile.ZipFile(fp) as npz:
+        for info in npz.infolist():
+            if not info.filename.endswith(".npy"):
+                result.append(npz.read(info))
+                continue
+            if info.compress_type == zipfile.ZIP_STORED:
+                name_length, extra_length = struct.unpack_from(
+                    "<HH", view, info.header_offset + 26)
+                fp.seek(info.header_offset + 30 + name_length + extra_length)
+                version = np.lib.format.read_magic(fp)
+                if version == (1, 0):
+                    header = np.lib.format.read_array_header_1_0(fp)
+                elif version == (2, 0):
+                    header = np.lib.format.read_array_header_2_0(fp)
+                else:
+                    header = None
+                if header is not None and not header[2].hasobject:
+                    shape, fortran_order, dtype = header
+                    order = "F" if fortran_order else "C"
+                    result.append(
+                        np.ndarray(shape, dtype, view, fp.tell(), order=order))
+                    continue
+            with npz.open(info) as f:
+                nd = np.lib.format.read_array(f)
+            nd.flags.writeable = False
+            result.append(nd)
+    return result
+
+
+_HEADERS = {}
+
+
+def _get_header(dtype: np.dtype, ndim: int) -> tuple:
+    key = (dtype, ndim)
+    header = _HEADERS.get(key)
+    if header is None:
+        name = dtype.name.upper().encode("utf8")
+        fmt = f">h4sibh7sh{len(name)}si{ndim}qi{ndim}hci"
+        header = (struct.Struct(fmt), name)
+        _HEADERS[key] = header
+    return header
+
+
 def to_nd_list(np_list) -> bytearray:
     """
     Converts list of numpy array into djl NDList
 
+    The output size is computed up front and array data is copied into the
+    output exactly once if it's already little endian and C-contiguous.
+
     :param np_list: list of numpy array
     :return: djl NDList as bytearray
     """
-    arr = bytearray()
     if type(np_list) is not list:
         np_list = [np_list]
 
-    arr.extend(set_int(len(np_list)))
+    headers = []
+    size = 4
     for nd in np_list:
-        arr.extend(set_str(MAGIC_NUMBER))
-        arr.extend(set_int(VERSION))
-        arr.append(0)  # no name
-        arr.extend(set_str("default"))
-        arr.extend(set_str(str(nd.dtype).upper()))
-        _shape_encode(nd.shape, arr)
-        arr.append(ord('<'))  # use little endian
-        nd_bytes = nd.newbyteorder('<').tobytes("C")
-        arr.extend(set_int(len(nd_bytes)))
-        arr.extend(nd_bytes)  # make it big endian
+        if nd.dtype.byteorder == ">" or (nd.dtype.byteorder == "="
+                                         and sys.byteorder == "big"):
+            nd = nd.astype(nd.dtype.newbyteorder("<"))
+        if not nd.flags.c_contiguous:
+            nd = np.ascontiguousarray(nd)
+        header, name = _get_header(nd.dtype, nd.ndim)
+        size += header.size + nd.nbytes
+        headers.append((nd, header, name))
+
+    arr = bytearray(size)
+    view = memoryview(arr)
+    struct.pack_into(">i", arr, 0, len(np_list))
+    idx = 4
+    for nd, header, name in headers:
+        ndim = nd.ndim
+        # no name, default sparse format, use little endian
+        header.pack_into(arr, idx, 4, b"NDAR", VERSION, 0, 7, b"default",
+                         len(name), name, ndim, *nd.shape, ndim,
+                         *_LAYOUT[:ndim], b"<", nd.nbytes)
+        idx += header.size
+        if nd.nbytes > 0:
+            view[idx:idx + nd.nbytes] = memoryview(nd).cast("B")
+            idx += nd.nbytes
     return arr
 
 
-def _shape_encode(shape: tuple, arr: bytearray):
-    arr.extend(set_int(len(shape)))
-    layout = ""
-    for ele in shape:
-        arr.extend(set_long(ele))
-        layout += "?"
-    arr.extend(set_int(len(layout)))
-    for ele in layout:
-        arr.extend(set_char(ele))
-
-
 def _shape_decode(encoded: bytearray, idx: int) -> tuple:
     length, idx = get_int(encoded, idx)
     shape = []
@@ -11,37 +11,337 @@
 # BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, express or implied. See the License for
 # the specific language governing permissions and limitations under the License.
 
+import datetime
 import json
+import queue
 import struct
 import logging
+import threading
+import time
 
 from .np_util import to_nd_list
 from .pair_list import PairList
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
-# https://github.com/automl/SMAC3/issues/453
-class _JSONEncoder(json.JSONEncoder):
+
+def _resolve_json_encoder(cls):
+    """
+    Finds how to convert a type that JSON can't encode natively, float and
+    int64 numpy types included: https://github.com/automl/SMAC3/issues/453
     """
-    custom `JSONEncoder` to make sure float and int64 ar converted
+    if issubclass(cls, datetime.datetime):
+        return str
+    try:
+        import numpy as np
+    except ImportError:
+        return None
+    if issubclass(cls, np.integer):
+        return int
+    elif issubclass(cls, np.floating):
+        return float
+    elif issubclass(cls, np.bool_):
+        return bool
+    elif issubclass(cls, np.ndarray):
+        return np.ndarray.tolist
+    return None
+
+
+# type to conversion function, resolved once per type
+_json_encoders = {}
+
+
+def _json_default(obj):
+    cls = type(obj)
+    try:
+        encoder = _json_encoders[cls]
+    except KeyError:
+        encoder = _json_encoders[cls] = _resolve_json_encoder(cls)
+    if encoder is None:
+        raise TypeError(
+            f"Object of type {cls.__name__} is not JSON serializable")
+    return encoder(obj)
+
+
+class _StdlibJSONBackend(object):
     """
+    Compact UTF-8 JSON with the ``json`` module, NaN and infinity are
+    rejected.
+    """
+
+    name = "json"
 
-    def default(self, obj):
-        import datetime
-        if isinstance(obj, datetime.datetime):
-            return obj.__str__()
+    def __init__(self):
+        self.encoder = json.JSONEncoder(ensure_ascii=False,
+                                        allow_nan=False,
+                                        separators=(",", ":"),
+                                        default=_json_default)
+
+    def dumps(self, val) -> bytes:
+        return self.encoder.encode(val).encode("utf-8")
+
+
+class _OrjsonBackend(object):
+    """
+    Compact UTF-8 JSON with ``orjson``. Values that orjson rejects, such as
+    namedtuples or integers beyond 64 bits, are encoded by the json backend.
 
+    numpy values are converted like the json backend does, orjson's native
+    numpy support ignores the byte order and formats float32 differently.
+    Unlike the json backend, NaN and infinity are encoded as null and
+    floats may be formatted differently, e.g. ``1e16`` for ``1e+16``.
+    """
+
+    name = "orjson"
+
+    def __init__(self):
+        # datetime keeps its str() format of the json backend
+        self.option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        self.fallback = _StdlibJSONBackend()
+
+    def dumps(self, val) -> bytes:
         try:
-            import numpy as np
-            if isinstance(obj, np.integer):
-                return int(obj)
-            elif isinstance(obj, np.floating):
-                return float(obj)
-            elif isinstance(obj, np.ndarray):
-                return obj.tolist()
-        except ImportError:
-            pass
+            return orjson.dumps(val, default=_json_default, option=self.option)
+        except TypeError:
+            return self.fallback.dumps(val)
+
+
+def set_json_backend(backend):
+    """
+    Sets the JSON encoder of outputs, ``json`` by default. ``orjson`` is
+    faster but its output differs for NaN, infinity and float formatting.
+    Models select it with ``option.json_backend`` in serving.properties.
+
+    :param backend: "json", "orjson", or an object with a ``dumps(val)``
+        method that returns bytes
+    """
+    global _json_backend
+    if backend == "json":
+        backend = _StdlibJSONBackend()
+    elif backend == "orjson":
+        if orjson is None:
+            raise ValueError("orjson is not installed")
+        backend = _OrjsonBackend()
+    elif isinstance(backend, str):
+        raise ValueError(f"Unsupported JSON backend: {backend}")
+    _json_backend = backend
+
+
+_json_backend = _StdlibJSONBackend()
+
+# values larger than this are sent from their own buffer instead of being
+# copied into the message header
+SCATTER_THRESHOLD = 16 * 1024
+# maximum number of buffers per sendmsg() call, bounded by IOV_MAX
+MAX_SEND_BUFFERS = 512
+
+
+def _send_buffers(cl_socket, buffers: list):
+    """
+    Sends a list of buffers with vectored I/O, handles partial writes.
+    :param cl_socket: socket connection
+    :param buffers: list of bytes-like objects
+    """
+    if len(buffers) == 1 or not hasattr(cl_socket, "sendmsg"):
+        for buf in buffers:
+            cl_socket.sendall(buf)
+        return
+
+    views = [memoryview(buf).cast("B") for buf in buffers if len(buf) > 0]
+    start = 0
+    while start < len(views):
+        sent = cl_socket.sendmsg(views[start:start + MAX_SEND_BUFFERS])
+        while sent > 0:
+            length = len(views[start])
+            if sent < length:
+                views[start] = views[start][sent:]
+                break
+            sent -= length
+            start += 1
+
+
+# header of a streaming frame: has more frames flag and data length
+_FRAME_HEADER = struct.Struct(">bi")
+# batch index prefix of a batched streaming frame
+_BATCH_INDEX = struct.Struct(">h")
+# marks the end of the stream content in the drain queue
+_END_OF_STREAM = object()
+# seconds a blocked drain thread waits before it checks if the sender stopped
+_DRAIN_POLL_INTERVAL = 0.1
+
+# streaming formats that the Accept header can select, JSON lines otherwise
+SSE_CONTENT_TYPE = "text/event-stream"
+TOKEN_IDS_CONTENT_TYPE = "tensor/token-ids"
+# header of a token ids frame: has logprobs flag and number of sequences
+_TOKEN_IDS_HEADER = struct.Struct("<BH")
+
+
+def _sse_stream_output_formatter(token_texts):
+    return b"data: " + json.dumps({
+        "outputs": token_texts
+    }).encode("utf-8") + b"\n\n"
+
+
+def _token_ids_stream_output_formatter(outputs):
+    """
+    Packs the token ids of each sequence, little endian: uint8 whether there
+    are logprobs and uint16 number of sequences, then for each sequence int32
+    number of tokens, -1 if it has no output, the int32 token ids and, with
+    logprobs, their float32 log probabilities.
 
-        return super(_JSONEncoder, self).default(obj)
+    :param outputs: list of dict with ``token_ids`` and ``logprobs``
+    """
+    has_logprobs = any(output and "logprobs" in output for output in outputs)
+    buf = bytearray(_TOKEN_IDS_HEADER.pack(has_logprobs, len(outputs)))
+    for output in outputs:
+        if not output:
+            buf += struct.pack("<i", -1)
+            continue
+        token_ids = output["token_ids"]
+        count = len(token_ids)
+        buf += struct.pack(f"<i{count}i", count, *token_ids)
+        if has_logprobs:
+            buf += struct.pack(f"<{count}f", *output["logprobs"])
+    return buf
+
+
+_STREAM_OUTPUT_FORMATTERS = {
+    SSE_CONTENT_TYPE: _sse_stream_output_formatter,
+    TOKEN_IDS_CONTENT_TYPE: _token_ids_stream_output_formatter,
+}
+
+
+def get_stream_content_type(accept: str):
+    """
+    Selects a streaming format by the media types of an Accept header, in
+    their order.
+
+    :param accept: Accept header
+    :return: ``SSE_CONTENT_TYPE``, ``TOKEN_IDS_CONTENT_TYPE`` or None for
+        JSON lines
+    """
+    for media_range in (accept or "").split(","):
+        media_type = media_range.split(";")[0].strip().lower()
+        if media_type in _STREAM_OUTPUT_FORMATTERS:
+            return media_type
+    return None
+
+
+class StreamFlushPolicy(object):
+    """
+    Decides when the streaming frames of an ``Output`` are sent.
+
+    Frames are packed into one send until ``max_bytes`` bytes or
+    ``max_items`` frames are pending, or the first pending frame is
+    ``max_latency_ms`` old, if it is set, even if no new frame arrives. The
+    default sends each frame on its own.
+
+    With ``background``, a thread drains the stream content while frames are
+    being sent, so the model computes the next frames during socket I/O. It
+    runs at most ``2 * max_items`` frames ahead of the socket. The stream
+    content runs in the drain thread, it must not depend on thread local
+    state such as the current CUDA device.
+    """
+
+    def __init__(self,
+                 max_bytes: int = 64 * 1024,
+                 max_items: int = 1,
+                 max_latency_ms: int = 0,
+                 background: bool = False):
+        self.max_bytes = max_bytes
+        self.max_items = max(1, max_items)
+        self.max_latency = max_latency_ms / 1000
+        self.background = background
+
+
+class _StreamWriter(object):
+    """
+    Packs streaming frames into a buffer and sends it per flush policy.
+
+    If ``max_latency_ms`` is set without the drain thread, a timer thread
+    sends the pending frames once they are due, so a slow stream content
+    doesn't hold them until its next frame.
+    """
+
+    def __init__(self, cl_socket, policy: StreamFlushPolicy):
+        self.cl_socket = cl_socket
+        self.policy = policy
+        self.buf = bytearray()
+        self.items = 0
+        self.first_time = 0
+        self.lock = threading.Condition()
+        # the drain thread flushes due frames on its own
+        self.timed = policy.max_latency > 0 and not policy.background
+        self.timer = None
+        self.closed = False
+        self.error = None
+
+    def deadline(self):
+        return self.first_time + self.policy.max_latency
+
+    def expired(self):
+        if self.policy.max_latency <= 0:
+            return False
+        return time.monotonic() >= self.deadline()
+
+    def write(self, data, more=True):
+        with self.lock:
+            if self.error is not None:
+                raise self.error
+            if self.items == 0:
+                self.first_time = time.monotonic()
+            self.buf += _FRAME_HEADER.pack(1 if more else 0, len(data))
+            self.buf += data
+            self.items += 1
+            if not more or self.items >= self.policy.max_items or len(
+                    self.buf) >= self.policy.max_bytes or self.expired():
+                self._flush()
+            elif self.items == 1 and self.timed:
+                self._start_timer()
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        if self.items > 0:
+            self.cl_socket.sendall(self.buf)
+            self.buf.clear()
+            self.items = 0
+
+    def _start_timer(self):
+        if self.timer is None:
+            self.timer = threading.Thread(target=self._flush_when_due,
+                                          name="djl-stream-flush",
+                                          daemon=True)
+            self.timer.start()
+        else:
+            self.lock.notify()
+
+    def _flush_when_due(self):
+        with self.lock:
+            while not self.closed:
+                if self.items == 0:
+                    self.lock.wait()
+                    continue
+                timeout = self.deadline() - time.monotonic()
+                if timeout > 0:
+                    self.lock.wait(timeout)
+                    continue
+                try:
+                    self._flush()
+                except Exception as e:  # pylint: disable=broad-except
+                    # raised by the next write
+                    self.error = e
+                    return
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            self.lock.notify()
 
 
 class Output(object):
@@ -55,6 +355,7 @@ class Output(object):
         self.finalize_function = None
         self.finalize_args = None
         self.stream_output_formatter = None
+        self.stream_batched = False
 
     def __str__(self):
         d = dict()
@@ -104,7 +405,7 @@ class Output(object):
         elif type(value) is bytearray:
             self.content.add(key=key, value=value)
         elif type(value) is bytes:
-            self.content.add(key=key, value=bytearray(value))
+            self.content.add(key=key, value=value)
         else:
             self.content.add(key=key, value=self._encode_json(value))
         return self
@@ -132,19 +433,39 @@ class Output(object):
 
     def add_stream_content(self,
                            stream_content,
-                           output_formatter=_default_stream_output_formatter):
+                           output_formatter=_default_stream_output_formatter,
+                           batched=False,
+                           accept=None):
+        """
+        Streams the items of a generator, each item is sent in its own frame.
+
+        In batched mode, each item is the list of the new texts of a batch of
+        sequences, ``None`` for the sequences that are finished. Each text is
+        sent in its own frame, prefixed with its batch index as a big endian
+        short and formatted as a batch of one. Empty texts are not sent, a
+        frame without text ends the stream of its sequence. This needs a front
+        end that routes each sequence to its own client, which the DJL front
+        end doesn't do yet.
+
+        :param stream_content: generator of the streamed items
+        :param output_formatter: encodes an item into the frame data
+        :param batched: whether to send one frame per sequence
+        :param accept: Accept header of the request, selects the built-in
+            server-sent events or token ids format instead of the formatter
+        """
+        content_type = get_stream_content_type(accept)
+        if content_type is not None:
+            output_formatter = _STREAM_OUTPUT_FORMATTERS[content_type]
+            self.add_property("Content-Type", content_type)
         self.stream_content = stream_content
         self.stream_output_formatter = output_formatter
+        self.stream_batched = batched
+        if batched:
+            self.add_property("batch_stream", "true")
 
     @staticmethod
     def _encode_json(val) -> bytes:
-        return bytearray(
-            json.dumps(val,
-                       ensure_ascii=False,
-                       allow_nan=False,
-                       indent=2,
-                       cls=_JSONEncoder,
-                       separators=(",", ":")).encode("utf-8"))
+        return _json_backend.dumps(val)
 
     @staticmethod
     def write_utf8(msg, val):
@@ -164,7 +485,108 @@ class Output(object):
         if self.finalize_function:
             return self.finalize_function(*self.finalize_args)
 
-    def send(self, cl_socket):
+    def _encode_stream_data(self, data):
+        if self.stream_output_formatter is not None:
+            data = self.stream_output_formatter(data)
+        if type(data) is str:
+            return data.encode('utf-8')
+        elif type(data) is bytearray or type(data) is bytes:
+            return data
+        return self._encode_json(data)
+
+    def _iterate_stream_content(self):
+        """
+        Yields the data of each streaming frame.
+        """
+        if not self.stream_batched:
+            yield from map(self._encode_stream_data, self.stream_content)
+            return
+
+        unfinished = None
+        for token_texts in self.stream_content:
+            if unfinished is None:
+                unfinished = [True] * len(token_texts)
+            for i, text in enumerate(token_texts):
+                if not unfinished[i]:
+                    continue
+                if text is None:
+                    unfinished[i] = False
+                    yield _BATCH_INDEX.pack(i)
+                elif text:
+                    yield _BATCH_INDEX.pack(i) + self._encode_stream_data(
+                        [text])
+        # the sequences still running end with the stream content
+        for i, running in enumerate(unfinished or []):
+            if running:
+                yield _BATCH_INDEX.pack(i)
+
+    def _drain_stream_content(self, frames: queue.Queue,
+                              stopped: threading.Event):
+        """
+        Encodes the stream content into a queue of frames, the last item is
+        ``_END_OF_STREAM`` or the exception raised by the stream content.
+        """
+
+        def put(item) -> bool:
+            # the queue is bounded, give up once the sender stopped
+            while not stopped.is_set():
+                try:
+                    frames.put(item, timeout=_DRAIN_POLL_INTERVAL)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        try:
+            for data in self._iterate_stream_content():
+                if not put(data):
+                    return
+            put(_END_OF_STREAM)
+        except Exception as e:  # pylint: disable=broad-except
+            put(e)
+
+    def _iterate_frames(self, writer: _StreamWriter):
+        """
+        Yields the encoded stream content, sends pending frames while the
+        drain thread doesn't have a new one ready.
+        """
+        # the drain thread runs at most two flushes ahead of the socket
+        frames = queue.Queue(maxsize=2 * writer.policy.max_items)
+        stopped = threading.Event()
+        thread = threading.Thread(target=self._drain_stream_content,
+                                  args=(frames, stopped),
+                                  name="djl-stream-drain",
+                                  daemon=True)
+        thread.start()
+        try:
+            while True:
+                try:
+                    if writer.items == 0:
+                        item = frames.get()
+                    else:
+                        item = frames.get(
+                            timeout=max(0,
+                                        writer.deadline() - time.monotonic()))
+                except queue.Empty:
+                    writer.flush()
+                    continue
+                if item is _END_OF_STREAM:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # stops the stream content if the socket fails
+            stopped.set()
+
+    def send(self, cl_socket, flush_policy: StreamFlushPolicy = None):
+        """
+        Sends the output to the DJL engine.
+
+        :param cl_socket: socket connection
+        :param flush_policy: when streaming frames are sent, each frame is
+            sent on its own by default
+        """
         msg = bytearray()
         msg += struct.pack('>h', self.code)
         self.write_utf8(msg, self.message)
@@ -177,51 +599,38 @@ class Output(object):
         if self.stream_content is None:
             size = self.content.size()
             msg += struct.pack('>h', size)
+            buffers = [msg]
             for i in range(size):
                 k = self.content.key_at(i)
                 v = self.content.value_at(i)
                 self.write_utf8(msg, k)
                 msg += struct.pack('>i', len(v))
-                msg += v
-            cl_socket.sendall(msg)
+                if len(v) < SCATTER_THRESHOLD:
+                    msg += v
+                else:
+                    # send large value from the original buffer without copy
+                    msg = bytearray()
+                    buffers.append(v)
+                    buffers.append(msg)
+            _send_buffers(cl_socket, buffers)
             return
 
         msg += struct.pack('>h', -1)
         cl_socket.sendall(msg)
 
-        while True:
-            try:
-                data = next(self.stream_content)
-                if self.stream_output_formatter is not None:
-                    data = self.stream_output_formatter(data)
-
-                msg = bytearray()
-                msg += b'\1'
-
-                if type(data) is str:
-                    data = data.encode('utf-8')
-                elif type(data) is bytearray:
-                    pass
-                elif type(data) is bytes:
-                    data = bytearray(data)
-                else:
-                    data = bytearray(self._encode_json(data))
-
-                msg += struct.pack('>i', len(data))
-                msg += data
-                cl_socket.sendall(msg)
-            except StopIteration:
-                msg = bytearray()
-                msg += b'\0'
-                msg += struct.pack('>i', 0)
-                cl_socket.sendall(msg)
-                break
-            except Exception as e:
-                logging.exception("Failed read streaming content from output")
-                msg = bytearray()
-                msg += b'\0'
-                data = str(e).encode('utf-8')
-                msg += struct.pack('>i', len(data))
-                msg += data
-                cl_socket.sendall(msg)
-                break
+        writer = _StreamWriter(cl_socket, flush_policy or StreamFlushPolicy())
+        if writer.policy.background:
+            frames = self._iterate_frames(writer)
+        else:
+            frames = self._iterate_stream_content()
+        try:
+            for data in frames:
+                writer.write(data)
+            writer.write(b"", more=False)
+        except Exception as e:
+            logging.exception("Failed read streaming content from output")
+            writer.write(str(e).encode('utf-8'), more=False)
+        finally:
+            writer.close()
+            if writer.policy.background:
+                frames.close()
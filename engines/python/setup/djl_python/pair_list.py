@@ -11,23 +11,37 @@
 # BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, express or implied. See the License for
 # the specific language governing permissions and limitations under the License.
 
+# small lists are faster to scan than to index
+_SCAN_SIZE = 8
+
 
 class PairList(object):
+    """
+    Ordered list of key value pairs that allows duplicated keys.
+
+    ``get`` looks up keys in a lazily built key to index map, which resolves
+    to the first occurrence of a key, lists of up to 8 pairs are scanned.
+    The map is rebuilt when ``keys`` is replaced or changes size, or when the
+    key found at the mapped index differs. A new key written in place into
+    ``keys`` is only found once the map is rebuilt, assign a new list to
+    ``keys`` to make it visible at once.
+    """
+
+    __slots__ = ("keys", "values", "_index")
 
     def __init__(self, keys=None, values=None, pair_list=None, pair_map=None):
+        self._index = None
         if keys and values:
             if len(keys) != len(values):
                 raise ValueError("key value size mismatch.")
             self.keys = keys
             self.values = values
         elif pair_list:
-            for pair in pair_list:
-                self.keys.append(pair[0])
-                self.values.append(pair[1])
+            self.keys = [pair[0] for pair in pair_list]
+            self.values = [pair[1] for pair in pair_list]
         elif pair_map:
-            for key, value in pair_map.items():
-                self.keys.append(key)
-                self.values.append(value)
+            self.keys = list(pair_map.keys())
+            self.values = list(pair_map.values())
         else:
             self.keys = []
             self.values = []
@@ -36,17 +50,29 @@ class PairList(object):
         if index is not None and value is not None:
             self.keys.insert(index, key)
             self.values.insert(index, value)
+            self._index = None
         elif pair:
-            self.keys.append(pair[0])
-            self.values.append(pair[1])
+            self._append(pair[0], pair[1])
         elif value is not None:  # ignore None value
-            self.keys.append(key)
-            self.values.append(value)
+            self._append(key, value)
+
+    def _append(self, key, value):
+        self.keys.append(key)
+        self.values.append(value)
+        if self._index is not None:
+            keys, size, positions = self._index
+            if keys is self.keys and size == len(keys) - 1:
+                # appending doesn't move the other keys, extend the map
+                positions.setdefault(key, size)
+                self._index = (keys, size + 1, positions)
+            else:
+                # keys was changed directly, its size may match again later
+                self._index = None
 
     def add_all(self, other):
         if other:
-            self.keys.extend(other.keys())
-            self.values.extend(other.values())
+            self.keys.extend(other.keys)
+            self.values.extend(other.values)
 
     def size(self):
         return len(self.keys)
@@ -55,11 +81,32 @@ class PairList(object):
         return self.size() == 0
 
     def get(self, key):
-        if key not in self.keys:
+        keys = self.keys
+        size = len(keys)
+        if size <= _SCAN_SIZE:
+            if key not in keys:
+                return None
+            return self.values[keys.index(key)]
+
+        index = self._index
+        if index is None or index[0] is not keys or index[1] != size:
+            index = self._build_index()
+        key_index = index[2].get(key)
+        if key_index is not None and keys[key_index] != key:
+            # a key was replaced in place
+            key_index = self._build_index()[2].get(key)
+        if key_index is None:
             return None
-        key_index = self.keys.index(key)
         return self.values[key_index]
 
+    def _build_index(self) -> tuple:
+        keys = self.keys
+        size = len(keys)
+        # iterate backwards so the first occurrence of a key wins
+        positions = dict(zip(reversed(keys), range(size - 1, -1, -1)))
+        self._index = (keys, size, positions)
+        return self._index
+
     def key_at(self, index: int):
         return self.keys[index]
 
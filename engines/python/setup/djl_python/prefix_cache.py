@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+#
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file
+# except in compliance with the License. A copy of the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "LICENSE.txt" file accompanying this file. This file is distributed on an "AS IS"
+# BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, express or implied. See the License for
+# the specific language governing permissions and limitations under the License.
+
+import threading
+from collections import OrderedDict
+
+import torch
+
+
+class _Block(object):
+    __slots__ = ("token_ids", "past_key_values", "nbytes")
+
+    def __init__(self, token_ids, past_key_values):
+        self.token_ids = token_ids
+        self.past_key_values = past_key_values
+        self.nbytes = sum(t.numel() * t.element_size()
+                          for layer in past_key_values for t in layer)
+
+
+class PrefixCache(object):
+    """
+    LRU cache of prompt KV caches, shared by the requests of a model.
+
+    Prompts are split in blocks of ``block_size`` tokens, each block is keyed
+    by the hash of all the tokens up to its end, so requests that share a
+    prefix share its blocks. ``get`` returns the keys and values of the
+    longest cached prefix of a prompt. The least recently used blocks are
+    evicted once the cache holds more than ``max_bytes``.
+
+    KV caches are tuples of ``(key, value)`` per layer with the
+    ``[1, heads, seq, head_dim]`` layout.
+    """
+
+    def __init__(self, max_bytes: int, block_size=16):
+        self.max_bytes = max_bytes
+        self.block_size = block_size
+        self.blocks = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def _hashes(self, token_ids, length):
+        hashes = []
+        key = None
+        for start in range(0, length - self.block_size + 1, self.block_size):
+            key = hash((key, tuple(token_ids[start:start + self.block_size])))
+            hashes.append(key)
+        return hashes
+
+    def get(self, token_ids: list):
+        """
+        Looks up the longest cached prefix of the prompt, the last prompt
+        token is never served from the cache.
+
+        :param token_ids: prompt token ids
+        :return: prefix length and its KV cache, or (0, None)
+        """
+        hashes = self._hashes(token_ids, len(token_ids) - 1)
+        blocks = []
+        with self.lock:
+            for i, key in enumerate(hashes):
+                block = self.blocks.get(key)
+                start = i * self.block_size
+                if block is None or block.token_ids != tuple(
+                        token_ids[start:start + self.block_size]):
+                    break
+                blocks.append((key, block))
+            if not blocks:
+                self.misses += 1
+                return 0, None
+            self.hits += 1
+            # the first blocks of a prefix are evicted last
+            for key, _ in reversed(blocks):
+                self.blocks.move_to_end(key)
+
+        if len(blocks) == 1:
+            past_key_values = blocks[0][1].past_key_values
+        else:
+            past_key_values = tuple(
+                tuple(
+                    torch.cat([b.past_key_values[i][j] for _, b in blocks],
+                              dim=2) for j in range(len(layer)))
+                for i, layer in enumerate(blocks[0][1].past_key_values))
+        return len(blocks) * self.block_size, past_key_values
+
+    def put(self, token_ids: list, past_key_values):
+        """
+        Caches the blocks of the prompt that are not cached yet.
+
+        :param token_ids: prompt token ids
+        :param past_key_values: KV cache of at least the prompt tokens
+        """
+        hashes = self._hashes(token_ids, len(token_ids))
+        with self.lock:
+            missing = [
+                i for i, key in enumerate(hashes) if key not in self.blocks
+            ]
+
+        new_blocks = []
+        for i in missing:
+            start = i * self.block_size
+            end = start + self.block_size
+            kv = tuple(
+                tuple(t[:, :, start:end].clone() for t in layer)
+                for layer in past_key_values)
+            new_blocks.append(
+                (hashes[i], _Block(tuple(token_ids[start:end]), kv)))
+
+        with self.lock:
+            for key, block in new_blocks:
+                if key not in self.blocks:
+                    self.blocks[key] = block
+                    self.nbytes += block.nbytes
+            for key in reversed(hashes):
+                if key in self.blocks:
+                    self.blocks.move_to_end(key)
+            while self.nbytes > self.max_bytes and self.blocks:
+                _, block = self.blocks.popitem(last=False)
+                self.nbytes -= block.nbytes
+                self.evictions += 1
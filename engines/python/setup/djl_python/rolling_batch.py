@@ -0,0 +1,506 @@
+#!/usr/bin/env python
+#
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file
+# except in compliance with the License. A copy of the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "LICENSE.txt" file accompanying this file. This file is distributed on an "AS IS"
+# BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, express or implied. See the License for
+# the specific language governing permissions and limitations under the License.
+
+import collections
+import logging
+import queue
+import threading
+import time
+
+import torch
+
+from djl_python.streaming_utils import IncrementalDetokenizer, StreamingUtils
+
+
+class Request(object):
+    """
+    A generation request of the rolling batch. Generated token texts are
+    consumed from ``stream()``, or token ids with ``output_token_ids``.
+    """
+
+    def __init__(self,
+                 prompt_ids: list,
+                 max_new_tokens: int,
+                 stop_token_ids: set,
+                 stop_sequences=None,
+                 **kwargs):
+        self.prompt_ids = prompt_ids
+        self.token_ids = list(prompt_ids)
+        self.max_new_tokens = max_new_tokens
+        self.stop_token_ids = stop_token_ids
+        self.stop_sequences = stop_sequences
+        self.decoding_method = StreamingUtils._get_decoding_method(**kwargs)
+        self.processors = StreamingUtils._get_logits_processors(
+            self.decoding_method, **kwargs)
+        self.generator = StreamingUtils._get_generator(**kwargs)
+        self.detokenizer = IncrementalDetokenizer(prompt_ids)
+        # output options don't split the decoding groups, logprobs are not
+        # supported
+        self.output_token_ids = kwargs.pop("output_token_ids", False)
+        kwargs.pop("output_logprobs", None)
+        if self.generator is not None:
+            # a seeded generator can't be shared with other requests
+            self.group_key = id(self)
+        else:
+            self.group_key = tuple(
+                sorted((k, repr(v)) for k, v in kwargs.items()))
+        self.finished = False
+        self.submit_time = time.perf_counter()
+        self.first_token_time = None
+        self.finish_time = None
+        self._tokens = queue.Queue()
+
+    @property
+    def new_tokens(self) -> int:
+        return len(self.token_ids) - len(self.prompt_ids)
+
+    def add_token(self, token_id: int) -> bool:
+        """
+        Records a generated token.
+
+        :return: whether it is the last token of the request
+        """
+        if self.first_token_time is None:
+            self.first_token_time = time.perf_counter()
+        self.token_ids.append(token_id)
+        return token_id in self.stop_token_ids or self.new_tokens >= self.max_new_tokens
+
+    def send(self, text: str, last: bool):
+        """
+        Streams the text of the last token, up to the end of a stop sequence.
+        """
+        if self.stop_sequences is not None and not last and text:
+            truncated = self.stop_sequences.truncate(text)
+            if truncated is not None:
+                text, last = truncated, True
+        if self.output_token_ids:
+            self._tokens.put({"token_ids": [self.token_ids[-1]]})
+        else:
+            self._tokens.put(text)
+        if last:
+            self.finish()
+
+    def finish(self, error=None):
+        if self.finished:
+            return
+        self.finished = True
+        self.finish_time = time.perf_counter()
+        self._tokens.put(error)
+
+    def stream(self):
+        """
+        Yields the output of each token as it is generated.
+        """
+        while True:
+            item = self._tokens.get()
+            if item is None:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+
+def stream_requests(requests: list, batched: bool = False):
+    """
+    Streams the tokens of several requests together, in the format of the
+    ``StreamingUtils`` generators: one list of token texts per step, with an
+    empty string for requests that are already finished.
+
+    :param requests: list of Request
+    :param batched: finished requests are ``None`` instead, for the batched
+        mode of ``Output.add_stream_content``
+    """
+    finished = None if batched else ""
+    streams = [request.stream() for request in requests]
+    while True:
+        texts = [next(stream, None) for stream in streams]
+        if all(text is None for text in texts):
+            return
+        yield [finished if text is None else text for text in texts]
+
+
+class _Prefill(object):
+    """
+    The prompts of requests that join the batch, prefilled in chunks.
+    """
+
+    __slots__ = ("requests", "input_ids", "attention_mask", "position_ids",
+                 "past_key_values", "offset")
+
+    def __init__(self, requests, input_ids, attention_mask, position_ids,
+                 past_key_values, offset):
+        self.requests = requests
+        self.input_ids = input_ids
+        self.attention_mask = attention_mask
+        self.position_ids = position_ids
+        self.past_key_values = past_key_values
+        self.offset = offset
+
+
+class RollingBatch(object):
+    """
+    Iteration level batching for causal LM streaming generation.
+
+    Requests submitted from any thread join the running batch at the next
+    token boundary: their prompts are prefilled and their KV cache rows are
+    left padded to the length of the batch cache. Finished requests are
+    evicted together with their cache rows right after their last token.
+
+    Experimental: requests only run concurrently when the engine has several
+    requests in flight, which the DJL front end doesn't do yet. It waits for
+    each response before it sends the next request to a worker. The serial
+    engine loop sends a whole stream before it reads the next request, and
+    the pipelined loop holds the send lock while a stream is sent. Until the
+    front end multiplexes requests, a batch only holds the prompts of one
+    request. Models must use the standard
+    ``[batch, heads, seq, head_dim]`` KV cache layout. With a ``PrefixCache``
+    prompts are prefilled one by one, starting after their longest cached
+    prefix.
+
+    With ``prefill_chunk_size``, prompts are prefilled ``prefill_chunk_size``
+    tokens at a time, and each chunk is followed by a decode step of the
+    running batch, so long prompts neither stall the running requests nor
+    need the activations of the whole prompt at once.
+    """
+
+    def __init__(self,
+                 model,
+                 tokenizer,
+                 max_batch_size=32,
+                 prefix_cache=None,
+                 prefill_chunk_size=None):
+        if StreamingUtils._get_generic_model_class(model) != "CausalLM":
+            raise ValueError("Rolling batch only supports causal LM models")
+        if not tokenizer.pad_token:
+            tokenizer.pad_token = tokenizer.eos_token
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_batch_size = max_batch_size
+        self.prefix_cache = prefix_cache
+        self.prefill_chunk_size = prefill_chunk_size
+        self.prefills = collections.deque()
+        self.device = StreamingUtils._get_current_device()
+        self.pending = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.generated_tokens = 0
+        self._reset()
+
+    def _reset(self):
+        self.requests = []
+        self.past_key_values = None
+        self.attention_mask = None
+        self.position_ids = None
+        self.next_ids = None
+
+    def submit(self, prompt: str, **kwargs) -> Request:
+        """
+        Queues a prompt for generation.
+
+        :param prompt: input text
+        :param kwargs: generation parameters, like StreamingUtils
+        :return: Request
+        """
+        max_new_tokens = kwargs.pop("max_new_tokens",
+                                    StreamingUtils.DEFAULT_MAX_NEW_TOKENS)
+        stop_token_ids, stop_sequences = StreamingUtils._get_stop_criteria(
+            self.tokenizer, 1, **kwargs)
+        kwargs.pop("stop_token_ids", None)
+        kwargs.pop("stop_sequences", None)
+        prompt_ids = self.tokenizer(prompt)["input_ids"]
+        request = Request(prompt_ids, max_new_tokens, stop_token_ids,
+                          stop_sequences[0] if stop_sequences else None,
+                          **kwargs)
+        self.pending.put(request)
+        with self.lock:
+            if self.thread is None:
+                self._start_thread()
+        return request
+
+    def _start_thread(self):
+        self.thread = threading.Thread(target=self._run,
+                                       name="djl-rolling-batch",
+                                       daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        try:
+            while True:
+                try:
+                    self._schedule()
+                except Exception as e:  # pylint: disable=broad-except
+                    logging.exception("Rolling batch scheduling failed")
+                    self._fail(e)
+        finally:
+            # the thread died, e.g. SystemExit, don't leave requests waiting
+            self._fail(RuntimeError("Rolling batch thread stopped"))
+            with self.lock:
+                self.thread = None
+                if not self.pending.empty():
+                    self._start_thread()
+
+    def _schedule(self):
+        self._admit()
+        if self.prefills:
+            self._prefill_step()
+        if not self.requests:
+            return
+        try:
+            self._step()
+        except Exception as e:  # pylint: disable=broad-except
+            logging.exception("Rolling batch generation failed")
+            for request in self.requests:
+                request.finish(e)
+            self._reset()
+
+    def _fail(self, error: Exception):
+        """
+        Finishes the running requests and the requests being prefilled with
+        the error.
+        """
+        for prefill in self.prefills:
+            for request in prefill.requests:
+                request.finish(error)
+        for request in self.requests:
+            request.finish(error)
+        self.prefills.clear()
+        self._reset()
+
+    def _admit(self):
+        new_requests = []
+        if not self.requests and not self.prefills:
+            new_requests.append(self.pending.get())
+        size = len(self.requests) + sum(
+            len(prefill.requests) for prefill in self.prefills)
+        while size + len(new_requests) < self.max_batch_size:
+            try:
+                new_requests.append(self.pending.get_nowait())
+            except queue.Empty:
+                break
+        if self.prefix_cache is None:
+            batches = [new_requests] if new_requests else []
+        else:
+            # prompts have different cached prefixes, prefill one by one
+            batches = [[request] for request in new_requests]
+
+        for batch in batches:
+            try:
+                prefill = self._start_prefill(batch)
+            except Exception as e:  # pylint: disable=broad-except
+                logging.exception("Rolling batch prefill failed")
+                for request in batch:
+                    request.finish(e)
+                continue
+            self.prefills.append(prefill)
+            if self.prefill_chunk_size is None:
+                self._prefill_step()
+
+    def _prefill_step(self):
+        """
+        Runs the next prompt chunk of the first pending prefill, or the
+        whole prompt without chunking.
+        """
+        prefill = self.prefills[0]
+        try:
+            done = self._prefill(prefill)
+        except Exception as e:  # pylint: disable=broad-except
+            logging.exception("Rolling batch prefill failed")
+            done = True
+            failed = prefill.requests
+            if failed[0] in self.requests:
+                # failed after joining the running batch
+                failed = self.requests
+                self._reset()
+            for request in failed:
+                request.finish(e)
+        if done:
+            self.prefills.popleft()
+
+    @torch.inference_mode()
+    def _start_prefill(self, new_requests: list) -> _Prefill:
+        size = len(new_requests)
+        length = max(len(r.prompt_ids) for r in new_requests)
+        input_ids = torch.full((size, length),
+                               self.tokenizer.pad_token_id,
+                               dtype=torch.long)
+        attention_mask = torch.zeros((size, length), dtype=torch.long)
+        for i, request in enumerate(new_requests):
+            prompt_length = len(request.prompt_ids)
+            input_ids[i, length - prompt_length:] = torch.tensor(
+                request.prompt_ids)
+            attention_mask[i, length - prompt_length:] = 1
+        input_ids = input_ids.to(self.device)
+        attention_mask = attention_mask.to(self.device)
+        position_ids = (attention_mask.cumsum(-1) - 1).clamp(min=0)
+
+        prefix_length, past_key_values = 0, None
+        if self.prefix_cache is not None:
+            prefix_length, past_key_values = self.prefix_cache.get(
+                new_requests[0].prompt_ids)
+        return _Prefill(new_requests, input_ids, attention_mask, position_ids,
+                        past_key_values, prefix_length)
+
+    @torch.inference_mode()
+    def _prefill(self, prefill: _Prefill) -> bool:
+        """
+        Prefills the next chunk of the prompts, the requests join the
+        running batch after the last chunk.
+
+        :return: whether the prompts are fully prefilled
+        """
+        length = prefill.input_ids.shape[1]
+        end = length
+        if self.prefill_chunk_size is not None:
+            end = min(prefill.offset + self.prefill_chunk_size, length)
+        outputs = self.model.forward(
+            input_ids=prefill.input_ids[:, prefill.offset:end],
+            attention_mask=prefill.attention_mask[:, :end],
+            position_ids=prefill.position_ids[:, prefill.offset:end],
+            past_key_values=prefill.past_key_values,
+            use_cache=True)
+        prefill.past_key_values = StreamingUtils._to_legacy_cache(
+            outputs.past_key_values)
+        prefill.offset = end
+        if end < length:
+            return False
+
+        new_requests = prefill.requests
+        if self.prefix_cache is not None:
+            self.prefix_cache.put(new_requests[0].prompt_ids,
+                                  prefill.past_key_values)
+        token_ids = self._select(new_requests, outputs.logits[:, -1, :])
+        self._merge(new_requests,
+                    prefill.past_key_values, prefill.attention_mask,
+                    prefill.attention_mask.sum(-1), token_ids)
+        self._emit(len(self.requests) - len(new_requests))
+        return True
+
+    @torch.inference_mode()
+    def _step(self):
+        size = len(self.requests)
+        attention_mask = torch.cat(
+            [self.attention_mask,
+             self.attention_mask.new_ones((size, 1))],
+            dim=1)
+        outputs = self.model.forward(input_ids=self.next_ids,
+                                     attention_mask=attention_mask,
+                                     position_ids=self.position_ids.view(
+                                         -1, 1),
+                                     past_key_values=self.past_key_values,
+                                     use_cache=True)
+        self.past_key_values = StreamingUtils._to_legacy_cache(
+            outputs.past_key_values)
+        self.attention_mask = attention_mask
+        self.position_ids += 1
+        self.next_ids = self._select(self.requests,
+                                     outputs.logits[:, -1, :]).view(-1, 1)
+        self._emit(0)
+
+    def _select(self, requests: list, logits):
+        """
+        Selects the next token of each request, requests with the same
+        generation parameters are decoded together.
+        """
+        groups = dict()
+        for i, request in enumerate(requests):
+            groups.setdefault(request.group_key, []).append(i)
+
+        if len(groups) == 1:
+            return self._decode(requests, logits)
+
+        token_ids = torch.empty(len(requests),
+                                dtype=torch.long,
+                                device=logits.device)
+        for rows in groups.values():
+            index = torch.tensor(rows, device=logits.device)
+            token_ids[index] = self._decode([requests[i] for i in rows],
+                                            logits.index_select(0, index))
+        return token_ids
+
+    def _decode(self, requests: list, logits):
+        first = requests[0]
+        history = None
+        if len(first.processors) > 0:
+            # left pad with the first token, it is already in the history
+            length = max(len(r.token_ids) for r in requests)
+            history = torch.tensor([[r.token_ids[0]] *
+                                    (length - len(r.token_ids)) + r.token_ids
+                                    for r in requests],
+                                   device=logits.device)
+        return first.decoding_method(logits, history, first.processors,
+                                     first.generator)
+
+    def _merge(self, new_requests, past_key_values, attention_mask,
+               position_ids, token_ids):
+        next_ids = token_ids.view(-1, 1)
+        if not self.requests:
+            self.requests = list(new_requests)
+            self.past_key_values = past_key_values
+            self.attention_mask = attention_mask
+            self.position_ids = position_ids
+            self.next_ids = next_ids
+            return
+
+        length = max(self.attention_mask.shape[1], attention_mask.shape[1])
+
+        def pad(tensor, dim):
+            padding = [0, 0] * (tensor.dim() - dim - 1)
+            padding += [length - tensor.shape[dim], 0]
+            return torch.nn.functional.pad(tensor, padding)
+
+        self.past_key_values = tuple(
+            tuple(
+                torch.cat([pad(old, 2), pad(new, 2)])
+                for old, new in zip(old_layer, new_layer)) for old_layer,
+            new_layer in zip(self.past_key_values, past_key_values))
+        self.attention_mask = torch.cat(
+            [pad(self.attention_mask, 1),
+             pad(attention_mask, 1)])
+        self.position_ids = torch.cat([self.position_ids, position_ids])
+        self.next_ids = torch.cat([self.next_ids, next_ids])
+        self.requests.extend(new_requests)
+
+    def _emit(self, start: int):
+        requests = self.requests[start:]
+        token_ids = self.next_ids[start:].view(-1).tolist()
+        last = [
+            request.add_token(token_id)
+            for request, token_id in zip(requests, token_ids)
+        ]
+        texts = IncrementalDetokenizer.decode(
+            self.tokenizer, [request.detokenizer for request in requests],
+            token_ids, last)
+        for request, text, is_last in zip(requests, texts, last):
+            request.send(text, is_last)
+        self.generated_tokens += len(token_ids)
+        self._evict()
+
+    def _evict(self):
+        keep = [i for i, r in enumerate(self.requests) if not r.finished]
+        if len(keep) == len(self.requests):
+            return
+        if not keep:
+            self._reset()
+            return
+
+        index = torch.tensor(keep, device=self.attention_mask.device)
+        self.requests = [self.requests[i] for i in keep]
+        self.position_ids = self.position_ids.index_select(0, index)
+        self.next_ids = self.next_ids.index_select(0, index)
+        attention_mask = self.attention_mask.index_select(0, index)
+        # drop the leading columns that only padded the evicted rows
+        start = int(attention_mask.any(dim=0).int().argmax())
+        self.attention_mask = attention_mask[:, start:]
+        self.past_key_values = tuple(
+            tuple(t.index_select(0, index)[:, :, start:] for t in layer)
+            for layer in self.past_key_values)
@@ -12,6 +12,7 @@
 # the specific language governing permissions and limitations under the License.
 
 import importlib
+import inspect
 import json
 import logging
 import os
@@ -28,6 +29,18 @@ class ModelService(object):
         inputs.properties["model_dir"] = self.model_dir
         return getattr(self.module, function_name)(inputs)
 
+    def is_async_handler(self, function_name) -> bool:
+        """
+        Returns whether the handler is a coroutine function.
+
+        :param function_name: name of the handler function
+        :return: True if the handler is defined with ``async def``
+        """
+        if self.module is None or function_name is None:
+            return False
+        handler = getattr(self.module, function_name, None)
+        return inspect.iscoroutinefunction(handler)
+
 
 def load_model_service(model_dir, entry_point, device_id):
     manifest_file = os.path.join(model_dir, "MAR-INF/MANIFEST.json")
@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+#
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file
+# except in compliance with the License. A copy of the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "LICENSE.txt" file accompanying this file. This file is distributed on an "AS IS"
+# BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, express or implied. See the License for
+# the specific language governing permissions and limitations under the License.
+
+import threading
+
+import torch
+
+from djl_python.streaming_utils import IncrementalDetokenizer, StreamingUtils, TokenSampler
+
+
+def _crop(past_key_values, length):
+    past_key_values = StreamingUtils._to_legacy_cache(past_key_values)
+    return tuple(
+        tuple(t[:, :, :length] for t in layer) for layer in past_key_values)
+
+
+class SpeculativeDecoder(object):
+    """
+    Speculative decoding for causal LM streaming generation.
+
+    The draft model proposes ``num_speculative_tokens`` tokens, the target
+    model scores all of them in one forward pass. Greedy decoding accepts
+    the draft tokens that match the target model choice, sampling uses
+    rejection sampling, so the output follows the target model distribution
+    in both cases. All rows of a batch advance by the number of tokens
+    accepted by every row, plus one token chosen by the target model.
+
+    The draft model must use the same tokenizer as the target model.
+    ``proposed_tokens`` and ``accepted_tokens`` count the draft tokens of all
+    requests.
+    """
+
+    def __init__(self, draft_model, num_speculative_tokens=4):
+        self.draft_model = draft_model
+        self.num_speculative_tokens = num_speculative_tokens
+        self.proposed_tokens = 0
+        self.accepted_tokens = 0
+        self.lock = threading.Lock()
+
+    @property
+    def acceptance_rate(self) -> float:
+        if self.proposed_tokens == 0:
+            return 0.0
+        return self.accepted_tokens / self.proposed_tokens
+
+    @torch.inference_mode()
+    def stream(self, model, tokenizer, inputs, **kwargs):
+        """
+        Streams generated text like ``StreamingUtils``, each step yields the
+        text of all the tokens accepted for each input.
+        """
+        if not tokenizer.pad_token:
+            tokenizer.pad_token = tokenizer.eos_token
+        max_new_tokens = kwargs.get("max_new_tokens",
+                                    StreamingUtils.DEFAULT_MAX_NEW_TOKENS)
+        tokenized_inputs = tokenizer(inputs, return_tensors="pt",
+                                     padding=True).to(
+                                         StreamingUtils._get_current_device())
+        input_ids = tokenized_inputs["input_ids"]
+        batch_size, input_length = input_ids.shape
+
+        max_length = input_length + max_new_tokens
+        history = input_ids.new_empty(batch_size, max_length)
+        history[:, :input_length] = input_ids
+        attention_mask = input_ids.new_zeros(batch_size, max_length)
+        if tokenizer.pad_token == tokenizer.eos_token:
+            attention_mask[:, :input_length] = 1
+        else:
+            attention_mask[:, :input_length] = tokenized_inputs[
+                "attention_mask"]
+        prompt_lengths = tokenized_inputs["attention_mask"].sum(-1).tolist()
+        detokenizers = [
+            IncrementalDetokenizer(ids[len(ids) - length:])
+            for ids, length in zip(input_ids.tolist(), prompt_lengths)
+        ]
+        sampler = TokenSampler(tokenizer, detokenizers, **kwargs)
+        sampling = sampler.decoding_method == StreamingUtils._sampling_decoding
+        processors = sampler.processors
+        generator = sampler.generator
+
+        length = input_length
+        target_past_key_values = None
+        target_length = 0
+        draft_past_key_values = None
+        draft_length = 0
+        finished = [False] * batch_size
+
+        while True:
+            k = min(self.num_speculative_tokens,
+                    max_new_tokens - sampler.new_tokens_count - 1)
+            attention_mask[:, length:length + k + 1] = 1
+
+            # the draft model proposes k tokens
+            draft_probs = []
+            for j in range(k):
+                outputs = self.draft_model.forward(
+                    input_ids=history[:, draft_length:length + j],
+                    attention_mask=attention_mask[:, :length + j],
+                    past_key_values=draft_past_key_values,
+                    use_cache=True)
+                draft_past_key_values = outputs.past_key_values
+                draft_length = length + j
+                scores = processors(history[:, :length + j],
+                                    outputs.logits[:, -1, :])
+                if sampling:
+                    probs = torch.nn.functional.softmax(scores, dim=-1)
+                    draft_probs.append(probs)
+                    token_ids = torch.multinomial(probs,
+                                                  num_samples=1,
+                                                  generator=generator).view(-1)
+                else:
+                    token_ids = scores.argmax(dim=-1)
+                history[:, length + j] = token_ids
+
+            # the target model scores the k draft tokens in one pass
+            outputs = model.forward(
+                input_ids=history[:, target_length:length + k],
+                attention_mask=attention_mask[:, :length + k],
+                past_key_values=target_past_key_values,
+                use_cache=True)
+            target_past_key_values = outputs.past_key_values
+            logits = outputs.logits[:, -(k + 1):, :]
+            scores = [
+                processors(history[:, :length + j], logits[:, j, :])
+                for j in range(k + 1)
+            ]
+            draft_ids = history[:, length:length + k]
+            if sampling:
+                accepted, next_ids = self._verify_sampling(
+                    scores, draft_probs, draft_ids, generator)
+            else:
+                accepted, next_ids = self._verify_greedy(scores, draft_ids)
+
+            active = [i for i, f in enumerate(finished) if not f]
+            n = min(accepted[i] for i in active)
+            history[:, length + n] = next_ids[:, n]
+            new_ids = history[:, length:length + n + 1]
+            # scores of the accepted tokens and the next token
+            logprobs = [
+                sampler.token_logprobs(logits[:, j, :], new_ids[:, j])
+                for j in range(n + 1)
+            ]
+            new_ids = new_ids.tolist()
+            with self.lock:
+                self.proposed_tokens += k * len(active)
+                self.accepted_tokens += n * len(active)
+
+            # keep the KV cache of the accepted tokens only
+            length += n + 1
+            target_length = length - 1
+            target_past_key_values = _crop(target_past_key_values,
+                                           target_length)
+            if k > 0:
+                draft_length = min(draft_length, target_length)
+                draft_past_key_values = _crop(draft_past_key_values,
+                                              draft_length)
+
+            token_text = [
+                sampler.finished_output if f else sampler.empty_output
+                for f in finished
+            ]
+            for j in range(n + 1):
+                texts, emitted = sampler.emit([
+                    None if finished[i] else new_ids[i][j]
+                    for i in range(batch_size)
+                ], logprobs[j])
+                for i, text in enumerate(texts):
+                    token_text[i] = TokenSampler.join(token_text[i], text)
+                    finished[i] = finished[i] or emitted[i]
+                if sampler.done:
+                    break
+
+            yield token_text
+            if sampler.done:
+                return
+
+    @staticmethod
+    def _verify_greedy(scores, draft_ids):
+        """
+        Returns the number of accepted draft tokens of each row, and the
+        target model choice at each position.
+        """
+        target_ids = torch.stack([s.argmax(dim=-1) for s in scores], dim=1)
+        k = draft_ids.shape[1]
+        matches = (target_ids[:, :k] == draft_ids).long()
+        accepted = matches.cumprod(dim=1).sum(dim=1)
+        return accepted.tolist(), target_ids
+
+    @staticmethod
+    def _verify_sampling(scores, draft_probs, draft_ids, generator):
+        """
+        Rejection sampling: a draft token ``x`` is accepted with probability
+        ``min(1, p(x) / q(x))``, the first rejected token is resampled from
+        ``max(0, p - q)``, and a new token is sampled from ``p`` after the
+        last draft token.
+        """
+        probs = [torch.nn.functional.softmax(s, dim=-1) for s in scores]
+        k = draft_ids.shape[1]
+        batch_size = draft_ids.shape[0]
+        next_ids = draft_ids.new_empty(batch_size, k + 1)
+        if k == 0:
+            next_ids[:, 0] = torch.multinomial(probs[0],
+                                               num_samples=1,
+                                               generator=generator).view(-1)
+            return [0] * batch_size, next_ids
+
+        p = torch.stack(probs[:k], dim=1)
+        q = torch.stack(draft_probs, dim=1)
+        index = draft_ids.unsqueeze(-1)
+        ratio = p.gather(-1, index).squeeze(-1) / q.gather(-1,
+                                                           index).squeeze(-1)
+        uniform = torch.rand(ratio.shape,
+                             generator=generator,
+                             device=ratio.device)
+        matches = (uniform < ratio).long()
+        accepted = matches.cumprod(dim=1).sum(dim=1)
+
+        # accepted draft tokens are kept, rejected ones are resampled
+        residual = (p - q).clamp(min=0)
+        residual_sum = residual.sum(dim=-1, keepdim=True)
+        residual = torch.where(residual_sum > 0,
+                               residual / residual_sum.clamp(min=1e-12), p)
+        resampled = torch.multinomial(residual.view(-1, residual.shape[-1]),
+                                      num_samples=1,
+                                      generator=generator).view(batch_size, k)
+        next_ids[:, :k] = torch.where(matches.bool(), draft_ids, resampled)
+        next_ids[:, k] = torch.multinomial(probs[k],
+                                           num_samples=1,
+                                           generator=generator).view(-1)
+        return accepted.tolist(), next_ids
@@ -10,9 +10,235 @@ from transformers import (
 )
 
 
+class IncrementalDetokenizer(object):
+    """
+    Decodes the generated tokens of one sequence incrementally.
+
+    New tokens are decoded together with a few preceding tokens, so merged
+    subwords and spaces come out like in a full sequence decode. Text that
+    ends with an incomplete UTF-8 character is held back until a later
+    token completes it.
+    """
+
+    PREFIX_WINDOW = 5
+
+    def __init__(self, prompt_ids: list):
+        self.token_ids = list(prompt_ids[-self.PREFIX_WINDOW:])
+        self.read_offset = len(self.token_ids)
+
+    @staticmethod
+    def decode(tokenizer, detokenizers: list, token_ids: list, flush=None):
+        """
+        Appends one token to each sequence and returns the new text of each
+        sequence, the whole batch is decoded with one tokenizer call.
+
+        :param tokenizer: tokenizer
+        :param detokenizers: list of IncrementalDetokenizer
+        :param token_ids: new token id of each sequence, None to skip it
+        :param flush: optional list of bool, whether the sequence ended and
+            incomplete characters must not be held back
+        :return: list of str
+        """
+        rows = []
+        windows = []
+        for i, token_id in enumerate(token_ids):
+            if token_id is None:
+                continue
+            detokenizer = detokenizers[i]
+            detokenizer.token_ids.append(token_id)
+            rows.append(i)
+            windows.append(detokenizer.token_ids[:detokenizer.read_offset])
+            windows.append(detokenizer.token_ids)
+
+        result = [""] * len(detokenizers)
+        if not rows:
+            return result
+        texts = IncrementalDetokenizer._batch_decode(tokenizer, windows)
+        for j, i in enumerate(rows):
+            result[i] = detokenizers[i]._update(texts[2 * j], texts[2 * j + 1],
+                                                flush and flush[i])
+        return result
+
+    @staticmethod
+    def _batch_decode(tokenizer, windows):
+        backend = getattr(tokenizer, "backend_tokenizer", None)
+        if backend is None:
+            return tokenizer.batch_decode(windows)
+        # decode all windows in one call to the Rust tokenizer, the same
+        # way PreTrainedTokenizerFast decodes each sequence
+        texts = backend.decode_batch(windows, skip_special_tokens=False)
+        if tokenizer.clean_up_tokenization_spaces:
+            texts = [tokenizer.clean_up_tokenization(t) for t in texts]
+        return texts
+
+    def _update(self, prefix_text, text, flush):
+        if len(text) <= len(prefix_text) or (text.endswith("\ufffd")
+                                             and not flush):
+            return ""
+        # the tokens read so far become the next prefix window
+        self.token_ids = self.token_ids[self.read_offset:]
+        self.read_offset = len(self.token_ids)
+        return text[len(prefix_text):]
+
+
+class StopSequences(object):
+    """
+    Finds stop sequences in the streamed text of one sequence, also when a
+    stop sequence spans several tokens.
+    """
+
+    def __init__(self, stop_sequences: list):
+        self.stop_sequences = stop_sequences
+        self.tail_length = max(len(s) for s in stop_sequences) - 1
+        self.tail = ""
+
+    def truncate(self, text: str):
+        """
+        Returns the text up to the end of the first stop sequence, or None
+        if no stop sequence ends in this text.
+        """
+        window = self.tail + text
+        ends = [
+            window.find(s) + len(s) for s in self.stop_sequences if s in window
+        ]
+        if ends:
+            return text[:min(ends) - len(self.tail)]
+        self.tail = window[max(0, len(window) - self.tail_length):]
+        return None
+
+
+class TokenSampler(object):
+    """
+    Selects the next token of each sequence of a batch from the logits of
+    any model backend, and tracks when the sequences finish: stop tokens,
+    stop sequences and the ``max_new_tokens`` budget.
+
+    With ``output_token_ids``, each sequence outputs a dict of its new
+    ``token_ids`` instead of text, and ``logprobs`` with ``output_logprobs``.
+    The tokens are only decoded to find stop sequences then.
+
+    With ``batched``, a sequence outputs ``None`` after its last output, for
+    the batched mode of ``Output.add_stream_content``.
+    """
+
+    def __init__(self, tokenizer, detokenizers: list, **kwargs):
+        self.tokenizer = tokenizer
+        self.detokenizers = detokenizers
+        self.max_new_tokens = kwargs.get("max_new_tokens",
+                                         StreamingUtils.DEFAULT_MAX_NEW_TOKENS)
+        self.decoding_method = StreamingUtils._get_decoding_method(**kwargs)
+        self.processors = StreamingUtils._get_logits_processors(
+            self.decoding_method, **kwargs)
+        self.generator = StreamingUtils._get_generator(**kwargs)
+        self.stop_token_ids, self.stop_sequences = StreamingUtils._get_stop_criteria(
+            tokenizer, len(detokenizers), **kwargs)
+        self.output_token_ids = kwargs.get("output_token_ids", False)
+        self.output_logprobs = self.output_token_ids and kwargs.get(
+            "output_logprobs", False)
+        # output of a sequence without new tokens, and of a finished one
+        self.empty_output = None if self.output_token_ids else ""
+        batched = kwargs.get("batched", False)
+        self.finished_output = None if batched else self.empty_output
+        self.new_tokens_count = 0
+        self.done = False
+
+    def sample(self, logits, input_ids):
+        """
+        :param logits: next token logits of each sequence, [batch, vocab]
+        :param input_ids: token history of each sequence
+        :return: next token id of each sequence, [batch]
+        """
+        return self.decoding_method(logits, input_ids, self.processors,
+                                    self.generator).view(-1)
+
+    def token_logprobs(self, logits, token_ids):
+        """
+        :param logits: logits the tokens were sampled from, [batch, vocab]
+        :param token_ids: sampled token id of each sequence
+        :return: log probability of each token, None if not requested
+        """
+        if not self.output_logprobs:
+            return None
+        logprobs = torch.nn.functional.log_softmax(logits.float(), dim=-1)
+        return logprobs.gather(1, token_ids.view(-1, 1)).view(-1).tolist()
+
+    def emit(self, token_ids: list, logprobs: list = None):
+        """
+        Counts a step and decodes the new tokens, ``done`` is set once all
+        the sequences finished or the token budget is spent.
+
+        :param token_ids: new token id of each sequence, None to skip it
+        :param logprobs: optional log probability of each new token
+        :return: new output of each sequence, whether each sequence finished
+        """
+        self.new_tokens_count += 1
+        last_step = self.new_tokens_count >= self.max_new_tokens
+        finished = [
+            token_id is None or token_id in self.stop_token_ids
+            for token_id in token_ids
+        ]
+        texts = None
+        if not self.output_token_ids or self.stop_sequences is not None:
+            texts = IncrementalDetokenizer.decode(
+                self.tokenizer, self.detokenizers, token_ids,
+                [last_step or f for f in finished])
+        if self.stop_sequences is not None:
+            for i, text in enumerate(texts):
+                if finished[i] or not text:
+                    continue
+                truncated = self.stop_sequences[i].truncate(text)
+                if truncated is not None:
+                    texts[i] = truncated
+                    finished[i] = True
+        self.done = last_step or all(finished)
+        if not self.output_token_ids:
+            if self.finished_output is None:
+                texts = [
+                    None if token_id is None else text
+                    for token_id, text in zip(token_ids, texts)
+                ]
+            return texts, finished
+
+        outputs = []
+        for i, token_id in enumerate(token_ids):
+            if token_id is None:
+                outputs.append(None)
+                continue
+            output = {"token_ids": [token_id]}
+            if logprobs is not None:
+                output["logprobs"] = [logprobs[i]]
+            outputs.append(output)
+        return outputs, finished
+
+    @staticmethod
+    def join(first, second):
+        """
+        Appends the output of a later token to the output of a sequence.
+        """
+        if second is None:
+            return first
+        if not first:
+            return second
+        if isinstance(first, str):
+            return first + second
+        for key, values in second.items():
+            first[key].extend(values)
+        return first
+
+    def select(self, rows: list):
+        """
+        Keeps the state of the given rows only, for batches that drop their
+        finished rows.
+        """
+        self.detokenizers = [self.detokenizers[i] for i in rows]
+        if self.stop_sequences is not None:
+            self.stop_sequences = [self.stop_sequences[i] for i in rows]
+
+
 class StreamingUtils:
 
     DEFAULT_MAX_NEW_TOKENS = 50
+    SAMPLING_PARAMS = ("temperature", "top_p", "top_k", "typical_p")
     SUPPORTED_MODEL_ARCH_SUFFIXES_CAUSAL_LM = ("CausalLM", "GPT2LMHeadModel")
     SUPPORTED_MODEL_ARCH_SUFFIXES_SEQ_2_SEQ_LM = (
         "T5ForConditionalGeneration", )
@@ -36,6 +262,16 @@ class StreamingUtils:
     def _hf_model_stream_generator(model, tokenizer, inputs, **kwargs):
         StreamingUtils._validate_inputs(model, inputs)
         generic_model_class = StreamingUtils._get_generic_model_class(model)
+        if int(kwargs.get("beam_size", 1)) > 1:
+            from djl_python.beam_search import beam_search_stream
+            yield from beam_search_stream(model, tokenizer, inputs, **kwargs)
+            return
+        speculative_decoder = kwargs.get("speculative_decoder")
+        if speculative_decoder is not None and generic_model_class == "CausalLM":
+            yield from speculative_decoder.stream(model, tokenizer, inputs,
+                                                  **kwargs)
+            return
+
         if not tokenizer.pad_token:
             tokenizer.pad_token = tokenizer.eos_token
 
@@ -49,16 +285,26 @@ class StreamingUtils:
                                          StreamingUtils._get_current_device())
         input_ids = tokenized_inputs["input_ids"]
         past_key_values = None
-        decoding_method = StreamingUtils._get_decoding_method(**kwargs)
-        new_tokens_count = 0
+        # batch index in inputs of each row
+        rows = list(range(len(inputs)))
+        compact_rows = True
         unfinished_sequences = torch.ones((len(inputs), 1),
                                           dtype=torch.long,
                                           device=input_ids.device)
-        stop_generation = False
 
         if generic_model_class == "CausalLM":
             input_length = input_ids.shape[1]
-            all_decoder_input_ids = tokenized_inputs["input_ids"]
+            prompt_lengths = tokenized_inputs["attention_mask"].sum(
+                -1).tolist()
+            detokenizers = [
+                IncrementalDetokenizer(ids[len(ids) - length:])
+                for ids, length in zip(input_ids.tolist(), prompt_lengths)
+            ]
+            # token history, preallocated for all new tokens
+            all_decoder_input_ids = input_ids.new_empty(
+                len(inputs), input_length + max_new_tokens)
+            all_decoder_input_ids[:, :input_length] = input_ids
+            history_length = input_length
             is_pad_token_equal_to_eos_token = tokenizer.pad_token == tokenizer.eos_token
             attention_mask = input_ids.new_zeros(len(inputs),
                                                  input_length + max_new_tokens)
@@ -66,6 +312,39 @@ class StreamingUtils:
                            input_length] = 1 if is_pad_token_equal_to_eos_token else tokenized_inputs[
                                "attention_mask"]
             curr_length = input_length
+            model_kwargs = dict()
+            if kwargs.get("use_static_cache", False):
+                past_key_values = StreamingUtils._get_static_cache(
+                    model, len(inputs), input_length + max_new_tokens,
+                    input_ids.device)
+            static_cache = past_key_values is not None
+            # the static cache has a fixed batch size
+            compact_rows = not static_cache
+            prefix_cache = kwargs.get("prefix_cache")
+            if prefix_cache is not None and (static_cache or len(inputs) > 1):
+                # padded prompts don't share their cache positions
+                prefix_cache = None
+            if prefix_cache is not None:
+                prompt_ids = input_ids[0].tolist()
+                prefix_length, past_key_values = prefix_cache.get(prompt_ids)
+                input_ids = input_ids[:, prefix_length:]
+            chunk_size = kwargs.get("prefill_chunk_size")
+            if chunk_size:
+                # the last chunk is prefilled by the first step
+                while input_ids.shape[1] > chunk_size:
+                    end = curr_length - input_ids.shape[1] + chunk_size
+                    if static_cache:
+                        model_kwargs["cache_position"] = torch.arange(
+                            end - chunk_size, end, device=input_ids.device)
+                    outputs = model.forward(
+                        input_ids=input_ids[:, :chunk_size],
+                        attention_mask=attention_mask[:, :end],
+                        past_key_values=past_key_values,
+                        use_cache=True,
+                        **model_kwargs)
+                    past_key_values = outputs.past_key_values
+                    input_ids = input_ids[:, chunk_size:]
+                    del outputs
 
         if generic_model_class == "Seq2SeqLM":
             attention_mask = tokenized_inputs["attention_mask"]
@@ -75,18 +354,36 @@ class StreamingUtils:
                 tokenizer.bos_token_id,
                 device=StreamingUtils._get_current_device()).repeat(
                     len(inputs)).view(-1, 1)
-            all_decoder_input_ids = decoder_input_ids
+            all_decoder_input_ids = decoder_input_ids.new_empty(
+                len(inputs), 1 + max_new_tokens)
+            all_decoder_input_ids[:, :1] = decoder_input_ids
+            history_length = 1
+            detokenizers = [
+                IncrementalDetokenizer([tokenizer.bos_token_id])
+                for _ in range(len(inputs))
+            ]
 
+        sampler = TokenSampler(tokenizer, detokenizers, **kwargs)
         while True:
-            if stop_generation:
-                return
-
             if generic_model_class == "CausalLM":
                 attention_mask_curr = attention_mask[:, :curr_length]
+                if static_cache:
+                    # the static cache is written in place at these positions
+                    model_kwargs["cache_position"] = torch.arange(
+                        curr_length - input_ids.shape[1],
+                        curr_length,
+                        device=input_ids.device)
                 outputs = model.forward(input_ids=input_ids,
                                         attention_mask=attention_mask_curr,
                                         past_key_values=past_key_values,
-                                        use_cache=True)
+                                        use_cache=True,
+                                        **model_kwargs)
+                if prefix_cache is not None:
+                    prefix_cache.put(
+                        prompt_ids,
+                        StreamingUtils._to_legacy_cache(
+                            outputs.past_key_values))
+                    prefix_cache = None
 
             if generic_model_class == "Seq2SeqLM":
                 outputs = model.forward(
@@ -98,41 +395,69 @@ class StreamingUtils:
                     past_key_values=past_key_values,
                     use_cache=True)
 
-            next_token_ids = []
-            ## TODO: batch decoding
-            for i, logits in enumerate(outputs.logits):
-                next_token_id = decoding_method(
-                    logits, all_decoder_input_ids[i, :].view(1, -1), **kwargs)
-                next_token_ids.append(next_token_id.view(1, 1))
-            token_ids = torch.cat(next_token_ids)
+            token_ids = sampler.sample(
+                outputs.logits[:, -1, :],
+                all_decoder_input_ids[:, :history_length]).view(-1, 1)
+            logprobs = sampler.token_logprobs(outputs.logits[:, -1, :],
+                                              token_ids)
 
-            all_decoder_input_ids = torch.cat(
-                [all_decoder_input_ids, token_ids], dim=1)
+            all_decoder_input_ids[:, history_length] = token_ids.view(-1)
+            history_length += 1
             past_key_values = outputs.past_key_values
-            new_tokens_count += 1
 
-            not_eos_token_ids = (token_ids != tokenizer.eos_token_id).view(
-                len(inputs), 1)
-            unfinished_sequences = unfinished_sequences.mul(not_eos_token_ids)
+            # rows that were finished before this step get no text
+            active = unfinished_sequences.view(-1).tolist()
+            new_token_ids = [
+                token_id if unfinished else None
+                for token_id, unfinished in zip(
+                    token_ids.view(-1).tolist(), active)
+            ]
+            texts, finished = sampler.emit(new_token_ids, logprobs)
+            token_text = [sampler.finished_output] * len(inputs)
+            for row, text in zip(rows, texts):
+                token_text[row] = text
+
+            if sampler.done:
+                yield token_text
+                return
+
+            unfinished_sequences = torch.tensor([[not f] for f in finished],
+                                                dtype=torch.long,
+                                                device=token_ids.device)
+
+            if generic_model_class == "Seq2SeqLM":
+                encoder_last_hidden_state = [outputs.encoder_last_hidden_state]
+            keep = [i for i, f in enumerate(finished) if not f]
+            if compact_rows and len(keep) < len(rows):
+                # drop the finished rows, later steps run on a smaller batch
+                index = torch.tensor(keep, device=token_ids.device)
+                rows = [rows[i] for i in keep]
+                sampler.select(keep)
+                token_ids = token_ids.index_select(0, index)
+                unfinished_sequences = unfinished_sequences.index_select(
+                    0, index)
+                all_decoder_input_ids = all_decoder_input_ids.index_select(
+                    0, index)
+                attention_mask = attention_mask.index_select(0, index)
+                past_key_values = StreamingUtils._select_rows(
+                    past_key_values, index)
+                if generic_model_class == "Seq2SeqLM":
+                    encoder_last_hidden_state = [
+                        encoder_last_hidden_state[0].index_select(0, index)
+                    ]
 
             if generic_model_class == "CausalLM":
-                input_ids = token_ids.view(len(inputs), 1)
+                input_ids = token_ids.view(len(rows), 1)
                 input_ids = input_ids * unfinished_sequences + tokenizer.pad_token_id * unfinished_sequences.logical_not(
                 )
-                token_text = tokenizer.batch_decode(input_ids)
                 attention_mask[:, curr_length] = 1
                 curr_length += 1
 
             if generic_model_class == "Seq2SeqLM":
                 input_ids = None
-                decoder_input_ids = token_ids.view(len(inputs), 1)
+                decoder_input_ids = token_ids.view(len(rows), 1)
                 decoder_input_ids = decoder_input_ids * unfinished_sequences + tokenizer.pad_token_id * unfinished_sequences.logical_not(
                 )
-                encoder_last_hidden_state = [outputs.encoder_last_hidden_state]
-                token_text = tokenizer.batch_decode(decoder_input_ids)
-
-            stop_generation = StreamingUtils._has_met_stopping_criteria(
-                unfinished_sequences, new_tokens_count, max_new_tokens)
 
             yield token_text
 
@@ -140,43 +465,64 @@ class StreamingUtils:
     @torch.inference_mode()
     def _transformers_neuronx_stream_generator(model, tokenizer, inputs,
                                                **kwargs):
-        sequence_length = kwargs.get("seq_length",
-                                     StreamingUtils.DEFAULT_MAX_NEW_TOKENS)
-        top_k = kwargs.get("top_k", 50)
+        """
+        Streams from a transformers-neuronx model, ``model(input_ids,
+        position_ids)`` returns the next token scores of each input.
+        ``seq_length`` is the compiled sequence length, it caps the prompt
+        and the new tokens. Without sampling parameters it samples from the
+        top 50 tokens, unless ``do_sample`` is False.
+        """
+        if not tokenizer.pad_token:
+            tokenizer.pad_token = tokenizer.eos_token
+        if kwargs.get("do_sample", True) and not any(
+                param in kwargs for param in StreamingUtils.SAMPLING_PARAMS):
+            kwargs["top_k"] = 50
         tokenized_inputs = tokenizer(inputs, return_tensors="pt", padding=True)
         input_ids = tokenized_inputs["input_ids"]
+        batch_size, start = input_ids.shape
+        seq_length = kwargs.get("seq_length")
+        if seq_length is None:
+            max_new_tokens = kwargs.get("max_new_tokens",
+                                        StreamingUtils.DEFAULT_MAX_NEW_TOKENS)
+        else:
+            max_new_tokens = min(kwargs.get("max_new_tokens", seq_length),
+                                 seq_length - start)
+        kwargs["max_new_tokens"] = max_new_tokens
+        if max_new_tokens <= 0:
+            return
+
+        prompt_lengths = tokenized_inputs["attention_mask"].sum(-1).tolist()
+        detokenizers = [
+            IncrementalDetokenizer(ids[len(ids) - length:])
+            for ids, length in zip(input_ids.tolist(), prompt_lengths)
+        ]
+        sampler = TokenSampler(tokenizer, detokenizers, **kwargs)
+        history = input_ids.new_empty(batch_size, start + max_new_tokens)
+        history[:, :start] = input_ids
+        position_ids = torch.arange(start + max_new_tokens, dtype=torch.int32)
+        unfinished = torch.ones(batch_size, dtype=torch.bool)
+
         model.reset()
-        eos_token_id = model.config.eos_token_id
         # populate key/value caches according to the prompt text
-        _, start = input_ids.shape
-        position_ids = torch.arange(start, dtype=torch.int32)
-        next_token_scores = model(input_ids, position_ids)
-
-        tokens = [input_ids]
-        for cur_len in range(start, sequence_length):
-            # don't sample EOS
-            next_token_scores[:, eos_token_id] = -float('inf')
-
-            # Remove all tokens with a probability less than the last token of the top-k
-            topk_values, topk_indices = torch.topk(next_token_scores, top_k)
-            probs = torch.nn.functional.softmax(topk_values, dim=-1)
-            inputs_in_topk = torch.multinomial(probs,
-                                               num_samples=1,
-                                               replacement=True)
-            inputs = torch.gather(topk_indices, 1, inputs_in_topk)
-            tokens.append(inputs)
-            token_text = tokenizer.batch_decode(inputs)
-            position_ids = torch.as_tensor([cur_len], dtype=torch.int32)
-            next_token_scores = model(inputs, position_ids)
-            yield token_text
-
-    @staticmethod
-    def _has_met_stopping_criteria(not_eos_token_ids, current_token_count,
-                                   max_new_tokens):
-        if not_eos_token_ids.sum(
-        ) == 0 or current_token_count >= max_new_tokens:
-            return True
-        return False
+        next_token_scores = model(input_ids, position_ids[:start])
+        for cur_len in range(start, start + max_new_tokens):
+            token_ids = sampler.sample(next_token_scores, history[:, :cur_len])
+            logprobs = sampler.token_logprobs(next_token_scores, token_ids)
+            # finished inputs are fed padding, the batch size is compiled in
+            token_ids = token_ids.masked_fill(unfinished.logical_not(),
+                                              tokenizer.pad_token_id)
+            history[:, cur_len] = token_ids
+            new_token_ids = [
+                token_id if active else None for token_id, active in zip(
+                    token_ids.tolist(), unfinished.tolist())
+            ]
+            texts, finished = sampler.emit(new_token_ids, logprobs)
+            yield texts
+            if sampler.done:
+                return
+            unfinished = torch.tensor([not f for f in finished])
+            next_token_scores = model(token_ids.view(-1, 1),
+                                      position_ids[cur_len:cur_len + 1])
 
     @staticmethod
     def _validate_inputs(model, inputs):
@@ -219,52 +565,138 @@ class StreamingUtils:
                 return "CausalLM"
 
     @staticmethod
-    def _greedy_decoding(logits, input_ids, **kwargs):
+    def _get_logits_processors(decoding_method, **kwargs):
         processors = LogitsProcessorList()
         if "repetition_penalty" in kwargs and kwargs[
                 "repetition_penalty"] != 1.0:
             processors.append(
                 RepetitionPenaltyLogitsProcessor(
                     penalty=kwargs["repetition_penalty"]))
-        logits[-1:, :] = processors(input_ids, logits[-1:, :])
-        return logits[-1].argmax()
+        if decoding_method != StreamingUtils._sampling_decoding:
+            return processors
 
-    @staticmethod
-    def _sampling_decoding(logits, input_ids, **kwargs):
-        processors = LogitsProcessorList()
-        if "repetition_penalty" in kwargs and kwargs[
-                "repetition_penalty"] != 1.0:
-            processors.append(
-                RepetitionPenaltyLogitsProcessor(
-                    penalty=kwargs["repetition_penalty"]))
         if "temperature" in kwargs and kwargs["temperature"] != 1.0:
             processors.append(
                 TemperatureLogitsWarper(float(kwargs["temperature"])))
-        if "top_p" in kwargs and kwargs["top_p"] < 1.0:
-            processors.append(TopPLogitsWarper(kwargs["top_p"]))
+        # top-k first, like generate(), the later warpers only see the top
+        # k tokens
         if "top_k" in kwargs and kwargs["top_k"] != 0:
             processors.append(TopKLogitsWarper(kwargs["top_k"]))
+        if "top_p" in kwargs and kwargs["top_p"] < 1.0:
+            processors.append(TopPLogitsWarper(kwargs["top_p"]))
         if "typical_p" in kwargs and kwargs["typical_p"] < 1.0:
             processors.append(TypicalLogitsWarper(mass=kwargs["typical_p"]))
+        return processors
+
+    @staticmethod
+    def _get_static_cache(model, batch_size, max_length, device):
+        """
+        Returns a KV cache preallocated for max_length tokens, or None if
+        the model only supports the dynamic cache.
+        """
+        if not getattr(model, "_supports_static_cache", False):
+            logging.warning(
+                f"{type(model).__name__} doesn't support static KV cache, "
+                "using dynamic KV cache instead.")
+            return None
+        from transformers import StaticCache
+        return StaticCache(config=model.config,
+                           max_batch_size=batch_size,
+                           max_cache_len=max_length,
+                           device=device,
+                           dtype=model.dtype)
+
+    @staticmethod
+    def _get_stop_criteria(tokenizer, batch_size, **kwargs):
+        stop_token_ids = {tokenizer.eos_token_id}
+        stop_token_ids.update(kwargs.get("stop_token_ids") or [])
+        stop_sequences = kwargs.get("stop_sequences")
+        if isinstance(stop_sequences, str):
+            stop_sequences = [stop_sequences]
+        stop_sequences = [s for s in stop_sequences or [] if s]
+        if not stop_sequences:
+            return stop_token_ids, None
+        return stop_token_ids, [
+            StopSequences(stop_sequences) for _ in range(batch_size)
+        ]
+
+    @staticmethod
+    def _select_rows(past_key_values, index):
+        past_key_values = StreamingUtils._to_legacy_cache(past_key_values)
+        return tuple(
+            tuple(t.index_select(0, index) for t in layer)
+            for layer in past_key_values)
+
+    @staticmethod
+    def _to_legacy_cache(past_key_values):
+        if hasattr(past_key_values, "to_legacy_cache"):
+            return past_key_values.to_legacy_cache()
+        return past_key_values
 
-        logits[-1:, :] = processors(input_ids, logits[-1:, :])
+    @staticmethod
+    def _get_generator(**kwargs):
+        if "manual_seed" not in kwargs:
+            return None
         generator = torch.Generator(StreamingUtils._get_current_device())
-        probs = torch.nn.functional.softmax(logits[-1])
-        if "manual_seed" in kwargs:
-            generator.manual_seed(kwargs["manual_seed"])
-            torch.multinomial(probs, num_samples=1, generator=generator)
+        generator.manual_seed(kwargs["manual_seed"])
+        return generator
+
+    @staticmethod
+    def _greedy_decoding(logits, input_ids, processors, generator=None):
+        """
+        Selects the next token of every sequence in the batch.
 
-        return torch.multinomial(probs, num_samples=1)
+        :param logits: [batch, vocab] logits of the last position
+        :param input_ids: [batch, seq] token ids generated so far
+        :param processors: LogitsProcessorList
+        :param generator: unused
+        :return: [batch] token ids
+        """
+        logits = processors(input_ids, logits)
+        return logits.argmax(dim=-1)
+
+    @staticmethod
+    def _sampling_decoding(logits, input_ids, processors, generator=None):
+        """
+        Samples the next token of every sequence in the batch.
+
+        :param logits: [batch, vocab] logits of the last position
+        :param input_ids: [batch, seq] token ids generated so far
+        :param processors: LogitsProcessorList
+        :param generator: optional torch.Generator for reproducible sampling
+        :return: [batch] token ids
+        """
+        indices = None
+        for processor in processors:
+            if indices is None and isinstance(processor, TopKLogitsWarper):
+                # the other tokens are never sampled, the next processors and
+                # the sampling only run on the top k tokens
+                logits, indices = logits.topk(min(processor.top_k,
+                                                  logits.shape[-1]),
+                                              dim=-1)
+            else:
+                logits = processor(input_ids, logits)
+        probs = torch.nn.functional.softmax(logits, dim=-1)
+        token_ids = torch.multinomial(probs,
+                                      num_samples=1,
+                                      generator=generator)
+        if indices is not None:
+            token_ids = indices.gather(-1, token_ids)
+        return token_ids.view(-1)
 
     @staticmethod
     def _get_decoding_method(**kwargs):
-        if "beam_size" in kwargs:
+        if int(kwargs.get("beam_size", 1)) > 1:
             logging.warning(
-                "beam search is not supported yet, using greedy search instead."
-            )
+                "beam search is only supported by the HuggingFace stream "
+                "generator, using greedy search instead.")
+            return StreamingUtils._greedy_decoding
+        elif "do_sample" in kwargs:
+            # an explicit do_sample wins over the sampling parameters
+            if kwargs["do_sample"]:
+                return StreamingUtils._sampling_decoding
             return StreamingUtils._greedy_decoding
-        elif any(param in kwargs
-                 for param in ["temperature", "top_p", "top_k", "typical_p"]):
+        elif any(param in kwargs for param in StreamingUtils.SAMPLING_PARAMS):
             return StreamingUtils._sampling_decoding
         else:
             return StreamingUtils._greedy_decoding
@@ -0,0 +1,76 @@
+import threading
+import time
+import unittest
+
+from djl_python import test_model, Output
+from djl_python.batching import DynamicBatcher, merge_inputs, split_outputs
+
+
+def _echo(inputs):
+    outputs = Output().add_property("content-type", "text/plain")
+    for i, item in enumerate(inputs.get_batches()):
+        outputs.add(item.get_as_bytes(), key="data", batch_index=i)
+    return outputs
+
+
+class TestBatching(unittest.TestCase):
+
+    def test_merge_split(self):
+        batch = [test_model.create_text_request(f"t-{i}") for i in range(3)]
+        merged = merge_inputs(batch)
+        self.assertEqual(3, merged.get_batch_size())
+        self.assertEqual("batch_1.data", merged.get_content().key_at(1))
+
+        result = split_outputs(_echo(merged), 3)
+        self.assertEqual(3, len(result))
+        for i, outputs in enumerate(result):
+            self.assertEqual("text/plain", outputs.properties["content-type"])
+            self.assertEqual(f"t-{i}",
+                             test_model.extract_output_as_string(outputs))
+
+        result = split_outputs(Output().add("t-0", batch_index=0), 3)
+        self.assertEqual(424, result[2].code)
+
+    def test_dynamic_batcher(self):
+        sizes = []
+        busy = threading.Event()
+        released = threading.Event()
+
+        def invoke(inputs):
+            sizes.append(inputs.get_batch_size())
+            if not busy.is_set():
+                busy.set()
+                released.wait(5)
+            return _echo(inputs)
+
+        results = {}
+        done = threading.Semaphore(0)
+        batcher = DynamicBatcher(invoke, 4, 1000)
+
+        def submit(i):
+            inputs = test_model.create_text_request(f"t-{i}")
+
+            def callback(outputs):
+                results[i] = test_model.extract_output_as_string(outputs)
+                done.release()
+
+            batcher.submit(inputs, callback)
+
+        # a request without others queued is not delayed
+        begin = time.monotonic()
+        submit(0)
+        self.assertTrue(busy.wait(5))
+        self.assertLess(time.monotonic() - begin, 0.5)
+
+        # requests queued while the model is busy form the next batch
+        for i in range(1, 5):
+            submit(i)
+        released.set()
+        for _ in range(5):
+            self.assertTrue(done.acquire(timeout=5))
+        self.assertEqual([1, 4], sizes)
+        self.assertEqual({i: f"t-{i}" for i in range(5)}, results)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import importlib.util
+import unittest
+
+HAS_TRANSFORMERS = importlib.util.find_spec(
+    "torch") is not None and importlib.util.find_spec(
+        "transformers") is not None
+
+
+@unittest.skipUnless(HAS_TRANSFORMERS, "requires torch and transformers")
+class TestBeamSearch(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        from djl_python.tests import tiny_models
+        cls.tokenizer = tiny_models.gpt2_tokenizer()
+        cls.model = tiny_models.gpt2_model(len(cls.tokenizer), seed=3)
+
+    @staticmethod
+    def _stream(model, tokenizer, inputs, **kwargs):
+        from djl_python.streaming_utils import StreamingUtils
+        generator = StreamingUtils.get_stream_generator("Accelerate")
+        return list(generator(model, tokenizer, inputs, **kwargs))
+
+    def test_causal_lm(self):
+        import torch
+        from djl_python.tests import tiny_models
+        tokenizer = self.tokenizer
+        eos = tokenizer.eos_token_id
+        for prompt in tiny_models.CORPUS:
+            tokens = tokenizer([prompt], return_tensors="pt")
+            with torch.no_grad():
+                logits = self.model(**tokens).logits[0, -1]
+            # frequent stop tokens end hypotheses at different lengths
+            for stop in logits.topk(4).indices.tolist()[1:]:
+                for length_penalty, early_stopping in ((1.0, False),
+                                                       (0.5, True), (-1.0,
+                                                                     False)):
+                    output_ids = self.model.generate(
+                        **tokens,
+                        num_beams=3,
+                        max_new_tokens=12,
+                        do_sample=False,
+                        length_penalty=length_penalty,
+                        early_stopping=early_stopping,
+                        pad_token_id=eos,
+                        eos_token_id=[eos, stop])
+                    ids = output_ids[0, tokens["input_ids"].shape[1]:].tolist()
+                    result = self._stream(self.model,
+                                          tokenizer, [prompt],
+                                          beam_size=3,
+                                          max_new_tokens=12,
+                                          length_penalty=length_penalty,
+                                          early_stopping=early_stopping,
+                                          stop_token_ids=[stop])
+                    text = "".join(r[0] for r in result)
+                    if len(ids) < 12:
+                        # generate ends all hypotheses with the first EOS id
+                        expected = {
+                            tokenizer.decode(ids[:-1] + [s])
+                            for s in (eos, stop)
+                        }
+                        self.assertIn(text, expected)
+                    else:
+                        self.assertEqual(tokenizer.decode(ids), text)
+                        self.assertEqual(12, len(result))
+
+    def test_token_ids(self):
+        inputs = ["Hello world", "Deep Java Library serves"]
+        kwargs = {"beam_size": 3, "max_new_tokens": 12}
+        texts = self._stream(self.model, self.tokenizer, inputs, **kwargs)
+        result = self._stream(self.model,
+                              self.tokenizer,
+                              inputs,
+                              output_token_ids=True,
+                              **kwargs)
+        for i in range(len(inputs)):
+            token_ids = [t for r in result if r[i] for t in r[i]["token_ids"]]
+            self.assertEqual("".join(r[i] for r in texts),
+                             self.tokenizer.decode(token_ids))
+
+    def test_seq2seq(self):
+        import torch
+        from djl_python.tests import tiny_models
+        tokenizer = tiny_models.t5_tokenizer()
+        model = tiny_models.t5_model(len(tokenizer))
+        inputs = ["Hello world", "Deep Java Library serves"]
+        tokens = tokenizer(inputs, return_tensors="pt", padding=True)
+        with torch.no_grad():
+            output_ids = model.generate(**tokens,
+                                        num_beams=4,
+                                        max_new_tokens=10,
+                                        do_sample=False)
+        result = self._stream(model,
+                              tokenizer,
+                              inputs,
+                              beam_size=4,
+                              max_new_tokens=10)
+        start = tokenizer.decode(output_ids[0, :1])
+        for i in range(len(inputs)):
+            ids = output_ids[i].tolist()
+            if tokenizer.eos_token_id in ids:
+                ids = ids[:ids.index(tokenizer.eos_token_id) + 1]
+            expected = tokenizer.decode(ids)[len(start):]
+            self.assertEqual(expected, "".join(r[i] for r in result))
+
+    def test_stop_sequences(self):
+        inputs = ["Hello world", "Deep Java Library serves"]
+        result = self._stream(self.model,
+                              self.tokenizer,
+                              inputs,
+                              beam_size=2,
+                              max_new_tokens=16)
+        texts = ["".join(r[i] for r in result) for i in range(2)]
+        # beams that agree are streamed before the last step
+        self.assertTrue(any(any(r) for r in result[:-1]))
+
+        stop = texts[0][3:6]
+        result = self._stream(self.model,
+                              self.tokenizer,
+                              inputs,
+                              beam_size=2,
+                              max_new_tokens=16,
+                              stop_sequences=[stop])
+        text = "".join(r[0] for r in result)
+        self.assertEqual(texts[0][:texts[0].index(stop) + len(stop)], text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,263 @@
+#!/usr/bin/env python
+#
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file
+# except in compliance with the License. A copy of the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "LICENSE.txt" file accompanying this file. This file is distributed on an "AS IS"
+# BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, express or implied. See the License for
+# the specific language governing permissions and limitations under the License.
+
+import argparse
+import asyncio
+import os
+import socket
+import struct
+import tempfile
+import threading
+import time
+import types
+import unittest
+from unittest import mock
+
+from djl_python import Output
+from djl_python.inputs import SocketReader
+from djl_python.service_loader import ModelService
+from djl_python_engine import PIPELINE_WORKERS_ENV, REQUEST_SEQ_ID, PythonEngine
+
+
+class _EngineClient(object):
+    """
+    Runs a PythonEngine with the given handlers on a unix socket and talks to
+    it like the DJL front end.
+    """
+
+    def __init__(self, workers: int, **handlers):
+        self.tmp = tempfile.TemporaryDirectory()
+        sock_name = os.path.join(self.tmp.name, "sock")
+        args = argparse.Namespace(sock_type="unix",
+                                  sock_name=sock_name,
+                                  port=None,
+                                  device_id="-1",
+                                  tensor_parallel_degree=None)
+        service = ModelService(types.SimpleNamespace(**handlers),
+                               self.tmp.name)
+        with mock.patch.dict(os.environ, {PIPELINE_WORKERS_ENV: str(workers)}):
+            self.engine = PythonEngine(args, service)
+        threading.Thread(target=self._serve, daemon=True).start()
+        deadline = time.monotonic() + 5
+        while not os.path.exists(sock_name) and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        self.conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # a request that never gets a reply fails the test instead of hanging
+        self.conn.settimeout(5)
+        self.conn.connect(sock_name)
+        self.reader = SocketReader(self.conn)
+
+    def _serve(self):
+        try:
+            self.engine.run_server()
+        except (OSError, ValueError):
+            # client disconnected
+            pass
+
+    def send(self,
+             handler: str,
+             payload: str = None,
+             seq_id: str = None,
+             **properties):
+        properties["handler"] = handler
+        if seq_id is not None:
+            properties[REQUEST_SEQ_ID] = seq_id
+        msg = bytearray(struct.pack('>h', len(properties)))
+        for key, value in properties.items():
+            Output.write_utf8(msg, key)
+            Output.write_utf8(msg, value)
+        if payload is None:
+            # initialization request
+            msg += struct.pack('>h', 0)
+        else:
+            msg += struct.pack('>h', 1)
+            Output.write_utf8(msg, "data")
+            msg += struct.pack('>i', len(payload)) + payload.encode("utf-8")
+        self.conn.sendall(msg)
+
+    def read(self):
+        """
+        Reads a response.
+
+        :return: code, properties and the list of values or stream frames
+        """
+        code = self.reader.read_short()
+        self.reader.read_utf8()
+        properties = {}
+        for _ in range(self.reader.read_short()):
+            key = self.reader.read_utf8()
+            properties[key] = self.reader.read_utf8()
+        size = self.reader.read_short()
+        data = []
+        if size < 0:
+            more = True
+            while more:
+                more = self.reader.read_buffer(1)[0] == 1
+                data.append(
+                    self.reader.read_buffer(self.reader.read_int()).decode())
+            return code, properties, data
+
+        for _ in range(size):
+            self.reader.read_utf8()
+            data.append(
+                self.reader.read_buffer(self.reader.read_int()).decode())
+        return code, properties, data
+
+    def close(self):
+        self.conn.close()
+        self.engine.sock.close()
+        self.tmp.cleanup()
+
+
+def _echo(inputs):
+    return Output().add(inputs.get_as_string())
+
+
+def _fail(inputs):
+    raise ValueError(f"failed {inputs.get_as_string()}")
+
+
+async def _echo_async(inputs):
+    await asyncio.sleep(0)
+    return _echo(inputs)
+
+
+async def _fail_async(inputs):
+    await asyncio.sleep(0)
+    _fail(inputs)
+
+
+async def _cancelled(inputs):
+    raise asyncio.CancelledError()
+
+
+def _stream_async(inputs):
+
+    async def tokens():
+        for token in inputs.get_as_string().split():
+            await asyncio.sleep(0)
+            yield token
+
+    outputs = Output()
+    outputs.add_stream_content(tokens(), output_formatter=None)
+    return outputs
+
+
+class TestEngine(unittest.TestCase):
+
+    def _start(self, workers: int, **handlers) -> _EngineClient:
+        client = _EngineClient(workers, **handlers)
+        self.addCleanup(client.close)
+        return client
+
+    def test_serial(self):
+        client = self._start(0, echo=_echo)
+        for i in range(3):
+            client.send("echo", f"t-{i}")
+            self.assertEqual((200, {}, [f"t-{i}"]), client.read())
+
+    def test_pipelined_reply_order(self):
+        released = threading.Event()
+
+        def wait(inputs):
+            released.wait(5)
+            return _echo(inputs)
+
+        client = self._start(2, wait=wait, echo=_echo)
+        client.send("wait", "t-0", seq_id="0")
+        client.send("echo", "t-1", seq_id="1")
+        # replies are sent in completion order
+        self.assertEqual((200, {REQUEST_SEQ_ID: "1"}, ["t-1"]), client.read())
+        released.set()
+        self.assertEqual((200, {REQUEST_SEQ_ID: "0"}, ["t-0"]), client.read())
+
+        # the seq_id property is only echoed if the request has one
+        client.send("echo", "t-2")
+        self.assertEqual((200, {}, ["t-2"]), client.read())
+
+    def test_pipelined_error_reply(self):
+        # a single slot is only reused if failed requests release it
+        client = self._start(1, fail=_fail, echo=_echo)
+        for i in range(3):
+            client.send("fail", f"t-{i}", seq_id=str(i))
+            code, properties, data = client.read()
+            self.assertEqual(424, code)
+            self.assertEqual(str(i), properties[REQUEST_SEQ_ID])
+            self.assertIn(f"failed t-{i}", data[0])
+
+        client.send("echo", "t-3", seq_id="3")
+        self.assertEqual((200, {REQUEST_SEQ_ID: "3"}, ["t-3"]), client.read())
+
+    def test_async_handlers(self):
+        handlers = dict(echo=_echo_async,
+                        fail=_fail_async,
+                        cancelled=_cancelled,
+                        stream=_stream_async)
+        service = ModelService(types.SimpleNamespace(**handlers), None)
+        self.assertTrue(service.is_async_handler("echo"))
+        self.assertFalse(service.is_async_handler("stream"))
+        self.assertFalse(service.is_async_handler("missing"))
+
+        for workers in (0, 2):
+            client = self._start(workers, **handlers)
+            client.send("echo", "t-0", seq_id="0")
+            code, _, data = client.read()
+            self.assertEqual((200, ["t-0"]), (code, data))
+
+            client.send("fail", "t-1", seq_id="1")
+            code, _, data = client.read()
+            self.assertEqual(424, code)
+            self.assertIn("failed t-1", data[0])
+
+            client.send("stream", "a b c", seq_id="2")
+            code, _, data = client.read()
+            self.assertEqual((200, ["a", "b", "c", ""]), (code, data))
+
+            if workers > 0:
+                # a cancelled handler still replies and releases its slot
+                for i in range(3):
+                    client.send("cancelled", "t-3", seq_id=str(i))
+                    code, properties, data = client.read()
+                    self.assertEqual(424, code)
+                    self.assertEqual(str(i), properties[REQUEST_SEQ_ID])
+                    self.assertIn("CancelledError", data[0])
+
+    def test_json_backend_option(self):
+        from djl_python import outputs
+        self.addCleanup(setattr, outputs, "_json_backend",
+                        outputs._json_backend)
+
+        def handle(inputs):
+            if inputs.is_empty():
+                return None
+            return Output().add_as_json([float("inf")])
+
+        client = self._start(0, handle=handle)
+        client.send("handle", json_backend="unknown")
+        code, _, data = client.read()
+        self.assertEqual(424, code)
+        self.assertIn("Unsupported JSON backend: unknown", data[0])
+
+        # the json backend rejects values that orjson encodes as null
+        client.send("handle", "")
+        self.assertEqual(424, client.read()[0])
+        if outputs.orjson is not None:
+            client.send("handle", json_backend="orjson")
+            self.assertEqual(204, client.read()[0])
+            client.send("handle", "")
+            self.assertEqual((200, {}, ["[null]"]), client.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,47 @@
+import copy
+import pickle
+import socket
+import struct
+import threading
+import time
 import unittest
 import numpy as np
-from djl_python import test_model, Input, Output
+from djl_python import np_util, test_model, Input, Output
+from djl_python.batching import merge_inputs
+from djl_python.inputs import SocketReader
+from djl_python.outputs import StreamFlushPolicy
+
+
+def _encode_request(properties: dict, content: list) -> bytes:
+    msg = bytearray()
+    msg += struct.pack('>h', len(properties))
+    for k, v in properties.items():
+        Output.write_utf8(msg, k)
+        Output.write_utf8(msg, v)
+    msg += struct.pack('>h', len(content))
+    for k, v in content:
+        Output.write_utf8(msg, k)
+        msg += struct.pack('>i', len(v))
+        msg += v
+    return bytes(msg)
+
+
+class _RecordingSocket(object):
+
+    def __init__(self):
+        self.sends = []
+
+    def sendall(self, data):
+        self.sends.append(bytes(data))
+
+
+def _encode_frames(frames: list, error=None) -> bytes:
+    msg = bytearray()
+    for frame in frames:
+        msg += struct.pack('>bi', 1, len(frame)) + frame
+    last = b"" if error is None else error.encode("utf-8")
+    msg += struct.pack('>bi', 0, len(last)) + last
+    return bytes(msg)
 
 
 class TestInputOutput(unittest.TestCase):
@@ -18,15 +59,142 @@ class TestInputOutput(unittest.TestCase):
         with self.assertRaises(KeyError):
             inputs.get_as_string("not-exist-key")
 
+    def test_get_property(self):
+        inputs = test_model.create_text_request("Hello")
+        inputs.properties["Accept"] = "application/json"
+        self.assertEqual("text/plain", inputs.get_property("Content-Type"))
+        self.assertEqual("application/json", inputs.get_property("accept"))
+        self.assertIn("Accept", inputs.get_properties())
+        inputs.properties["ACCEPT"] = "text/plain"
+        self.assertEqual("application/json", inputs.get_property("accept"))
+        for properties in (pickle.loads(pickle.dumps(inputs.properties)),
+                           copy.deepcopy(inputs.properties)):
+            self.assertEqual(inputs.properties, properties)
+            self.assertEqual(list(inputs.properties), list(properties))
+            self.assertEqual("application/json",
+                             properties.get_ignore_case("accept"))
+        del inputs.properties["Accept"]
+        self.assertEqual("text/plain", inputs.get_property("accept"))
+        inputs.properties.pop("ACCEPT")
+        self.assertIsNone(inputs.get_property("accept"))
+        inputs.properties = {"Content-Type": "application/json"}
+        self.assertEqual("application/json",
+                         inputs.get_property("content-type"))
+
     def test_numpy_input(self):
         nd = [np.ones((1, 3, 2))]
         inputs = test_model.create_numpy_request(nd)
         result = inputs.get_as_numpy()
         self.assertTrue(np.array_equal(result[0], nd[0]))
+        self.assertFalse(result[0].flags.writeable)
         inputs = test_model.create_npz_request(nd)
         result = inputs.get_as_npz()
         self.assertTrue(np.array_equal(result[0], nd[0]))
 
+    def test_npz_input(self):
+        import io
+        nd = [
+            np.arange(6, dtype=np.float32).reshape(2, 3),
+            np.asfortranarray(np.arange(12, dtype='>i4').reshape(3, 4)),
+            np.array(3.5),
+            np.zeros((0, 2), dtype=np.int8)
+        ]
+        inputs = test_model.create_npz_request(nd)
+        data = bytearray(inputs.get_as_bytes())
+        inputs.get_content().values[0] = data
+        result = inputs.get_as_npz()
+        for expected, actual in zip(nd, result):
+            self.assertEqual(expected.dtype, actual.dtype)
+            self.assertTrue(np.array_equal(expected, actual))
+            self.assertFalse(actual.flags.writeable)
+            self.assertFalse(actual.flags.owndata)
+        # uncompressed arrays are views onto the request buffer
+        offset = data.index(nd[0].tobytes())
+        data[offset:offset + 4] = np.float32(7).tobytes()
+        self.assertEqual(7, result[0][0, 0])
+
+        memory_file = io.BytesIO()
+        np.savez_compressed(memory_file, *nd)
+        result = np_util.from_nd_list(memory_file.getvalue())
+        for expected, actual in zip(nd, result):
+            self.assertTrue(np.array_equal(expected, actual))
+            self.assertFalse(actual.flags.writeable)
+
+    def test_decoded_cache(self):
+        inputs = test_model.create_text_request('{"inputs": "Hello"}',
+                                                key="input")
+        inputs.properties["content-type"] = "application/json"
+        result = inputs.get_data()
+        self.assertEqual({"inputs": "Hello"}, result)
+        self.assertIs(inputs.get_as_string(), inputs.get_as_string())
+        # handlers pop keys from the parsed json
+        result.pop("inputs")
+        self.assertEqual({"inputs": "Hello"}, inputs.get_as_json())
+        self.assertEqual({"inputs": "Hello"},
+                         inputs.get_batches()[0].get_data())
+
+        inputs.get_content().values[0] = b'{"inputs": "World"}'
+        self.assertEqual({"inputs": "World"}, inputs.get_as_json())
+        self.assertEqual('{"inputs": "World"}', inputs.get_as_string())
+        inputs.get_content().add("data", b'[1, 2]')
+        self.assertEqual([1, 2], inputs.get_as_json())
+        self.assertEqual({"inputs": "World"}, inputs.get_as_json("input"))
+
+        nd = [np.ones((2, 2))]
+        inputs.content = test_model.create_numpy_request(nd).get_content()
+        result = inputs.get_as_numpy()
+        self.assertIs(result[0], inputs.get_as_numpy()[0])
+        self.assertTrue(np.array_equal(nd[0], result[0]))
+        result.pop()
+        self.assertEqual(1, len(inputs.get_as_numpy()))
+
+    def test_big_endian_ndlist(self):
+        nd = np.arange(6, dtype=np.int32).reshape(2, 3)
+        encoded = bytearray(np_util.to_nd_list([nd]))
+        encoded[-nd.nbytes - 5] = ord('>')
+        encoded[-nd.nbytes:] = nd.astype('>i4').tobytes()
+        result = np_util.from_nd_list(encoded)
+        self.assertTrue(result[0].dtype.isnative)
+        self.assertTrue(np.array_equal(result[0], nd))
+
+    def test_ndlist_round_trip(self):
+        nd = [
+            np.array(3.5),
+            np.zeros((0, 3), dtype=np.float32),
+            np.arange(6, dtype='>i4').reshape(2, 3),
+            np.arange(12, dtype=np.float16).reshape(3, 4).T,
+            np.array([True, False]),
+        ]
+        result = np_util.from_nd_list(np_util.to_nd_list(nd))
+        for expected, actual in zip(nd, result):
+            self.assertEqual(expected.shape, actual.shape)
+            self.assertTrue(np.array_equal(expected, actual))
+
+    def test_batch_input(self):
+        nd = [np.full((3, 2), i, dtype=np.float32) for i in range(4)]
+        inputs = merge_inputs(
+            [test_model.create_numpy_request([x]) for x in nd])
+        batch = inputs.get_batches()
+        self.assertEqual(4, len(batch))
+        self.assertIs(batch, inputs.get_batches())
+        self.assertIs(inputs.get_content().value_at(2),
+                      batch[2].get_as_bytes())
+        result = inputs.get_batch_as_numpy()
+        self.assertEqual((4, 3, 2), result[0].shape)
+        self.assertTrue(np.array_equal(np.stack(nd), result[0]))
+
+        # replacing a value in place splits the batch again
+        replaced = np_util.to_nd_list([nd[0]])
+        inputs.get_content().values[2] = replaced
+        self.assertIs(replaced, inputs.get_batches()[2].get_as_bytes())
+        self.assertTrue(
+            np.array_equal(nd[0],
+                           inputs.get_batch_as_numpy()[0][2]))
+
+        inputs.get_content().add("unknown", b"")
+        with self.assertRaises(ValueError):
+            inputs.get_batches()
+
     def test_output(self):
         test_dict = {"Key": "Value"}
         nd = [np.ones((1, 3, 2))]
@@ -39,6 +207,78 @@ class TestInputOutput(unittest.TestCase):
         result = test_model.extract_output_as_npz(outputs, "npz")
         self.assertTrue(np.array_equal(result[0], nd[0]))
 
+    def test_json_backends(self):
+        import collections
+        import datetime
+        import json
+        from djl_python import outputs
+        from djl_python.outputs import set_json_backend
+        point = collections.namedtuple("Point", ["x", "y"])
+        val = {
+            "int": np.int64(3),
+            "float": np.float64(0.5),
+            "float32": np.float32(0.1),
+            "bool": np.bool_(True),
+            "array": np.arange(6, dtype=np.float32).reshape(2, 3) / 10,
+            "strided": np.arange(6).reshape(2, 3)[:, ::2],
+            "big_endian": np.arange(3, dtype='>i4'),
+            "time": datetime.datetime(2023, 1, 2, 3, 4, 5),
+            1: "é"
+        }
+        expected = {
+            "int": 3,
+            "float": 0.5,
+            "float32": float(np.float32(0.1)),
+            "bool": True,
+            "array":
+            (np.arange(6, dtype=np.float32).reshape(2, 3) / 10).tolist(),
+            "strided": [[0, 2], [3, 5]],
+            "big_endian": [0, 1, 2],
+            "time": "2023-01-02 03:04:05",
+            "1": "é"
+        }
+        self.assertIsInstance(outputs._json_backend,
+                              outputs._StdlibJSONBackend)
+        backends = ["json"]
+        if outputs.orjson is not None:
+            backends.append("orjson")
+        default_backend = outputs._json_backend
+        try:
+            for backend in backends:
+                set_json_backend(backend)
+                compact = json.dumps(expected,
+                                     ensure_ascii=False,
+                                     separators=(",", ":"))
+                self.assertEqual(compact.encode("utf-8"),
+                                 Output._encode_json(val))
+                # values orjson rejects are encoded by the json backend
+                self.assertEqual(
+                    b'{"point":[1,2],"big":18446744073709551616}',
+                    Output._encode_json({
+                        "point": point(1, 2),
+                        "big": 2**64
+                    }))
+                with self.assertRaises(TypeError):
+                    Output._encode_json({"set": {1}})
+                if backend == "json":
+                    with self.assertRaises(ValueError):
+                        Output._encode_json([float("nan")])
+                else:
+                    # documented difference of orjson
+                    self.assertEqual(b"[null]",
+                                     Output._encode_json([float("nan")]))
+
+            class UpperBackend(object):
+
+                def dumps(self, val):
+                    return json.dumps(val).upper().encode("utf-8")
+
+            set_json_backend(UpperBackend())
+            output = Output().add_as_json({"key": "value"})
+            self.assertEqual(b'{"KEY": "VALUE"}', output.content.value_at(0))
+        finally:
+            outputs._json_backend = default_backend
+
     def test_print_message(self):
         nd = [np.ones((1, 3, 2))]
         inputs = test_model.create_numpy_request(nd, "mydata")
@@ -49,6 +289,225 @@ mydata: [array([[[1., 1.],
         [1., 1.]]])]'''
         self.assertEqual(result, expected)
 
+    def test_read_input(self):
+        large = bytes(range(256)) * 1024
+        first = _encode_request({"content-type": "text/plain"},
+                                [("data", b"Hello"), (None, large)])
+        second = _encode_request({"handler": "handle"}, [("data", b"World")])
+        s1, s2 = socket.socketpair()
+        with s1, s2:
+            sender = threading.Thread(target=s1.sendall,
+                                      args=(first + second, ))
+            sender.start()
+            reader = SocketReader(s2, buffer_size=1024)
+            inputs = Input()
+            inputs.read(reader)
+            self.assertEqual("text/plain", inputs.get_property("Content-Type"))
+            self.assertEqual("Hello", inputs.get_as_string())
+            self.assertEqual(large, inputs.get_content().value_at(1))
+            inputs = Input()
+            inputs.read(reader)
+            self.assertEqual("handle", inputs.get_function_name())
+            self.assertEqual("World", inputs.get_as_string("data"))
+            sender.join()
+
+            s1.sendall(second)
+            inputs = Input()
+            inputs.read(s2)
+            self.assertEqual("World", inputs.get_as_string())
+
+    def test_send_output(self):
+        large = bytes(range(256)) * 1024
+        outputs = Output().add_property("content-type", "text/plain").add(
+            "Hello", key="data").add(large, key="large")
+        expected = bytearray(struct.pack('>h', 200))
+        Output.write_utf8(expected, "OK")
+        expected += _encode_request({"content-type": "text/plain"},
+                                    [("data", b"Hello"), ("large", large)])
+        s1, s2 = socket.socketpair()
+        with s1, s2:
+            sender = threading.Thread(target=outputs.send, args=(s1, ))
+            sender.start()
+            received = SocketReader(s2).read_buffer(len(expected))
+            sender.join()
+        self.assertEqual(expected, received)
+
+        # partial writes resume in the middle of a buffer
+        sock = _RecordingSocket()
+
+        def sendmsg(buffers):
+            sock.sendall(b"".join(buffers)[:7])
+            return len(sock.sends[-1])
+
+        sock.sendmsg = sendmsg
+        outputs.send(sock)
+        self.assertEqual(expected, b"".join(sock.sends))
+
+    def test_send_stream_output(self):
+
+        def tokens(count, error=None):
+            for i in range(count):
+                yield [f"token{i}"]
+            if error:
+                raise ValueError(error)
+
+        frames = [b'{"outputs": ["token%d"]}\n' % i for i in range(7)]
+        policies = [
+            None,
+            StreamFlushPolicy(max_items=3),
+            StreamFlushPolicy(max_items=3, background=True),
+            StreamFlushPolicy(max_items=64, max_latency_ms=50,
+                              background=True),
+        ]
+        for policy in policies:
+            for error in (None, "failed"):
+                outputs = Output()
+                outputs.add_stream_content(tokens(7, error))
+                cl_socket = _RecordingSocket()
+                outputs.send(cl_socket, policy)
+                # response header, then the frames
+                self.assertEqual(_encode_frames(frames, error),
+                                 b"".join(cl_socket.sends[1:]))
+                if policy is None:
+                    self.assertEqual(9, len(cl_socket.sends))
+                elif not policy.background:
+                    self.assertEqual(4, len(cl_socket.sends))
+
+        outputs = Output()
+        outputs.add_stream_content(tokens(7))
+        cl_socket = _RecordingSocket()
+        outputs.send(cl_socket, StreamFlushPolicy(max_bytes=50, max_items=64))
+        self.assertEqual(_encode_frames(frames), b"".join(cl_socket.sends[1:]))
+        self.assertEqual([58, 58, 58, 34],
+                         [len(data) for data in cl_socket.sends[1:]])
+
+        # due frames are sent while the stream content is still computing
+        cl_socket = _RecordingSocket()
+        flushed = []
+
+        def slow_tokens():
+            yield ["token0"]
+            deadline = time.monotonic() + 5
+            while len(cl_socket.sends) < 2 and time.monotonic() < deadline:
+                time.sleep(0.005)
+            flushed.append(len(cl_socket.sends) == 2)
+            yield ["token1"]
+
+        outputs = Output()
+        outputs.add_stream_content(slow_tokens())
+        outputs.send(cl_socket,
+                     StreamFlushPolicy(max_items=64, max_latency_ms=20))
+        self.assertEqual([True], flushed)
+        self.assertEqual(_encode_frames(frames[:2]),
+                         b"".join(cl_socket.sends[1:]))
+
+    def test_send_stream_output_background(self):
+        produced = []
+
+        def tokens():
+            for i in range(100):
+                produced.append(i)
+                yield [f"token{i}"]
+
+        class _BlockingSocket(_RecordingSocket):
+
+            def __init__(self, fail=False):
+                super().__init__()
+                self.fail = fail
+                self.released = threading.Event()
+
+            def sendall(self, data):
+                if self.sends:
+                    self.released.wait(5)
+                    if self.fail:
+                        raise OSError("Broken pipe")
+                super().sendall(data)
+
+        # the drain thread runs a bounded number of frames ahead of the socket
+        policy = StreamFlushPolicy(max_items=2, background=True)
+        outputs = Output()
+        outputs.add_stream_content(tokens())
+        cl_socket = _BlockingSocket()
+        self.addCleanup(cl_socket.released.set)
+        sender = threading.Thread(target=outputs.send,
+                                  args=(cl_socket, policy),
+                                  daemon=True)
+        sender.start()
+        time.sleep(0.2)
+        # 4 queued, 2 in the blocked flush, one waiting to be queued
+        self.assertLessEqual(len(produced), 7)
+        cl_socket.released.set()
+        sender.join(5)
+        frames = [b'{"outputs": ["token%d"]}\n' % i for i in range(100)]
+        self.assertEqual(_encode_frames(frames), b"".join(cl_socket.sends[1:]))
+
+        # the drain thread stops when the socket fails
+        outputs = Output()
+        outputs.add_stream_content(tokens())
+        cl_socket = _BlockingSocket(fail=True)
+        cl_socket.released.set()
+        with self.assertRaises(OSError):
+            outputs.send(cl_socket, policy)
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline and any(
+                t.name == "djl-stream-drain" for t in threading.enumerate()):
+            time.sleep(0.01)
+        self.assertFalse(
+            any(t.name == "djl-stream-drain" for t in threading.enumerate()))
+
+    def test_send_batched_stream_output(self):
+
+        def tokens():
+            yield ["a", "b", ""]
+            yield ["c", None, "d"]
+            yield [None, None, "e"]
+
+        outputs = Output()
+        outputs.add_stream_content(tokens(), batched=True)
+        self.assertEqual("true", outputs.properties["batch_stream"])
+        cl_socket = _RecordingSocket()
+        outputs.send(cl_socket)
+        frames = [
+            struct.pack('>h', i) +
+            (b'{"outputs": ["%s"]}\n' % text if text else b"")
+            for i, text in [(0, b"a"), (1, b"b"), (0, b"c"), (
+                1, None), (2, b"d"), (0, None), (2, b"e"), (2, None)]
+        ]
+        self.assertEqual(_encode_frames(frames), b"".join(cl_socket.sends[1:]))
+
+    def test_stream_formats(self):
+        from djl_python.outputs import get_stream_content_type
+        self.assertIsNone(get_stream_content_type(None))
+        self.assertIsNone(get_stream_content_type("application/json"))
+        self.assertEqual(
+            "tensor/token-ids",
+            get_stream_content_type(
+                "application/json;q=0.5, Tensor/Token-Ids, text/event-stream"))
+
+        outputs = Output()
+        outputs.add_stream_content(iter([["a", "b"]]),
+                                   accept="text/event-stream")
+        self.assertEqual("text/event-stream",
+                         outputs.properties["Content-Type"])
+        cl_socket = _RecordingSocket()
+        outputs.send(cl_socket)
+        self.assertEqual(
+            _encode_frames([b'data: {"outputs": ["a", "b"]}\n\n']),
+            b"".join(cl_socket.sends[1:]))
+
+        first = {"token_ids": [1, 2], "logprobs": [-0.5, -1.0]}
+        second = {"token_ids": [3]}
+        outputs = Output()
+        outputs.add_stream_content(iter([[first, None], [second]]),
+                                   accept="tensor/token-ids")
+        cl_socket = _RecordingSocket()
+        outputs.send(cl_socket)
+        frames = [
+            struct.pack("<BHi2i2fi", 1, 2, 2, 1, 2, -0.5, -1.0, -1),
+            struct.pack("<BHii", 0, 1, 1, 3)
+        ]
+        self.assertEqual(_encode_frames(frames), b"".join(cl_socket.sends[1:]))
+
     def test_finalize(self):
 
         def finalize_func(a, b, c):
@@ -0,0 +1,66 @@
+import unittest
+
+from djl_python import PairList
+
+
+class TestPairList(unittest.TestCase):
+
+    def test_constructors(self):
+        pairs = PairList(pair_list=[("a", 1), ("b", 2)])
+        self.assertEqual(["a", "b"], pairs.get_keys())
+        self.assertEqual(2, pairs.get("b"))
+        pairs = PairList(pair_map={"a": 1, "b": 2})
+        self.assertEqual([1, 2], pairs.get_values())
+        keys = ["a"]
+        pairs = PairList(keys=keys, values=[1])
+        self.assertEqual(1, pairs.get("a"))
+        self.assertIs(keys, pairs.get_keys())
+        with self.assertRaises(ValueError):
+            PairList(keys=["a"], values=[1, 2])
+        self.assertTrue(PairList().is_empty())
+
+    def test_get(self):
+        for size in (0, 20):
+            pairs = PairList(pair_list=[(f"k{i}", i) for i in range(size)])
+            self._check_get(pairs)
+            self.assertEqual(size + 6, pairs.size())
+
+    def _check_get(self, pairs):
+        pairs.add("a", 1)
+        pairs.add("b", 2)
+        self.assertEqual(2, pairs.get("b"))
+        self.assertIsNone(pairs.get("c"))
+        # duplicated keys resolve to the first occurrence
+        pairs.add("a", 3)
+        pairs.add(pair=("c", 4))
+        self.assertEqual(1, pairs.get("a"))
+        self.assertEqual(4, pairs.get("c"))
+        pairs.add("a", 0, index=0)
+        self.assertEqual(0, pairs.get("a"))
+        self.assertEqual(2, pairs.get("b"))
+        pairs.add_all(PairList(pair_list=[("d", 5)]))
+        self.assertEqual(5, pairs.get("d"))
+
+    def test_replace_key(self):
+        for size in (0, 20):
+            pairs = PairList(pair_list=[(f"k{i}", i) for i in range(size)])
+            pairs.add("a", 1)
+            pairs.add("b", 2)
+            self.assertEqual(1, pairs.get("a"))
+            pairs.keys[size] = "c"
+            self.assertIsNone(pairs.get("a"))
+            self.assertEqual(1, pairs.get("c"))
+            pairs.keys[size:] = ["b", "a"]
+            self.assertEqual(1, pairs.get("b"))
+            self.assertEqual(2, pairs.get("a"))
+            pairs.keys = [f"k{i}" for i in range(size + 2)]
+            self.assertIsNone(pairs.get("a"))
+            self.assertEqual(2, pairs.get(f"k{size + 1}"))
+            pairs.keys.pop()
+            pairs.values.pop()
+            pairs.add("d", 3)
+            self.assertEqual(3, pairs.get("d"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import importlib.util
+import unittest
+
+HAS_TRANSFORMERS = importlib.util.find_spec(
+    "torch") is not None and importlib.util.find_spec(
+        "transformers") is not None
+
+
+@unittest.skipUnless(HAS_TRANSFORMERS, "requires torch and transformers")
+class TestPrefixCache(unittest.TestCase):
+
+    @staticmethod
+    def _kv(length, layers=2):
+        import torch
+        # positions are encoded in the values to check the returned slices
+        t = torch.arange(length, dtype=torch.float32).view(1, 1, length, 1)
+        return tuple((t, t + 1000) for _ in range(layers))
+
+    def test_get_put(self):
+        from djl_python.prefix_cache import PrefixCache
+        cache = PrefixCache(max_bytes=1 << 20, block_size=4)
+        prompt = list(range(10))
+        self.assertEqual((0, None), cache.get(prompt))
+        cache.put(prompt, self._kv(10))
+        self.assertEqual(1, cache.misses)
+        # two full blocks are cached
+        self.assertEqual(2, len(cache.blocks))
+        self.assertEqual(2 * 2 * 2 * 4 * 4, cache.nbytes)
+
+        length, kv = cache.get(prompt[:8] + [42, 43])
+        self.assertEqual(8, length)
+        self.assertEqual(list(range(8)), kv[1][0].view(-1).tolist())
+        self.assertEqual(1007.0, kv[1][1].view(-1)[-1].item())
+        # the last token of the prompt is never cached
+        self.assertEqual(4, cache.get(prompt[:8])[0])
+        # the second block only matches after the first one
+        self.assertEqual(0, cache.get([9] + prompt[1:])[0])
+        self.assertEqual(2, cache.hits)
+        self.assertEqual(2, cache.misses)
+
+    def test_eviction(self):
+        from djl_python.prefix_cache import PrefixCache
+        block_bytes = 2 * 2 * 4 * 4
+        cache = PrefixCache(max_bytes=3 * block_bytes, block_size=4)
+        system = [1, 2, 3, 4]
+        cache.put(system + [5, 6, 7, 8], self._kv(8))
+        cache.put(system + [9, 10, 11, 12], self._kv(8))
+        self.assertEqual(3, len(cache.blocks))
+        cache.put(system + [13, 14, 15, 16], self._kv(8))
+        # the least recently used block is evicted, the shared one is kept
+        self.assertEqual(1, cache.evictions)
+        self.assertEqual(3 * block_bytes, cache.nbytes)
+        self.assertEqual(0, cache.get([5, 6, 7, 8, 0])[0])
+        self.assertEqual(4, cache.get(system + [5, 6, 7, 8, 0])[0])
+        self.assertEqual(8, cache.get(system + [13, 14, 15, 16, 0])[0])
+
+    def test_generation(self):
+        from djl_python.prefix_cache import PrefixCache
+        from djl_python.rolling_batch import RollingBatch
+        from djl_python.streaming_utils import StreamingUtils
+        from djl_python.tests import tiny_models
+        tokenizer = tiny_models.gpt2_tokenizer()
+        system = " ".join(tiny_models.CORPUS) + " "
+        prompts = [system + "Hello world", system + "the quick brown"]
+        for model in (tiny_models.gpt2_model(len(tokenizer)),
+                      tiny_models.llama_model(len(tokenizer))):
+            generator = StreamingUtils.get_stream_generator("Accelerate")
+            kwargs = {"max_new_tokens": 6, "repetition_penalty": 1.3}
+            expected = [
+                list(generator(model, tokenizer, [p], **kwargs))
+                for p in prompts
+            ]
+            cache = PrefixCache(max_bytes=1 << 20)
+            for _ in range(2):
+                result = [
+                    list(
+                        generator(model,
+                                  tokenizer, [p],
+                                  prefix_cache=cache,
+                                  **kwargs)) for p in prompts
+                ]
+                self.assertEqual(expected, result)
+            self.assertEqual(3, cache.hits)
+
+            cache = PrefixCache(max_bytes=1 << 20)
+            rolling_batch = RollingBatch(model, tokenizer, prefix_cache=cache)
+            for _ in range(2):
+                requests = [rolling_batch.submit(p, **kwargs) for p in prompts]
+                result = [[[text] for text in r.stream()] for r in requests]
+                self.assertEqual(expected, result)
+            self.assertEqual(3, cache.hits)
+
+
+if __name__ == '__main__':
+    unittest.main()
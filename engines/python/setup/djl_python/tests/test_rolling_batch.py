@@ -0,0 +1,189 @@
+import importlib.util
+import threading
+import time
+import unittest
+
+HAS_TRANSFORMERS = importlib.util.find_spec(
+    "torch") is not None and importlib.util.find_spec(
+        "transformers") is not None
+
+
+@unittest.skipUnless(HAS_TRANSFORMERS, "requires torch and transformers")
+class TestRollingBatch(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        from djl_python.tests import tiny_models
+        cls.tokenizer = tiny_models.gpt2_tokenizer()
+        cls.model = tiny_models.gpt2_model(len(cls.tokenizer))
+
+    def _generate(self, prompt, max_new_tokens, **kwargs):
+        import torch
+        tokens = self.tokenizer(prompt, return_tensors="pt")
+        with torch.no_grad():
+            output_ids = self.model.generate(
+                **tokens,
+                max_new_tokens=max_new_tokens,
+                do_sample=False,
+                pad_token_id=self.tokenizer.eos_token_id,
+                **kwargs)
+        return output_ids[0, tokens["input_ids"].shape[1]:].tolist()
+
+    def test_join_and_evict(self):
+        from djl_python.rolling_batch import RollingBatch
+        rolling_batch = RollingBatch(self.model,
+                                     self.tokenizer,
+                                     max_batch_size=3)
+        prompts = [
+            "Hello world", "Deep Java Library serves deep learning",
+            "the quick", "emojis 🙂 and", "Hello"
+        ]
+        requests = []
+        texts = []
+        for i, prompt in enumerate(prompts):
+            request = rolling_batch.submit(prompt,
+                                           max_new_tokens=4 + 3 * i,
+                                           repetition_penalty=1.5)
+            requests.append(request)
+            # join the running batch while earlier requests are generating
+            next(request.stream())
+        for request in requests:
+            texts.append(list(request.stream()))
+
+        for prompt, request, text in zip(prompts, requests, texts):
+            generated = request.token_ids[len(request.prompt_ids):]
+            self.assertTrue(request.finished)
+            self.assertEqual(request.max_new_tokens, len(generated))
+            self.assertEqual(len(generated) - 1, len(text))
+            self.assertEqual(
+                self._generate(prompt,
+                               request.max_new_tokens,
+                               repetition_penalty=1.5), generated)
+        # finished requests are evicted right after their last token
+        for _ in range(100):
+            if not rolling_batch.requests:
+                break
+            time.sleep(0.01)
+        self.assertEqual([], rolling_batch.requests)
+
+    def test_stream_requests(self):
+        from djl_python.rolling_batch import RollingBatch, stream_requests
+        rolling_batch = RollingBatch(self.model, self.tokenizer)
+        requests = [
+            rolling_batch.submit("Hello world", max_new_tokens=2),
+            rolling_batch.submit("the quick",
+                                 max_new_tokens=3,
+                                 top_k=5,
+                                 manual_seed=1)
+        ]
+        result = list(stream_requests(requests))
+        self.assertEqual(3, len(result))
+        self.assertEqual("", result[2][0])
+        self.assertNotEqual("", result[2][1])
+
+        requests = [
+            rolling_batch.submit("Hello world", max_new_tokens=2),
+            rolling_batch.submit("the quick", max_new_tokens=3)
+        ]
+        result = list(stream_requests(requests, batched=True))
+        self.assertEqual(3, len(result))
+        self.assertIsNone(result[2][0])
+
+        request = rolling_batch.submit("Hello world",
+                                       max_new_tokens=4,
+                                       output_token_ids=True)
+        token_ids = [t for r in request.stream() for t in r["token_ids"]]
+        self.assertEqual(request.token_ids[len(request.prompt_ids):],
+                         token_ids)
+
+        results = []
+
+        def run():
+            request = rolling_batch.submit("Hello", max_new_tokens=5)
+            results.append(list(stream_requests([request])))
+
+        threads = [threading.Thread(target=run) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(4, len(results))
+        for result in results:
+            self.assertEqual(5, len(result))
+
+    def test_stop_criteria(self):
+        from djl_python.rolling_batch import RollingBatch
+        rolling_batch = RollingBatch(self.model, self.tokenizer)
+        kwargs = {"max_new_tokens": 10, "repetition_penalty": 1.5}
+        expected = rolling_batch.submit("Hello world", **kwargs)
+        texts = list(expected.stream())
+        generated = expected.token_ids[len(expected.prompt_ids):]
+
+        request = rolling_batch.submit("Hello world",
+                                       stop_token_ids=[generated[2]],
+                                       **kwargs)
+        self.assertEqual(texts[:generated.index(generated[2]) + 1],
+                         list(request.stream()))
+
+        text = "".join(texts)
+        stop = text[2:6]
+        request = rolling_batch.submit("Hello world",
+                                       stop_sequences=stop,
+                                       **kwargs)
+        self.assertEqual(text[:text.index(stop) + len(stop)],
+                         "".join(request.stream()))
+
+    def test_chunked_prefill(self):
+        from unittest import mock
+        from djl_python.rolling_batch import RollingBatch
+        rolling_batch = RollingBatch(self.model,
+                                     self.tokenizer,
+                                     prefill_chunk_size=4)
+        long_prompt = "Deep Java Library serves deep learning models with"
+        shapes = []
+        forward = self.model.forward
+
+        def record(**kwargs):
+            shapes.append(tuple(kwargs["input_ids"].shape))
+            return forward(**kwargs)
+
+        with mock.patch.object(self.model, "forward", side_effect=record):
+            first = rolling_batch.submit("Hello world", max_new_tokens=20)
+            next(first.stream())
+            second = rolling_batch.submit(long_prompt, max_new_tokens=6)
+            list(second.stream())
+            list(first.stream())
+
+        generated = second.token_ids[len(second.prompt_ids):]
+        self.assertEqual(self._generate(long_prompt, 6), generated)
+        generated = first.token_ids[len(first.prompt_ids):]
+        self.assertEqual(self._generate("Hello world", 20), generated)
+        # decode steps of the running request run between the chunks
+        chunks = [i for i, shape in enumerate(shapes) if shape[1] > 1]
+        prompt_length = len(second.prompt_ids)
+        self.assertEqual((prompt_length + 3) // 4, len(chunks) - 1)
+        for i, j in zip(chunks[1:], chunks[2:]):
+            self.assertIn((1, 1), shapes[i + 1:j])
+
+    def test_scheduler_failure(self):
+        from unittest import mock
+        from djl_python.rolling_batch import RollingBatch
+        rolling_batch = RollingBatch(self.model, self.tokenizer)
+        expected = self._generate("Hello world", 3)
+        for error in (RuntimeError("prefill"), SystemExit()):
+            with mock.patch.object(rolling_batch,
+                                   "_prefill_step",
+                                   side_effect=error):
+                request = rolling_batch.submit("Hello world", max_new_tokens=3)
+                with self.assertRaises(RuntimeError):
+                    list(request.stream())
+            # the scheduler keeps running or is restarted by the next request
+            request = rolling_batch.submit("Hello world", max_new_tokens=3)
+            list(request.stream())
+            self.assertEqual(expected,
+                             request.token_ids[len(request.prompt_ids):])
+            self.assertEqual([], list(rolling_batch.prefills))
+
+
+if __name__ == '__main__':
+    unittest.main()
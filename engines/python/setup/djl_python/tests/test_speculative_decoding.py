@@ -0,0 +1,133 @@
+import importlib.util
+import unittest
+
+HAS_TRANSFORMERS = importlib.util.find_spec(
+    "torch") is not None and importlib.util.find_spec(
+        "transformers") is not None
+
+
+@unittest.skipUnless(HAS_TRANSFORMERS, "requires torch and transformers")
+class TestSpeculativeDecoding(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        from djl_python.tests import tiny_models
+        cls.tokenizer = tiny_models.gpt2_tokenizer()
+        cls.model = tiny_models.gpt2_model(len(cls.tokenizer), n_layer=4)
+        cls.draft_model = tiny_models.gpt2_model(len(cls.tokenizer),
+                                                 n_layer=1,
+                                                 seed=1)
+
+    def _stream(self, inputs, **kwargs):
+        from djl_python.streaming_utils import StreamingUtils
+        generator = StreamingUtils.get_stream_generator("Accelerate")
+        texts = [""] * len(inputs)
+        for token_text in generator(self.model, self.tokenizer, inputs,
+                                    **kwargs):
+            texts = [t + s for t, s in zip(texts, token_text)]
+        return texts
+
+    def test_greedy(self):
+        from djl_python.speculative_decoding import SpeculativeDecoder
+        inputs = ["Hello world", "Deep Java Library serves models"]
+        expected = self._stream(inputs, max_new_tokens=20)
+        for k in (1, 4):
+            decoder = SpeculativeDecoder(self.draft_model,
+                                         num_speculative_tokens=k)
+            actual = self._stream(inputs,
+                                  max_new_tokens=20,
+                                  speculative_decoder=decoder)
+            self.assertEqual(expected, actual)
+            self.assertGreater(decoder.proposed_tokens, 0)
+
+    def test_token_ids(self):
+        from djl_python.speculative_decoding import SpeculativeDecoder
+        from djl_python.streaming_utils import StreamingUtils
+        generator = StreamingUtils.get_stream_generator("Accelerate")
+        inputs = ["Hello world", "Deep Java Library serves models"]
+        kwargs = {
+            "max_new_tokens": 12,
+            "output_token_ids": True,
+            "output_logprobs": True
+        }
+        expected = [
+            self._join(row) for row in zip(
+                *generator(self.model, self.tokenizer, inputs, **kwargs))
+        ]
+        decoder = SpeculativeDecoder(self.draft_model)
+        actual = [
+            self._join(row)
+            for row in zip(*generator(self.model,
+                                      self.tokenizer,
+                                      inputs,
+                                      speculative_decoder=decoder,
+                                      **kwargs))
+        ]
+        self.assertEqual([e["token_ids"] for e in expected],
+                         [a["token_ids"] for a in actual])
+        for e, a in zip(expected, actual):
+            for x, y in zip(e["logprobs"], a["logprobs"]):
+                self.assertAlmostEqual(x, y, places=4)
+
+    @staticmethod
+    def _join(outputs):
+        from djl_python.streaming_utils import TokenSampler
+        joined = None
+        for output in outputs:
+            joined = TokenSampler.join(joined, output)
+        return joined
+
+    def test_same_draft_model(self):
+        from djl_python.speculative_decoding import SpeculativeDecoder
+        decoder = SpeculativeDecoder(self.model, num_speculative_tokens=3)
+        inputs = ["Hello world"]
+        expected = self._stream(inputs, max_new_tokens=13)
+        actual = self._stream(inputs,
+                              max_new_tokens=13,
+                              speculative_decoder=decoder)
+        self.assertEqual(expected, actual)
+        self.assertEqual(1.0, decoder.acceptance_rate)
+
+        decoder = SpeculativeDecoder(self.model, num_speculative_tokens=3)
+        self._stream(inputs,
+                     max_new_tokens=13,
+                     do_sample=True,
+                     top_k=5,
+                     manual_seed=1,
+                     speculative_decoder=decoder)
+        self.assertEqual(1.0, decoder.acceptance_rate)
+
+    def test_sampling(self):
+        from djl_python.speculative_decoding import SpeculativeDecoder
+        decoder = SpeculativeDecoder(self.draft_model)
+        inputs = ["Hello world", "Deep Java Library serves models"]
+        kwargs = {
+            "max_new_tokens": 16,
+            "do_sample": True,
+            "manual_seed": 3,
+            "speculative_decoder": decoder
+        }
+        first = self._stream(inputs, **kwargs)
+        second = self._stream(inputs, **kwargs)
+        self.assertEqual(first, second)
+        self.assertTrue(all(first))
+
+    def test_rejection_sampling(self):
+        import torch
+        from djl_python.speculative_decoding import SpeculativeDecoder
+        rows = 20000
+        p = torch.tensor([0.5, 0.3, 0.2, 0.0])
+        q = torch.tensor([0.1, 0.1, 0.2, 0.6])
+        generator = torch.Generator().manual_seed(0)
+        draft_ids = torch.multinomial(q.expand(rows, -1),
+                                      num_samples=1,
+                                      generator=generator)
+        scores = [p.log().expand(rows, -1), p.log().expand(rows, -1)]
+        _, next_ids = SpeculativeDecoder._verify_sampling(
+            scores, [q.expand(rows, -1)], draft_ids, generator)
+        counts = torch.bincount(next_ids[:, 0], minlength=4) / rows
+        self.assertTrue(torch.allclose(counts, p, atol=0.02))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,367 @@
+import importlib.util
+import unittest
+from unittest import mock
+
+HAS_TRANSFORMERS = importlib.util.find_spec(
+    "torch") is not None and importlib.util.find_spec(
+        "transformers") is not None
+
+
+@unittest.skipUnless(HAS_TRANSFORMERS, "requires torch and transformers")
+class TestStreamingUtils(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        from djl_python.tests import tiny_models
+        cls.tokenizer = tiny_models.gpt2_tokenizer()
+        cls.model = tiny_models.gpt2_model(len(cls.tokenizer))
+
+    def _stream(self, inputs, **kwargs):
+        from djl_python.streaming_utils import StreamingUtils
+        generator = StreamingUtils.get_stream_generator("Accelerate")
+        return list(generator(self.model, self.tokenizer, inputs, **kwargs))
+
+    def test_batched_decoding(self):
+        import torch
+        from djl_python.streaming_utils import StreamingUtils
+        logits = torch.randn(4, 16)
+        input_ids = torch.randint(0, 16, (4, 3))
+        kwargs = {"repetition_penalty": 1.5}
+        processors = StreamingUtils._get_logits_processors(
+            StreamingUtils._greedy_decoding, **kwargs)
+        tokens = StreamingUtils._greedy_decoding(logits.clone(), input_ids,
+                                                 processors)
+        for i in range(4):
+            expected = StreamingUtils._greedy_decoding(logits[i:i + 1].clone(),
+                                                       input_ids[i:i + 1],
+                                                       processors)
+            self.assertEqual(expected.item(), tokens[i].item())
+
+        kwargs = {"top_k": 3, "temperature": 0.7, "manual_seed": 1}
+        method = StreamingUtils._get_decoding_method(**kwargs)
+        self.assertEqual(StreamingUtils._sampling_decoding, method)
+        self.assertEqual(StreamingUtils._sampling_decoding,
+                         StreamingUtils._get_decoding_method(do_sample=True))
+        self.assertEqual(
+            StreamingUtils._greedy_decoding,
+            StreamingUtils._get_decoding_method(do_sample=False, **kwargs))
+        processors = StreamingUtils._get_logits_processors(method, **kwargs)
+        first = method(logits.clone(), input_ids, processors,
+                       StreamingUtils._get_generator(**kwargs))
+        second = method(logits.clone(), input_ids, processors,
+                        StreamingUtils._get_generator(**kwargs))
+        self.assertTrue(torch.equal(first, second))
+        top_k = logits.topk(3).indices
+        for i in range(4):
+            self.assertIn(first[i].item(), top_k[i].tolist())
+
+    def test_greedy_stream(self):
+        import torch
+        inputs = ["Hello world", "Deep Java"]
+        tokens = self.tokenizer(inputs, return_tensors="pt")
+        with torch.no_grad():
+            output_ids = self.model.generate(
+                **tokens,
+                max_new_tokens=8,
+                do_sample=False,
+                pad_token_id=self.tokenizer.eos_token_id)
+        expected = self.tokenizer.batch_decode(
+            output_ids[:, tokens["input_ids"].shape[1]:])
+
+        result = self._stream(inputs, max_new_tokens=8)
+        self.assertEqual(8, len(result))
+        for i in range(len(inputs)):
+            self.assertEqual(expected[i], "".join(r[i] for r in result))
+
+    def test_token_ids_stream(self):
+        import torch
+        inputs = ["Hello world", "Deep Java"]
+        texts = self._stream(inputs, max_new_tokens=8)
+        result = self._stream(inputs,
+                              max_new_tokens=8,
+                              output_token_ids=True,
+                              output_logprobs=True)
+        self.assertEqual(len(texts), len(result))
+        for i in range(len(inputs)):
+            outputs = [r[i] for r in result if r[i] is not None]
+            token_ids = [t for output in outputs for t in output["token_ids"]]
+            logprobs = [l for output in outputs for l in output["logprobs"]]
+            self.assertEqual("".join(r[i] for r in texts),
+                             self.tokenizer.decode(token_ids))
+            self.assertEqual(len(token_ids), len(logprobs))
+
+        tokens = self.tokenizer(inputs[:1], return_tensors="pt")
+        with torch.no_grad():
+            logits = self.model(**tokens).logits[0, -1]
+        result = self._stream(inputs[:1],
+                              max_new_tokens=1,
+                              output_token_ids=True,
+                              output_logprobs=True)
+        self.assertEqual([logits.argmax().item()], result[0][0]["token_ids"])
+        self.assertAlmostEqual(torch.log_softmax(logits, dim=-1).max().item(),
+                               result[0][0]["logprobs"][0],
+                               places=4)
+
+    def test_static_cache(self):
+        from djl_python.streaming_utils import StreamingUtils
+        from djl_python.tests import tiny_models
+        model = tiny_models.llama_model(len(self.tokenizer))
+        inputs = ["Hello world", "Deep Java Library serves"]
+        kwargs = {"max_new_tokens": 12, "repetition_penalty": 1.3}
+        generator = StreamingUtils.get_stream_generator("Accelerate")
+        expected = list(generator(model, self.tokenizer, inputs, **kwargs))
+        result = list(
+            generator(model,
+                      self.tokenizer,
+                      inputs,
+                      use_static_cache=True,
+                      **kwargs))
+        self.assertEqual(expected, result)
+        # falls back to the dynamic cache
+        self.assertEqual(
+            self._stream(inputs, max_new_tokens=4),
+            self._stream(inputs, max_new_tokens=4, use_static_cache=True))
+
+    def test_chunked_prefill(self):
+        from djl_python.streaming_utils import StreamingUtils
+        from djl_python.tests import tiny_models
+        inputs = ["Deep Java Library serves deep learning models", "Hello"]
+        kwargs = {"max_new_tokens": 8}
+        self.assertEqual(self._stream(inputs, **kwargs),
+                         self._stream(inputs, prefill_chunk_size=3, **kwargs))
+
+        model = tiny_models.llama_model(len(self.tokenizer))
+        generator = StreamingUtils.get_stream_generator("Accelerate")
+        expected = list(generator(model, self.tokenizer, inputs, **kwargs))
+        for use_static_cache in (False, True):
+            self.assertEqual(
+                expected,
+                list(
+                    generator(model,
+                              self.tokenizer,
+                              inputs,
+                              prefill_chunk_size=4,
+                              use_static_cache=use_static_cache,
+                              **kwargs)))
+
+    def test_incremental_detokenizer(self):
+        import random
+        from djl_python.streaming_utils import IncrementalDetokenizer
+        from djl_python.tests import tiny_models
+        rand = random.Random(0)
+        for tokenizer in (self.tokenizer, tiny_models.t5_tokenizer()):
+            for i in range(50):
+                ids = tokenizer(rand.choice(tiny_models.CORPUS))["input_ids"]
+                # random tokens split multi-byte characters
+                ids += [rand.randrange(len(tokenizer)) for _ in range(i % 10)]
+                prompt_length = rand.randint(1, len(ids) - 1)
+                prompt = ids[:prompt_length]
+                detokenizers = [IncrementalDetokenizer(prompt)]
+                text = ""
+                for j in range(prompt_length, len(ids)):
+                    text += IncrementalDetokenizer.decode(
+                        tokenizer, detokenizers, [ids[j]],
+                        [j == len(ids) - 1])[0]
+                expected = tokenizer.decode(
+                    ids)[len(tokenizer.decode(prompt)):]
+                self.assertEqual(expected, text)
+
+        # finished sequences are skipped
+        detokenizers = [IncrementalDetokenizer([]) for _ in range(2)]
+        ids = self.tokenizer(" Hello")["input_ids"]
+        self.assertEqual(["", self.tokenizer.decode(ids[:1])],
+                         IncrementalDetokenizer.decode(self.tokenizer,
+                                                       detokenizers,
+                                                       [None, ids[0]]))
+
+    def test_seq2seq_stream(self):
+        import torch
+        from djl_python.streaming_utils import StreamingUtils
+        from djl_python.tests import tiny_models
+        tokenizer = tiny_models.t5_tokenizer()
+        model = tiny_models.t5_model(len(tokenizer))
+        inputs = ["Hello world", "Deep Java Library serves"]
+        tokens = tokenizer(inputs, return_tensors="pt", padding=True)
+        with torch.no_grad():
+            output_ids = model.generate(**tokens,
+                                        max_new_tokens=8,
+                                        do_sample=False)
+        generator = StreamingUtils.get_stream_generator("Accelerate")
+        result = list(generator(model, tokenizer, inputs, max_new_tokens=8))
+        start = tokenizer.decode(output_ids[0, :1])
+        for i in range(len(inputs)):
+            ids = output_ids[i].tolist()
+            if tokenizer.eos_token_id in ids:
+                ids = ids[:ids.index(tokenizer.eos_token_id) + 1]
+            expected = tokenizer.decode(ids)[len(start):]
+            self.assertEqual(expected, "".join(r[i] for r in result))
+
+    def test_stop_criteria(self):
+        from djl_python.streaming_utils import StreamingUtils
+        from djl_python.tests import tiny_models
+        inputs = ["Hello world", "Deep Java Library serves", "the quick"]
+        kwargs = {"max_new_tokens": 10, "repetition_penalty": 1.5}
+        for model, tokenizer in ((self.model, self.tokenizer),
+                                 (tiny_models.llama_model(len(self.tokenizer)),
+                                  self.tokenizer),
+                                 (tiny_models.t5_model(200),
+                                  tiny_models.t5_tokenizer())):
+            generator = StreamingUtils.get_stream_generator("Accelerate")
+            expected = list(generator(model, tokenizer, inputs, **kwargs))
+            texts = ["".join(r[i] for r in expected) for i in range(3)]
+
+            # stop the second sequence at its third token
+            steps = []
+            greedy = StreamingUtils._greedy_decoding
+
+            def record(*args):
+                token_ids = greedy(*args)
+                steps.append(token_ids.tolist())
+                return token_ids
+
+            with mock.patch.object(StreamingUtils, "_greedy_decoding",
+                                   staticmethod(record)):
+                list(generator(model, tokenizer, inputs, **kwargs))
+            stop_token_id = steps[2][1]
+            result = list(
+                generator(model,
+                          tokenizer,
+                          inputs,
+                          stop_token_ids=[stop_token_id],
+                          **kwargs))
+            for i in range(3):
+                tokens = [step[i] for step in steps]
+                length = tokens.index(stop_token_id) + 1 if (
+                    stop_token_id in tokens) else len(tokens)
+                self.assertEqual("".join(r[i] for r in expected[:length]),
+                                 "".join(r[i] for r in result))
+
+            # in batched mode a stopped sequence ends before the others
+            batched = list(
+                generator(model,
+                          tokenizer,
+                          inputs,
+                          stop_token_ids=[stop_token_id],
+                          batched=True,
+                          **kwargs))
+            self.assertEqual(len(result), len(batched))
+            for i in range(3):
+                tokens = [step[i] for step in steps]
+                length = tokens.index(stop_token_id) + 1 if (
+                    stop_token_id in tokens) else len(tokens)
+                self.assertEqual([r[i] for r in result[:length]],
+                                 [r[i] for r in batched[:length]])
+                self.assertEqual([None] * (len(batched) - length),
+                                 [r[i] for r in batched[length:]])
+            self.assertLess(3, len(batched))
+
+            # stop sequences may span several tokens
+            stop = texts[0][1:5]
+            result = list(
+                generator(model,
+                          tokenizer,
+                          inputs,
+                          stop_sequences=[stop, "never"],
+                          **kwargs))
+            for i in range(3):
+                expected_text = texts[i]
+                if stop in expected_text:
+                    end = expected_text.index(stop) + len(stop)
+                    expected_text = expected_text[:end]
+                self.assertEqual(expected_text, "".join(r[i] for r in result))
+
+    def test_stop_sequences(self):
+        from djl_python.streaming_utils import StopSequences
+        stop = StopSequences(["</s>", "\n\n"])
+        self.assertIsNone(stop.truncate("Hello <"))
+        self.assertIsNone(stop.truncate("/"))
+        self.assertEqual("s>", stop.truncate("s> world"))
+        stop = StopSequences(["abc", "b"])
+        self.assertEqual("xab", stop.truncate("xabc"))
+
+    def test_neuronx_stream(self):
+        import torch
+        from djl_python.streaming_utils import StreamingUtils
+        tokenizer = self.tokenizer
+        eos = tokenizer.eos_token_id
+
+        class StubModel(object):
+            """
+            Scores the next token id highest, and EOS from the given step of
+            each input on.
+            """
+
+            def __init__(self, eos_steps):
+                self.eos_steps = torch.tensor(eos_steps)
+                self.position_ids = []
+
+            def reset(self):
+                self.position_ids = []
+
+            def __call__(self, input_ids, position_ids):
+                step = len(self.position_ids)
+                self.position_ids.append(position_ids.tolist())
+                next_ids = (input_ids[:, -1] + 1) % len(tokenizer)
+                next_ids[self.eos_steps <= step] = eos
+                scores = torch.zeros(input_ids.shape[0], len(tokenizer))
+                scores[torch.arange(input_ids.shape[0]), next_ids] = 10.0
+                return scores
+
+        tokenizer.pad_token = tokenizer.eos_token
+        inputs = ["Hello world", "Deep Java"]
+        prompts = tokenizer(inputs, padding=True)["input_ids"]
+        start = len(prompts[0])
+        generator = StreamingUtils.get_stream_generator("transformers-neuronx")
+
+        # the token budget and the compiled sequence length
+        model = StubModel([100, 100])
+        result = list(
+            generator(model,
+                      tokenizer,
+                      inputs,
+                      seq_length=128,
+                      max_new_tokens=5,
+                      do_sample=False))
+        self.assertEqual(5, len(result))
+        self.assertEqual([list(range(start))] +
+                         [[i] for i in range(start, start + 4)],
+                         model.position_ids)
+        for i, prompt in enumerate(prompts):
+            ids = [(prompt[-1] + j) % len(tokenizer) for j in range(1, 6)]
+            if eos in ids:
+                ids = ids[:ids.index(eos) + 1]
+            self.assertEqual(tokenizer.decode(ids),
+                             "".join(r[i] for r in result))
+        result = list(generator(model, tokenizer, inputs,
+                                seq_length=start + 3))
+        self.assertEqual(3, len(result))
+
+        # stops once every input generated EOS
+        model = StubModel([1, 3])
+        result = list(
+            generator(model,
+                      tokenizer,
+                      inputs,
+                      seq_length=128,
+                      max_new_tokens=20,
+                      do_sample=False))
+        self.assertEqual(4, len(result))
+        self.assertEqual(4, len(model.position_ids))
+        self.assertEqual(tokenizer.eos_token, result[1][0])
+        self.assertEqual(["", ""], result[2][:1] + result[3][:1])
+        self.assertEqual(tokenizer.eos_token, result[3][1])
+        # in batched mode the finished input ends right after its EOS
+        result = list(
+            generator(model,
+                      tokenizer,
+                      inputs,
+                      seq_length=128,
+                      max_new_tokens=20,
+                      do_sample=False,
+                      batched=True))
+        self.assertEqual([tokenizer.eos_token, None, None],
+                         [r[0] for r in result[1:]])
+
+
+if __name__ == '__main__':
+    unittest.main()
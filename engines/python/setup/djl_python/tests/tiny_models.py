@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+#
+# Copyright 2023 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file
+# except in compliance with the License. A copy of the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "LICENSE.txt" file accompanying this file. This file is distributed on an "AS IS"
+# BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, express or implied. See the License for
+# the specific language governing permissions and limitations under the License.
+"""
+Randomly initialized tiny models and locally trained tokenizers, to test and
+benchmark generation on CPU without downloading anything.
+"""
+
+CORPUS = [
+    "Hello world, the quick brown fox jumps over the lazy dog.",
+    "Deep Java Library serves deep learning models with Python handlers.",
+    "Ünïcödé text, emojis 🙂 and 日本語 need multi-byte tokens.",
+]
+
+
+def gpt2_tokenizer(vocab_size=400):
+    """
+    Returns a byte level BPE tokenizer like the GPT-2 one.
+    """
+    from tokenizers import Tokenizer, decoders, models, pre_tokenizers, trainers
+    from transformers import PreTrainedTokenizerFast
+
+    tokenizer = Tokenizer(models.BPE())
+    tokenizer.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tokenizer.decoder = decoders.ByteLevel()
+    trainer = trainers.BpeTrainer(
+        vocab_size=vocab_size,
+        special_tokens=["<|endoftext|>"],
+        initial_alphabet=pre_tokenizers.ByteLevel.alphabet())
+    tokenizer.train_from_iterator(CORPUS * 10, trainer)
+    return PreTrainedTokenizerFast(
+        tokenizer_object=tokenizer,
+        eos_token="<|endoftext|>",
+        padding_side="left",
+        model_input_names=["input_ids", "attention_mask"],
+        clean_up_tokenization_spaces=False)
+
+
+def gpt2_model(vocab_size, n_layer=2, n_embd=32, n_head=2, seed=0):
+    """
+    Returns a randomly initialized GPT-2 model.
+    """
+    import torch
+    from transformers import GPT2Config, GPT2LMHeadModel
+
+    torch.manual_seed(seed)
+    config = GPT2Config(n_layer=n_layer,
+                        n_embd=n_embd,
+                        n_head=n_head,
+                        vocab_size=vocab_size,
+                        n_positions=512,
+                        architectures=["GPT2LMHeadModel"])
+    return GPT2LMHeadModel(config).eval()
+
+
+def llama_model(vocab_size, num_hidden_layers=2, hidden_size=32, seed=0):
+    """
+    Returns a randomly initialized Llama model, it supports the static KV
+    cache.
+    """
+    import torch
+    from transformers import LlamaConfig, LlamaForCausalLM
+
+    torch.manual_seed(seed)
+    config = LlamaConfig(num_hidden_layers=num_hidden_layers,
+                         hidden_size=hidden_size,
+                         intermediate_size=hidden_size * 2,
+                         num_attention_heads=2,
+                         num_key_value_heads=2,
+                         vocab_size=vocab_size,
+                         max_position_embeddings=512,
+                         architectures=["LlamaForCausalLM"])
+    return LlamaForCausalLM(config).eval()
+
+
+def t5_tokenizer(vocab_size=200):
+    """
+    Returns a SentencePiece style unigram tokenizer like the T5 one.
+
+    The vocabulary is built from the corpus characters, words and word
+    pieces rather than trained, the unigram trainer is not deterministic.
+    """
+    from tokenizers import Tokenizer, decoders, models, pre_tokenizers
+    from transformers import PreTrainedTokenizerFast
+
+    words = sorted({"\u2581" + w for text in CORPUS for w in text.split()})
+    chars = sorted({c for text in CORPUS for c in text if c != " "})
+    pieces = sorted({
+        w[i:j]
+        for w in words
+        for i in range(len(w))
+        for j in range(i + 2, i + 5) if j <= len(w)
+    } - set(words))
+    vocab = [("<pad>", 0.0), ("</s>", 0.0), ("<unk>", 0.0), ("\u2581", -2.0)]
+    vocab += [(c, -4.0) for c in chars] + [(w, -1.0) for w in words]
+    vocab += [(p, -3.0) for p in pieces[:vocab_size - len(vocab)]]
+    tokenizer = Tokenizer(models.Unigram(vocab, unk_id=2))
+    tokenizer.pre_tokenizer = pre_tokenizers.Metaspace()
+    tokenizer.decoder = decoders.Metaspace()
+    return PreTrainedTokenizerFast(
+        tokenizer_object=tokenizer,
+        eos_token="</s>",
+        pad_token="<pad>",
+        unk_token="<unk>",
+        model_input_names=["input_ids", "attention_mask"],
+        clean_up_tokenization_spaces=False)
+
+
+def t5_model(vocab_size, num_layers=2, d_model=32, seed=0):
+    """
+    Returns a randomly initialized T5 model.
+    """
+    import torch
+    from transformers import T5Config, T5ForConditionalGeneration
+
+    torch.manual_seed(seed)
+    config = T5Config(num_layers=num_layers,
+                      d_model=d_model,
+                      d_kv=16,
+                      d_ff=d_model * 2,
+                      num_heads=2,
+                      vocab_size=vocab_size,
+                      pad_token_id=0,
+                      eos_token_id=1,
+                      decoder_start_token_id=0,
+                      architectures=["T5ForConditionalGeneration"])
+    return T5ForConditionalGeneration(config).eval()
@@ -23,6 +23,7 @@ from transformers_neuronx.gpt2.model import GPT2ForSampling
 from transformers_neuronx.module import save_pretrained_split
 from transformers_neuronx.opt.model import OPTForSampling
 from djl_python import Input, Output
+from djl_python.outputs import TOKEN_IDS_CONTENT_TYPE, get_stream_content_type
 from djl_python.stable_diffusion_inf2 import StableDiffusionService
 from djl_python.streaming_utils import StreamingUtils
 
@@ -43,6 +44,7 @@ class TransformersNeuronXService(object):
         self.model = None
         self.tokenizer = None
         self.enable_streaming = False
+        self.batch_stream = False
 
     def convert_opt(self, amp):
         logging.warning(
@@ -144,6 +146,11 @@ class TransformersNeuronXService(object):
             "model_dir")
         self.enable_streaming = properties.get("enable_streaming",
                                                "false").lower() == "true"
+        if properties.get("batch_stream", "false").lower() == "true":
+            # batch_stream stays off until the front end can route batched
+            # frames to their clients
+            raise ValueError(
+                "batch_stream is not supported by the DJL front end yet")
         dtype = properties.get("dtype", "fp32")
         n_positions = int(properties.get("n_positions", 128))
         unroll = properties.get("unroll", None)
@@ -188,11 +195,20 @@ class TransformersNeuronXService(object):
             if self.enable_streaming:
                 stream_generator = StreamingUtils.get_stream_generator(
                     "transformers-neuronx")
-                model_kwargs["seq_length"] = parameters.get("max_length", 128)
+                model_kwargs["seq_length"] = parameters.pop("max_length", 128)
+                if self.batch_stream:
+                    model_kwargs["batched"] = True
+                accept = inputs.get_property("Accept")
+                if get_stream_content_type(accept) == TOKEN_IDS_CONTENT_TYPE:
+                    model_kwargs["output_token_ids"] = True
                 # TODO: switch to new HF model interface
-                outputs.add_stream_content(
-                    stream_generator(self.model.model, self.tokenizer,
-                                     input_text, **model_kwargs))
+                # the values set by the service win over the request
+                parameters.update(model_kwargs)
+                stream = stream_generator(self.model.model, self.tokenizer,
+                                          input_text, **parameters)
+                outputs.add_stream_content(stream,
+                                           batched=self.batch_stream,
+                                           accept=accept)
                 return outputs
 
             encoded_inputs = self.tokenizer.batch_encode_plus(
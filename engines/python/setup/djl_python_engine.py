@@ -15,18 +15,41 @@ DJL Python engine.
 Communication message format: binary encoding
 """
 
+import asyncio
+import inspect
 import logging
 import os
 import signal
 import socket
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 from djl_python.arg_parser import ArgParser
-from djl_python.inputs import Input
-from djl_python.outputs import Output
+from djl_python.batching import DynamicBatcher
+from djl_python.inputs import Input, SocketReader
+from djl_python.outputs import Output, StreamFlushPolicy, set_json_backend
 from djl_python.service_loader import load_model_service
 
 SOCKET_ACCEPT_TIMEOUT = 30.0
+# maximum number of requests in flight, 0 processes requests serially
+PIPELINE_WORKERS_ENV = "DJL_PIPELINE_WORKERS"
+# worker side dynamic batching, requires pipelining and a front end that sends
+# requests without waiting for responses, the delay in milliseconds is waited
+# for more requests once a batch has started to form
+BATCH_SIZE_ENV = "DJL_BATCH_SIZE"
+MAX_BATCH_DELAY_ENV = "DJL_MAX_BATCH_DELAY"
+# streaming frames are packed into one send up to these bytes, frames and
+# milliseconds, the drain thread computes frames during socket I/O. Pending
+# frames are sent once they are due even if the handler hasn't produced the
+# next frame, by the drain thread or else by a timer thread.
+STREAM_FLUSH_BYTES_ENV = "DJL_STREAM_FLUSH_BYTES"
+STREAM_FLUSH_ITEMS_ENV = "DJL_STREAM_FLUSH_ITEMS"
+STREAM_FLUSH_LATENCY_ENV = "DJL_STREAM_FLUSH_LATENCY"
+STREAM_DRAIN_THREAD_ENV = "DJL_STREAM_DRAIN_THREAD"
+REQUEST_SEQ_ID = "seq_id"
+# option.json_backend of the model, "json" (default) or "orjson"
+JSON_BACKEND_PROPERTY = "json_backend"
 
 
 class PythonEngine(object):
@@ -50,6 +73,19 @@ class PythonEngine(object):
         self.service = service
         self.device_id = args.device_id
         self.tensor_parallel_degree = args.tensor_parallel_degree
+        self.pipeline_workers = int(os.getenv(PIPELINE_WORKERS_ENV, "0"))
+        self.batch_size = int(os.getenv(BATCH_SIZE_ENV, "1"))
+        self.max_batch_delay = int(os.getenv(MAX_BATCH_DELAY_ENV, "0"))
+        self.stream_flush_policy = StreamFlushPolicy(
+            max_bytes=int(os.getenv(STREAM_FLUSH_BYTES_ENV, "65536")),
+            max_items=int(os.getenv(STREAM_FLUSH_ITEMS_ENV, "1")),
+            max_latency_ms=int(os.getenv(STREAM_FLUSH_LATENCY_ENV, "0")),
+            background=os.getenv(STREAM_DRAIN_THREAD_ENV,
+                                 "false").lower() == "true")
+        if self.batch_size > 1:
+            # enough requests must be in flight to fill a batch
+            self.pipeline_workers = max(self.pipeline_workers, self.batch_size)
+        self.loop = None
 
         if self.sock_type == "unix":
             if self.sock_name is None:
@@ -103,29 +139,161 @@ class PythonEngine(object):
         (cl_socket, _) = self.sock.accept()
         # workaround error(35, 'Resource temporarily unavailable') on OSX
         cl_socket.setblocking(True)
+        reader = SocketReader(cl_socket)
+
+        if self.pipeline_workers > 0:
+            logging.info(
+                f"Pipelining requests with {self.pipeline_workers} workers.")
+            self._run_pipelined(cl_socket, reader)
+            return
 
         while True:
             inputs = Input()
-            inputs.read(cl_socket)
-            prop = inputs.get_properties()
-            if self.tensor_parallel_degree:
-                prop["tensor_parallel_degree"] = self.tensor_parallel_degree
-            prop["device_id"] = self.device_id
-            function_name = inputs.get_function_name()
+            inputs.read(reader)
+            outputs = self._invoke(inputs)
+            self._send(outputs, cl_socket)
+
+    def _run_pipelined(self, cl_socket, reader):
+        """
+        Reads the next request while previous requests are being executed.
+
+        Blocking handlers run in a thread pool, coroutine handlers run on the
+        event loop. Responses are sent in completion order, a response carries
+        the sequence id property of its request if the request has one.
+        """
+        send_lock = threading.Lock()
+        slots = threading.BoundedSemaphore(self.pipeline_workers)
+
+        def reply(outputs, seq_id):
             try:
-                outputs = self.service.invoke_handler(function_name, inputs)
-                if outputs is None:
-                    outputs = Output(code=204, message="No content")
-            except Exception as e:
+                if seq_id is not None:
+                    outputs.add_property(REQUEST_SEQ_ID, seq_id)
+                with send_lock:
+                    self._send(outputs, cl_socket)
+            except Exception:  # pylint: disable=broad-except
+                logging.exception("Failed to send outputs to DJL engine.")
+            finally:
+                slots.release()
+
+        def process(inputs, seq_id):
+            reply(self._invoke(inputs), seq_id)
+
+        batcher = None
+        if self.batch_size > 1:
+            logging.info(f"Dynamic batching with batch size: "
+                         f"{self.batch_size}, max delay: "
+                         f"{self.max_batch_delay} ms.")
+            batcher = DynamicBatcher(self._invoke, self.batch_size,
+                                     self.max_batch_delay)
+
+        async def process_async(inputs, seq_id):
+            outputs = None
+            try:
+                outputs = await self._invoke_async(inputs)
+            except BaseException as e:
+                # e.g. the handler was cancelled, reply to release the slot
                 logging.exception("Failed invoke service.invoke_handler()")
-                outputs = Output().error(str(e))
+                outputs = Output().error(str(e) or type(e).__name__)
+                raise
+            finally:
+                # send from a worker thread to keep the event loop responsive
+                asyncio.get_running_loop().run_in_executor(
+                    executor, reply, outputs, seq_id)
+
+        with ThreadPoolExecutor(max_workers=self.pipeline_workers,
+                                thread_name_prefix="djl-worker") as executor:
+            while True:
+                inputs = Input()
+                inputs.read(reader)
+                seq_id = inputs.get_property(REQUEST_SEQ_ID)
+                slots.acquire()
+                if inputs.is_empty():
+                    # initialization request, must complete before others
+                    process(inputs, seq_id)
+                elif self.service.is_async_handler(inputs.get_function_name()):
+                    asyncio.run_coroutine_threadsafe(
+                        process_async(inputs, seq_id), self._get_event_loop())
+                elif batcher is not None and not inputs.is_batch():
+                    batcher.submit(inputs,
+                                   lambda outputs, i=seq_id: reply(outputs, i))
+                else:
+                    executor.submit(process, inputs, seq_id)
 
-            outputs.send(cl_socket)
-            logging.debug("Outputs is sent to DJL engine.")
+    def _get_event_loop(self):
+        """
+        Returns the event loop for coroutine handlers, it runs in a daemon
+        thread and is shared by all requests.
+        """
+        if self.loop is None:
+            self.loop = asyncio.new_event_loop()
+            threading.Thread(target=self.loop.run_forever,
+                             name="djl-event-loop",
+                             daemon=True).start()
+        return self.loop
+
+    def _prepare(self, inputs):
+        prop = inputs.get_properties()
+        if self.tensor_parallel_degree:
+            prop["tensor_parallel_degree"] = self.tensor_parallel_degree
+        prop["device_id"] = self.device_id
+        return inputs.get_function_name()
+
+    def _invoke(self, inputs):
+        function_name = self._prepare(inputs)
+        try:
+            if inputs.is_empty():
+                # initialization request, it carries the model options
+                json_backend = inputs.get_property(JSON_BACKEND_PROPERTY)
+                if json_backend:
+                    set_json_backend(json_backend)
+            outputs = self.service.invoke_handler(function_name, inputs)
+            if asyncio.iscoroutine(outputs):
+                outputs = asyncio.run_coroutine_threadsafe(
+                    outputs, self._get_event_loop()).result()
+            if outputs is None:
+                outputs = Output(code=204, message="No content")
+        except Exception as e:
+            logging.exception("Failed invoke service.invoke_handler()")
+            outputs = Output().error(str(e))
+        return outputs
+
+    async def _invoke_async(self, inputs):
+        function_name = self._prepare(inputs)
+        try:
+            outputs = await self.service.invoke_handler(function_name, inputs)
+            if outputs is None:
+                outputs = Output(code=204, message="No content")
+        except Exception as e:
+            logging.exception("Failed invoke service.invoke_handler()")
+            outputs = Output().error(str(e))
+        return outputs
+
+    def _send(self, outputs, cl_socket):
+        if inspect.isasyncgen(outputs.stream_content):
+            outputs.stream_content = self._iterate_async(
+                outputs.stream_content)
+        outputs.send(cl_socket, self.stream_flush_policy)
+        logging.debug("Outputs is sent to DJL engine.")
+        try:
+            outputs.execute_finalize()
+        except Exception as e:
+            logging.exception(f"Failed on finalize function: {e}")
+
+    def _iterate_async(self, async_gen):
+        """
+        Drives an async generator on the event loop from the sending thread.
+        """
+
+        async def next_item():
+            return await async_gen.__anext__()
+
+        loop = self._get_event_loop()
+        while True:
             try:
-                outputs.execute_finalize()
-            except Exception as e:
-                logging.exception(f"Failed on finalize function: {e}")
+                yield asyncio.run_coroutine_threadsafe(next_item(),
+                                                       loop).result()
+            except StopAsyncIteration:
+                return
 
 
 def main():